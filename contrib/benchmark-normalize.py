@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Compares the native newline normalizer against the pure Python implementations it replaced, on generated test data.
+Run it from the root of a built checkout.
+"""
+import argparse
+import os
+import random
+import tempfile
+import timeit
+from io import BytesIO, TextIOWrapper
+
+from dmoj.utils import normalize as normalize_module
+from dmoj.utils.normalize import normalize, normalized_file_copy
+
+
+def text_wrapper_copy(src, dst, block_size=65536):
+    src_wrap = TextIOWrapper(src, encoding='iso-8859-1', newline=None)
+    dst_wrap = TextIOWrapper(dst, encoding='iso-8859-1', newline='')
+    add_newline = False
+    while True:
+        buf = src_wrap.read(block_size)
+        if not buf:
+            break
+        dst_wrap.write(buf)
+        add_newline = not buf.endswith('\n')
+    if add_newline:
+        dst_wrap.write('\n')
+    src_wrap.detach()
+    dst_wrap.detach()
+
+
+def replace_normalize(data):
+    data = data.replace(b'\r\n', b'\r').replace(b'\r', b'\n')
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    return data
+
+
+def make_data(size, newline):
+    rng = random.Random(0)
+    lines = []
+    total = 0
+    while total < size:
+        line = b' '.join(str(rng.randrange(10**9)).encode() for _ in range(rng.randrange(1, 20))) + newline
+        lines.append(line)
+        total += len(line)
+    return b''.join(lines)
+
+
+def bench(name, func, repeat):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f'{name:<40} {best * 1000:10.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks newline normalization.')
+    parser.add_argument('-s', '--size', type=int, default=64, help='size of the test data, in MiB')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='number of runs to take the best of')
+    args = parser.parse_args()
+
+    if normalize_module.Normalizer is None:
+        parser.error('dmoj.utils._normalize is not built')
+
+    for label, newline in (('CRLF', b'\r\n'), ('LF', b'\n')):
+        data = make_data(args.size << 20, newline)
+        print(f'{label} data, {len(data) >> 20} MiB:')
+
+        bench('bytes.replace', lambda: replace_normalize(data), args.repeat)
+        bench('native normalize', lambda: normalize(data), args.repeat)
+        bench('TextIOWrapper copy (BytesIO)', lambda: text_wrapper_copy(BytesIO(data), BytesIO()), args.repeat)
+        bench('native streaming copy (BytesIO)', lambda: normalized_file_copy(BytesIO(data), BytesIO()), args.repeat)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            src_path = os.path.join(tmp, 'src')
+            dst_path = os.path.join(tmp, 'dst')
+            with open(src_path, 'wb') as f:
+                f.write(data)
+
+            def file_copy(copy):
+                with open(src_path, 'rb') as src, open(dst_path, 'wb', buffering=0) as dst:
+                    copy(src, dst)
+
+            bench('TextIOWrapper copy (files)', lambda: file_copy(text_wrapper_copy), args.repeat)
+            bench('native fd copy (files)', lambda: file_copy(normalized_file_copy), args.repeat)
+        print()
+
+
+if __name__ == '__main__':
+    main()
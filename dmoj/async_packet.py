@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import socket
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from dmoj.judgeenv import get_runtime_versions, get_supported_problems_and_mtimes
+from dmoj.packet import JudgeAuthenticationFailed, PacketManager
+from dmoj.packet_codec import PacketCodec, SerializedPacket
+
+log = logging.getLogger(__name__)
+
+# Packets that don't belong to any grading submission, and that the site expects an answer to promptly.
+PRIORITY_CONTROL = 0
+# Everything about a grading submission. These all share one priority, so they reach the site in the order they were
+# sent.
+PRIORITY_SUBMISSION = 1
+# Large packets nobody is waiting on.
+PRIORITY_BULK = 2
+
+CONTROL_PACKETS = {'ping-response', 'current-submission-id', 'submission-acknowledged'}
+
+READ_TIMEOUT = 300  # seconds
+
+
+class AsyncPacketManager(PacketManager):
+    """
+    A `PacketManager` whose connection to the site is owned by a single asyncio event loop.
+
+    Packets may still be sent from any thread, but sending only queues them; the event loop writes them out in order of
+    priority, so a slow site never blocks a grading thread. Test case results are not queued as packets at all: they are
+    coalesced into one `test-case-status` packet per submission whenever the connection has nothing more important to
+    send, so the slower the site is, the fewer (and larger) packets it gets.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._outbound: List[Tuple[int, int, SerializedPacket]] = []
+        self._outbound_lock = threading.Lock()
+        self._outbound_counter = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        super().__init__(*args, **kwargs)
+
+    def _do_reconnect(self):
+        # The event loop connects once `run` is called.
+        pass
+
+    def run(self):
+        try:
+            asyncio.run(self._run())
+        finally:
+            self._loop = None
+
+    def close(self):
+        self._closed = True
+        self._testcase_sync.close()
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._close_writer)
+
+    def disconnect(self):
+        self.close()
+        self.judge.abort_grading()
+
+    def _send_packet(self, packet: dict):
+        name = packet['name']
+        if name in CONTROL_PACKETS:
+            priority = PRIORITY_CONTROL
+        elif 'submission-id' in packet:
+            priority = PRIORITY_SUBMISSION
+        else:
+            priority = PRIORITY_BULK
+
+        # Serialize on the sending thread, so the event loop only has to frame packets as it writes them.
+        serialized = self._serialize_packet(packet)
+        with self._outbound_lock:
+            heapq.heappush(self._outbound, (priority, next(self._outbound_counter), serialized))
+        self._wake_writer()
+
+    def _testcase_queued(self, result):
+        # Results are coalesced by the writer, whenever it has nothing more important to send.
+        self._wake_writer()
+        return False
+
+    def _wake_writer(self) -> None:
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The event loop has already shut down.
+                pass
+
+    def _next_outbound(self) -> List[SerializedPacket]:
+        with self._outbound_lock:
+            if self._outbound:
+                return [heapq.heappop(self._outbound)[2]]
+
+        # Nothing else to send, so this is as good a time as any to send whatever results have come in meanwhile.
+        with self._testcase_queue_lock:
+            cases_by_submission = self._take_testcase_queue()
+        return [
+            self._serialize_packet(self._test_case_status(submission_id, cases))
+            for submission_id, cases in cases_by_submission.items()
+        ]
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # Packet handlers may block for a long time (e.g. waiting for a free grading slot), so they run on their own
+        # thread, one at a time and in the order they were received.
+        dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='packet-dispatch')
+        try:
+            while not self._closed:
+                try:
+                    reader, writer = await self._connect_async()
+                except (JudgeAuthenticationFailed, OSError, asyncio.TimeoutError) as e:
+                    if isinstance(e, JudgeAuthenticationFailed):
+                        log.error('Authentication as "%s" failed on: [%s]:%s', self.name, self.host, self.port)
+                    else:
+                        log.exception('Connection failed due to socket error: [%s]:%s', self.host, self.port)
+                    await self._backoff()
+                    continue
+
+                writer_task = asyncio.ensure_future(self._write_forever(writer))
+                try:
+                    await self._read_forever_async(reader, dispatcher)
+                finally:
+                    writer_task.cancel()
+                    self._close_writer()
+
+                if not self._closed:
+                    await self._backoff()
+        finally:
+            dispatcher.shutdown(wait=False)
+
+    async def _backoff(self) -> None:
+        log.warning('Attempting reconnection in %.0fs: [%s]:%s', self.fallback, self.host, self.port)
+        await asyncio.sleep(self.fallback)
+        self.fallback = min(self.fallback * 1.5, 60)  # Limit fallback to one minute.
+
+    async def _connect_async(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        loop = asyncio.get_running_loop()
+        problems = await loop.run_in_executor(None, get_supported_problems_and_mtimes)
+        versions = get_runtime_versions()
+
+        log.info('Opening connection to: [%s]:%s', self.host, self.port)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+                server_hostname=self.host if self.ssl_context else None,
+            ),
+            timeout=5,
+        )
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        try:
+            log.info('Starting handshake with: [%s]:%s', self.host, self.port)
+            await self._handshake_async(reader, writer, problems, versions)
+        except BaseException:
+            writer.close()
+            raise
+
+        self._writer = writer
+        log.info('Judge "%s" online: [%s]:%s', self.name, self.host, self.port)
+        return reader, writer
+
+    async def _handshake_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, problems, runtimes):
+        # The handshake must be the first packet on the connection, so it skips the queue.
+        self._codec = PacketCodec()
+        writer.write(self._encode_packet(self._handshake_packet(problems, runtimes, self.name, self.key)))
+        await writer.drain()
+
+        log.info('Awaiting handshake response: [%s]:%s', self.host, self.port)
+        try:
+            resp = await asyncio.wait_for(self._read_packet(reader), timeout=READ_TIMEOUT)
+        except Exception:
+            log.exception('Cannot understand handshake response: [%s]:%s', self.host, self.port)
+            raise JudgeAuthenticationFailed()
+        else:
+            if resp['name'] != 'handshake-success':
+                log.error('Handshake failed.')
+                raise JudgeAuthenticationFailed()
+        # Only the writer task of this connection frames packets, so the codec can be swapped without locking.
+        self._codec = self._negotiate_codec(resp)
+        self._problem_diffs = bool(resp.get('problems-diff'))
+        # Resent packets must reach the site before any queued ones.
+        replay = self._resume_submissions(resp)
+        for serialized in replay:
+            writer.write(self._codec.frame(serialized))
+        await writer.drain()
+        # A resent final packet closes the submission's journal, as it would have the first time.
+        for serialized in replay:
+            self._journal.written(serialized)
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> dict:
+        size = PacketManager.SIZE_PACK.unpack(await reader.readexactly(PacketManager.SIZE_PACK.size))[0]
+        return self._codec.decode(await reader.readexactly(size))
+
+    async def _read_forever_async(self, reader: asyncio.StreamReader, dispatcher: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._closed:
+            try:
+                packet = await asyncio.wait_for(self._read_packet(reader), timeout=READ_TIMEOUT)
+            except (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError, zlib.error, ValueError):
+                if not self._closed:
+                    log.warning('Lost connection to site: [%s]:%s', self.host, self.port)
+                return
+
+            try:
+                await loop.run_in_executor(dispatcher, self._receive_packet, packet)
+            except Exception:
+                log.exception('Exception while handling packet from site! Quitting judge.')
+                # Same sledgehammer as `PacketManager._read_forever`.
+                os._exit(1)
+
+    async def _write_forever(self, writer: asyncio.StreamWriter) -> None:
+        assert self._wakeup is not None
+        try:
+            while True:
+                self._wakeup.clear()
+                chunks = self._next_outbound()
+                if not chunks:
+                    await self._wakeup.wait()
+                    continue
+
+                for serialized in chunks:
+                    self._journal.written(serialized, delivered=False)
+                    writer.write(self._codec.frame(serialized))
+                # Waiting for the site to accept what we wrote is what gives results time to pile up and coalesce.
+                await writer.drain()
+                for serialized in chunks:
+                    self._journal.written(serialized)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # connection reset by peer
+            log.exception('Exception while sending packet to site: [%s]:%s', self.host, self.port)
+            # The reader notices the connection is gone, and `_run` reconnects and replays the journal.
+            self._close_writer()
+
+    def _close_writer(self) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        if self._wakeup is not None:
+            self._wakeup.set()
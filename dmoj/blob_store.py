@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Name of the blob store folder in a problem root. It starts with a dot, so problem globs skip it.
+BLOBS_DIR = '.blobs'
+DERIVED_DIR = 'derived'
+# Set on every blob, and so on every file linked to one.
+DIGEST_XATTR = 'user.dmoj.sha256'
+# Blobs linked or unlinked less than this many seconds ago are left alone by the garbage collector, in case they are
+# about to be linked somewhere.
+GRACE_PERIOD = 300
+CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def file_digest(path: str) -> Optional[str]:
+    """
+    Returns the digest of a file linked to a blob, or None if it isn't one (or the filesystem can't tell us).
+    """
+    try:
+        return os.getxattr(path, DIGEST_XATTR).decode('ascii')
+    except (OSError, AttributeError):
+        return None
+
+
+def find_blob_store(path: str) -> Optional['BlobStore']:
+    """
+    Returns the blob store of the problem root that a folder is in, if that problem root has one.
+    """
+    path = os.path.abspath(path)
+    while True:
+        blobs = os.path.join(path, BLOBS_DIR)
+        if os.path.isdir(blobs):
+            return BlobStore(blobs)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+class BlobStore:
+    """
+    Stores files by the SHA-256 of their contents, as `<root>/<first two digits>/<digest>`, hard linked wherever they
+    are used, so that test data shared between problems is only stored, and cached in memory, once. Blobs are
+    read-only, since every link to them shares them.
+
+    A blob's link count is its reference count: blobs that aren't linked from outside the store are deleted by
+    `collect`. Files derived from a blob, like its normalized form, are blobs too, linked from
+    `<root>/derived/<kind>/<digest>`, and are deleted along with the blob they were derived from.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def derived_path(self, digest: str, kind: str) -> str:
+        return os.path.join(self.root, DERIVED_DIR, kind, digest)
+
+    def add(self, path: str) -> str:
+        """
+        Stores a file, replacing it with a link to the blob with the same contents if there already is one. The file
+        must be on the same filesystem as the store. Returns its digest.
+        """
+        digest = hash_file(path)
+        blob = self.path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        while True:
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                pass
+            else:
+                try:
+                    os.setxattr(blob, DIGEST_XATTR, digest.encode('ascii'))
+                except (OSError, AttributeError):
+                    log.debug('Filesystem does not support extended attributes: %s', blob)
+                os.chmod(blob, 0o444)
+                return digest
+
+            if os.path.samefile(path, blob):
+                return digest
+            if os.path.getsize(blob) != os.path.getsize(path):
+                # Someone wrote to a file linked to the blob; no one should be linked to it any more.
+                log.warning('Blob %s was modified, replacing it', blob)
+                os.unlink(blob)
+                continue
+
+            temp_path = path + '.blob'
+            try:
+                os.link(blob, temp_path)
+            except FileNotFoundError:
+                # Collected just now, so this one takes its place.
+                continue
+            os.replace(temp_path, path)
+            return digest
+
+    def derived(self, digest: str, kind: str) -> Optional[str]:
+        path = self.derived_path(digest, kind)
+        return path if os.path.exists(path) else None
+
+    def add_derived(self, digest: str, kind: str, path: str) -> str:
+        """
+        Stores a file derived from the blob with the given digest, moving it into the store. Returns its new path.
+        """
+        derived_path = self.derived_path(digest, kind)
+        os.makedirs(os.path.dirname(derived_path), exist_ok=True)
+        self.add(path)
+        os.replace(path, derived_path)
+        return derived_path
+
+    def collect(self) -> Tuple[int, int]:
+        """
+        Deletes the blobs that are no longer linked from outside the store, and the files derived from them. Returns
+        how many blobs were deleted, and how many bytes that freed.
+        """
+        cutoff = time.time() - GRACE_PERIOD
+
+        # Links from derived files don't keep a blob alive.
+        derived_links: Dict[int, int] = defaultdict(int)
+        derived_files: Dict[str, List[str]] = defaultdict(list)
+        derived_root = os.path.join(self.root, DERIVED_DIR)
+        for kind in self._listdir(derived_root):
+            for digest in self._listdir(os.path.join(derived_root, kind)):
+                path = os.path.join(derived_root, kind, digest)
+                try:
+                    derived_links[os.lstat(path).st_ino] += 1
+                except OSError:
+                    continue
+                derived_files[digest].append(path)
+
+        blobs = [
+            os.path.join(self.root, prefix, digest)
+            for prefix in self._listdir(self.root)
+            if prefix != DERIVED_DIR
+            for digest in self._listdir(os.path.join(self.root, prefix))
+        ]
+        for digest in derived_files.keys() - {os.path.basename(blob) for blob in blobs}:
+            for path in derived_files.pop(digest):
+                self._unlink(path)
+        for blob in blobs:
+            stat = self._stat(blob)
+            digest = os.path.basename(blob)
+            if stat is not None and digest in derived_files and stat.st_ctime < cutoff:
+                if stat.st_nlink - 1 - derived_links[stat.st_ino] <= 0:
+                    for path in derived_files[digest]:
+                        self._unlink(path)
+
+        deleted = freed = 0
+        for blob in blobs:
+            stat = self._stat(blob)
+            # ctime changes whenever a link is made or removed.
+            if stat is not None and stat.st_nlink == 1 and stat.st_ctime < cutoff and self._unlink(blob):
+                deleted += 1
+                freed += stat.st_size
+
+        if deleted:
+            log.info('Deleted %d unused blobs, freeing %.1f MiB', deleted, freed / 1048576)
+        return deleted, freed
+
+    @staticmethod
+    def _stat(path: str) -> Optional[os.stat_result]:
+        try:
+            return os.lstat(path)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _listdir(path: str) -> List[str]:
+        try:
+            return os.listdir(path)
+        except OSError:
+            return []
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            log.exception('Failed to delete blob %s', path)
+            return False
+        return True
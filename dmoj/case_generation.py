@@ -0,0 +1,75 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List
+
+from dmoj.problem import TestCase
+
+log = logging.getLogger(__name__)
+
+
+class CaseGenerationPool:
+    """
+    Runs the generators of a submission's test cases ahead of time, on CPUs that submissions don't run on, so that a
+    case's data is usually ready by the time it is graded instead of being generated right before.
+
+    Cases are generated in order, at most `concurrency` at a time. To bound how much generated data is held at once, no
+    more than `lookahead` cases are generated but not yet graded.
+    """
+
+    def __init__(self, cases: List[TestCase], cpu_affinity: List[int], concurrency: int, lookahead: int) -> None:
+        self.cpu_affinity = cpu_affinity
+        self.concurrency = concurrency
+        self.lookahead = max(lookahead, concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._lock = threading.Lock()
+        self._queued: Deque[TestCase] = deque(case for case in cases if case.uses_generator())
+        self._futures: Dict[TestCase, Future] = {}
+        self._fill()
+
+    def done(self, case: TestCase) -> None:
+        """
+        Marks a case as graded or short-circuited, cancelling its generation if it hasn't finished, and making room to
+        generate the next ones.
+        """
+        with self._lock:
+            future = self._futures.pop(case, None)
+            try:
+                self._queued.remove(case)
+            except ValueError:
+                pass
+        if future is not None:
+            self._cancel(case, future)
+        self._fill()
+
+    def discard_all(self) -> None:
+        """
+        Cancels the generation of every case that isn't done yet.
+        """
+        with self._lock:
+            self._queued.clear()
+            futures, self._futures = self._futures, {}
+        for case, future in futures.items():
+            self._cancel(case, future)
+
+    def close(self) -> None:
+        self.discard_all()
+        self._pool.shutdown(wait=True)
+
+    def _fill(self) -> None:
+        with self._lock:
+            while self._queued and len(self._futures) < self.lookahead:
+                case = self._queued.popleft()
+                self._futures[case] = self._pool.submit(self._generate, case)
+
+    def _cancel(self, case: TestCase, future: Future) -> None:
+        if not future.cancel() and not future.done():
+            case.abort_generation()
+
+    def _generate(self, case: TestCase) -> None:
+        try:
+            case.generate(cpu_affinity=self.cpu_affinity)
+        except Exception:
+            # Nothing is kept on failure, so this is reported when the case is graded, as it always was.
+            log.debug('Failed to generate data for %s ahead of time', case, exc_info=True)
@@ -14,6 +14,7 @@ from dmoj.checkers import (
     standard,
     unordered,
 )
+from dmoj.checkers._streaming import StreamingChecker
 from dmoj.result import CheckerResult
 
 CheckerOutput = Union[bool, CheckerResult]
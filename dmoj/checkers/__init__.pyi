@@ -1,5 +1,6 @@
 from typing import Protocol, Union
 
+from dmoj.checkers._streaming import StreamingChecker as StreamingChecker
 from dmoj.result import CheckerResult
 
 CheckerOutput = Union[bool, CheckerResult]
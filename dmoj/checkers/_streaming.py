@@ -0,0 +1,178 @@
+import re
+from typing import Callable, List, Optional, Tuple, Union
+
+from dmoj.result import CheckerResult
+
+# How much of the expected output is split at a time, so that it is never held split all at once.
+JUDGE_BLOCK_SIZE = 65536
+
+_LINE_BREAK = re.compile(b'[\r\n]')
+
+
+class StreamingChecker:
+    """
+    Checks the output of a submission as it is produced, instead of once the submission has exited.
+
+    Checker modules may provide one through a `stream(judge_output, **kwargs)` function, which takes the same arguments
+    as `check` except for the participant's output. It is fed that output in chunks, and once `feed` returns False,
+    the output is known to be wrong whatever follows, and the submission can be stopped.
+    """
+
+    def feed(self, data: bytes) -> bool:
+        raise NotImplementedError
+
+    def finish(self) -> Union[bool, CheckerResult]:
+        raise NotImplementedError
+
+
+class TokenSplitter:
+    """
+    Splits a stream into whitespace-separated tokens, as `bytes.split` splits a whole buffer.
+    """
+
+    def __init__(self) -> None:
+        self._partial: List[bytes] = []
+        self.pending = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        tokens = data.split()
+        if not tokens:
+            return self.finish() if data else []
+        if len(tokens) == 1 and len(tokens[0]) == len(data):
+            # Still the same token, which is kept in pieces so that a long one isn't copied over and over.
+            self._partial.append(data)
+            self.pending += len(data)
+            return []
+
+        if self._partial:
+            if data[:1].isspace():
+                tokens.insert(0, b''.join(self._partial))
+            else:
+                tokens[0] = b''.join(self._partial) + tokens[0]
+            self._partial = []
+            self.pending = 0
+        if not data[-1:].isspace():
+            self._partial.append(tokens.pop())
+            self.pending = len(self._partial[0])
+        return tokens
+
+    def finish(self) -> List[bytes]:
+        tokens = [b''.join(self._partial)] if self._partial else []
+        self._partial = []
+        self.pending = 0
+        return tokens
+
+
+class LineSplitter:
+    """
+    Splits a stream into lines at every `\\r` and `\\n`, as `re.split(b'[\\r\\n]', ...)` splits a whole buffer. Like
+    that, there is always a last line, even if it is empty.
+    """
+
+    def __init__(self) -> None:
+        self._partial: List[bytes] = []
+        self.pending = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        lines = _LINE_BREAK.split(data)
+        if len(lines) == 1:
+            self._partial.append(data)
+            self.pending += len(data)
+            return []
+
+        if self._partial:
+            lines[0] = b''.join(self._partial) + lines[0]
+        last = lines.pop()
+        self._partial = [last]
+        self.pending = len(last)
+        return lines
+
+    def finish(self) -> List[bytes]:
+        lines = [b''.join(self._partial)]
+        self._partial = []
+        self.pending = 0
+        return lines
+
+
+Splitter = Union[TokenSplitter, LineSplitter]
+
+
+class Matcher:
+    """
+    Matches the items (tokens or lines) of a participant's output against those of the expected output, as they are
+    fed. Both outputs are split the same way, and `transform` is applied to the items of both before they're compared.
+
+    Once they differ, `mismatch` holds the expected and found items, either of which is None if that output ended
+    first, and `matched` the number of items before them. If items are compared `exactly`, one begun after the expected
+    output has ended is a mismatch before it is complete. An item that differs is otherwise only found once it is
+    complete, so that it is reported whole.
+    """
+
+    def __init__(
+        self,
+        judge_output: bytes,
+        splitter: Callable[[], Splitter],
+        transform: Optional[Callable[[List[bytes]], List[bytes]]] = None,
+        exactly: bool = False,
+    ) -> None:
+        self._judge_output = judge_output
+        self._judge_offset: Optional[int] = 0
+        self._judge = splitter()
+        self._process = splitter()
+        self._transform = transform
+        self._exactly = exactly
+        self._expected: List[bytes] = []
+        self._index = 0
+        self.matched = 0
+        self.mismatch: Optional[Tuple[Optional[bytes], Optional[bytes]]] = None
+
+    def feed(self, data: bytes) -> bool:
+        if self.mismatch is not None or not self._match(self._process.feed(data)):
+            return False
+        if self._exactly and self._process.pending and not self._more_expected():
+            self.mismatch = (None, self._process.finish()[0])
+            return False
+        return True
+
+    def finish(self) -> bool:
+        if self.mismatch is not None or not self._match(self._process.finish()):
+            return False
+        if self._more_expected():
+            self.mismatch = (self._expected[self._index], None)
+            return False
+        return True
+
+    def _more_expected(self) -> bool:
+        while self._index >= len(self._expected):
+            if self._judge_offset is None:
+                return False
+            if self._judge_offset >= len(self._judge_output):
+                items = self._judge.finish()
+                self._judge_offset = None
+            else:
+                items = self._judge.feed(self._judge_output[self._judge_offset : self._judge_offset + JUDGE_BLOCK_SIZE])
+                self._judge_offset += JUDGE_BLOCK_SIZE
+            self._expected = self._transform(items) if self._transform else items
+            self._index = 0
+        return True
+
+    def _match(self, items: List[bytes]) -> bool:
+        if self._transform:
+            items = self._transform(items)
+        i = 0
+        while i < len(items):
+            if not self._more_expected():
+                self.mismatch = (None, items[i])
+                return False
+
+            count = min(len(items) - i, len(self._expected) - self._index)
+            if items[i : i + count] != self._expected[self._index : self._index + count]:
+                differs = next(k for k in range(count) if items[i + k] != self._expected[self._index + k])
+                self.matched += differs
+                self.mismatch = (self._expected[self._index + differs], items[i + differs])
+                return False
+
+            i += count
+            self._index += count
+            self.matched += count
+        return True
@@ -11,13 +11,15 @@ from dmoj.utils.helper_files import compile_with_auxiliary_files, mkdtemp, mktem
 from dmoj.utils.unicode import utf8text
 
 
-def get_executor(problem_id, storage_namespace, files, flags, lang, compiler_time_limit):
+def get_executor(problem_id, storage_namespace, files, flags, lang, compiler_time_limit, problem_root=None):
     if isinstance(files, str):
         filenames = [files]
     elif isinstance(files.unwrap(), list):
         filenames = list(files.unwrap())
 
-    filenames = [os.path.join(get_problem_root(problem_id, storage_namespace), f) for f in filenames]
+    if problem_root is None:
+        problem_root = get_problem_root(problem_id, storage_namespace)
+    filenames = [os.path.join(problem_root, f) for f in filenames]
     executor = compile_with_auxiliary_files(storage_namespace, filenames, flags, lang, compiler_time_limit)
 
     return executor
@@ -43,6 +45,7 @@ def check(
     output_name=None,
     treat_checker_points_as_percentage=False,
     storage_namespace=None,
+    problem_root=None,
     **kwargs,
 ) -> CheckerResult:
 
@@ -55,7 +58,7 @@ def check(
         flags.append('-DTHEMIS')
     elif type == 'cms':
         flags.append('-DCMS')
-    executor = get_executor(problem_id, storage_namespace, files, flags, lang, compiler_time_limit)
+    executor = get_executor(problem_id, storage_namespace, files, flags, lang, compiler_time_limit, problem_root)
 
     if type not in contrib_modules:
         raise InternalError('%s is not a valid contrib module' % type)
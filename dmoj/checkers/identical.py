@@ -1,6 +1,8 @@
-from typing import Union
+from typing import Optional, Union
 
 from dmoj.checkers._checker import standard
+from dmoj.checkers._streaming import StreamingChecker
+from dmoj.checkers.standard import StandardStream
 from dmoj.result import CheckerResult
 from dmoj.utils.unicode import utf8bytes
 
@@ -17,3 +19,38 @@ def check(process_output: bytes, judge_output: bytes, pe_allowed: bool = True, *
             feedback = 'Presentation Error, check your whitespace'
             extended_feedback = standard_feedback.decode('utf-8')
     return CheckerResult(False, 0, feedback=feedback, extended_feedback=extended_feedback)
+
+
+class IdenticalStream(StreamingChecker):
+    def __init__(self, judge_output: bytes, point_value: float, pe_allowed: bool) -> None:
+        self.judge_output = utf8bytes(judge_output)
+        self.offset = 0
+        self.identical = True
+        # Output that isn't identical may still be a presentation error, until the standard checker rejects it too.
+        self.standard: Optional[StandardStream] = StandardStream(judge_output, point_value) if pe_allowed else None
+        self.standard_passing = pe_allowed
+
+    def feed(self, data: bytes) -> bool:
+        if self.identical:
+            self.identical = self.judge_output[self.offset : self.offset + len(data)] == data
+            self.offset += len(data)
+        if self.standard_passing:
+            assert self.standard is not None
+            self.standard_passing = self.standard.feed(data)
+        return self.identical or self.standard_passing
+
+    def finish(self) -> Union[CheckerResult, bool]:
+        if self.identical and self.offset == len(self.judge_output):
+            return True
+        feedback = None
+        extended_feedback = None
+        if self.standard is not None:
+            standard_result = self.standard.finish()
+            if standard_result.passed:
+                feedback = 'Presentation Error, check your whitespace'
+                extended_feedback = standard_result.extended_feedback
+        return CheckerResult(False, 0, feedback=feedback, extended_feedback=extended_feedback)
+
+
+def stream(judge_output: bytes, point_value: float, pe_allowed: bool = True, **kwargs) -> IdenticalStream:
+    return IdenticalStream(judge_output, point_value, pe_allowed)
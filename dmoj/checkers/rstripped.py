@@ -1,5 +1,7 @@
 from re import split as resplit
+from typing import List
 
+from dmoj.checkers._streaming import LineSplitter, Matcher, StreamingChecker
 from dmoj.utils.unicode import utf8bytes
 
 
@@ -19,3 +21,24 @@ def check(process_output: bytes, judge_output: bytes, **kwargs) -> bool:
             return False
 
     return True
+
+
+class RstrippedStream(StreamingChecker):
+    def __init__(self, judge_output: bytes, filter_new_line: bool) -> None:
+        self.filter_new_line = filter_new_line
+        self.matcher = Matcher(utf8bytes(judge_output), LineSplitter, self._transform)
+
+    def _transform(self, lines: List[bytes]) -> List[bytes]:
+        if self.filter_new_line:
+            lines = list(filter(None, lines))
+        return [line.rstrip() for line in lines]
+
+    def feed(self, data: bytes) -> bool:
+        return self.matcher.feed(data)
+
+    def finish(self) -> bool:
+        return self.matcher.finish()
+
+
+def stream(judge_output: bytes, **kwargs) -> RstrippedStream:
+    return RstrippedStream(judge_output, bool(kwargs.get('filter_new_line')))
@@ -1,6 +1,7 @@
 from typing import Callable
 
 from dmoj.checkers._checker import standard
+from dmoj.checkers._streaming import Matcher, StreamingChecker, TokenSplitter
 from dmoj.result import CheckerResult
 from dmoj.utils.unicode import utf8bytes
 
@@ -16,4 +17,54 @@ def check(
     return CheckerResult(passed, point_value if passed else 0, extended_feedback=feedback.decode('utf-8'))
 
 
+def _compress(token: bytes) -> bytes:
+    return token if len(token) <= 64 else token[:30] + b'...' + token[-31:]
+
+
+def _english_ending(x: int) -> str:
+    x %= 100
+    if x // 10 == 1:
+        return 'th'
+    return {1: 'st', 2: 'nd', 3: 'rd'}.get(x % 10, 'th')
+
+
+class StandardStream(StreamingChecker):
+    """
+    The standard checker, token by token as output is produced. Its feedback is that of the native checker, since a
+    token that differs is only reported once it is complete.
+    """
+
+    def __init__(self, judge_output: bytes, point_value: float) -> None:
+        self.point_value = point_value
+        self.matcher = Matcher(utf8bytes(judge_output), TokenSplitter, exactly=True)
+
+    def feed(self, data: bytes) -> bool:
+        return self.matcher.feed(data)
+
+    def finish(self) -> CheckerResult:
+        passed = self.matcher.finish()
+        if passed:
+            feedback = b'%d token(s)' % self.matcher.matched
+        else:
+            assert self.matcher.mismatch is not None
+            expected, found = self.matcher.mismatch
+            if expected is None:
+                feedback = b"Participant's output contains extra tokens"
+            elif found is None:
+                feedback = b"Unexpected EOF in the participant's output"
+            else:
+                position = self.matcher.matched + 1
+                feedback = b"%d%s token differs - expected: '%s', found: '%s'" % (
+                    position,
+                    _english_ending(position).encode(),
+                    _compress(expected),
+                    _compress(found),
+                )
+        return CheckerResult(passed, self.point_value if passed else 0, extended_feedback=feedback.decode('utf-8'))
+
+
+def stream(judge_output: bytes, point_value: float, **kwargs) -> StandardStream:
+    return StandardStream(judge_output, point_value)
+
+
 del standard
@@ -4,6 +4,7 @@ from dmoj.commands.base_command import Command, commands, register_command
 from dmoj.commands.diff import DifferenceCommand
 from dmoj.commands.help import HelpCommand
 from dmoj.commands.locate import LocateCommand
+from dmoj.commands.manifest import ManifestCommand
 from dmoj.commands.problems import ListProblemsCommand
 from dmoj.commands.quit import QuitCommand
 from dmoj.commands.rejudge import RejudgeCommand
@@ -27,4 +28,5 @@ all_commands: List[Type[Command]] = [
     HelpCommand,
     QuitCommand,
     ValidateCommand,
+    ManifestCommand,
 ]
@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import traceback
+from typing import Optional, Tuple
+
+from dmoj.commands.base_command import Command
+from dmoj.error import InvalidCommandException
+from dmoj.judgeenv import get_supported_problems
+from dmoj.problem import cache_problem
+from dmoj.problem_manifest import prune_manifests
+from dmoj.utils.ansi import print_ansi
+
+
+def _build_manifest(problem_id: str) -> Tuple[str, bool, Optional[str]]:
+    try:
+        return problem_id, cache_problem(problem_id), None
+    except Exception:
+        return problem_id, False, traceback.format_exc()
+
+
+class ManifestCommand(Command):
+    name = 'manifest'
+    help = 'Parses problems ahead of time, writing manifests that the judge loads them from.'
+
+    def _populate_parser(self) -> None:
+        self.arg_parser.add_argument('problem_ids', nargs='*', help='ids of problems to parse (default: all)')
+        self.arg_parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=os.cpu_count(),
+            help='number of problems to parse at once',
+            metavar='<jobs>',
+        )
+
+    def execute(self, line: str) -> int:
+        args = self.arg_parser.parse_args(line)
+        if args.jobs < 1:
+            raise InvalidCommandException('--jobs must be >= 1')
+
+        supported_problems = set(get_supported_problems())
+        unknown_problems = ', '.join(
+            f"'{problem_id}'" for problem_id in args.problem_ids if problem_id not in supported_problems
+        )
+        if unknown_problems:
+            raise InvalidCommandException(f'unknown problem(s) {unknown_problems}')
+        problem_ids = args.problem_ids or sorted(supported_problems)
+
+        written = failed = 0
+        # Parsing init.yml is done in pure Python, so only processes can do it in parallel.
+        with multiprocessing.Pool(min(args.jobs, len(problem_ids) or 1)) as pool:
+            for problem_id, wrote, error in pool.imap_unordered(_build_manifest, problem_ids):
+                if error is not None:
+                    print_ansi(f'#ansi[Failed](red|bold) to parse #ansi[{problem_id}](cyan|bold):')
+                    print(error.rstrip())
+                    failed += 1
+                elif wrote:
+                    written += 1
+
+        pruned = prune_manifests()
+        print_ansi(
+            f'Wrote #ansi[{written}](green|bold) manifest(s), '
+            f'{len(problem_ids) - written - failed} already up to date, '
+            f'pruned {pruned} of problems that are gone.'
+        )
+        if failed:
+            print_ansi(f'#ansi[{failed} problem(s) could not be parsed.](red|bold)')
+        return failed
@@ -111,3 +111,23 @@ class MemfdIO(MmapableIO):
 # (UnnamedFileIO). On FreeBSD and some other systems, /proc/[pid]/fd doesn't
 # exist, so to_path() will not work. We fall back to NamedFileIO in that case.
 MemoryIO = next((i for i in (MemfdIO, UnnamedFileIO, NamedFileIO) if i.usable_with_name()))
+
+
+class SharedFileIO(MmapableIO):
+    """
+    A file already on disk, opened read-only, so that every process reading it shares one copy in the page cache
+    instead of each having its own in memory.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(os.open(path, os.O_RDONLY | os.O_CLOEXEC))
+
+    def seal(self) -> None:
+        self.seek(0, os.SEEK_SET)
+
+    def to_path(self) -> str:
+        return f'/proc/{os.getpid()}/fd/{self.fileno()}'
+
+    @classmethod
+    def usable_with_name(cls) -> bool:
+        return MemoryIO is not NamedFileIO
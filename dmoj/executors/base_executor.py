@@ -5,6 +5,7 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import traceback
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 
@@ -335,7 +336,11 @@ class BaseExecutor(metaclass=ExecutorMeta):
             create_symlink(dst, src)
 
         agent = self._file('setbufsize.so')
-        shutil.copyfile(setbufsize_path, agent)
+        # Cases may be launched concurrently from several threads, so never let a starting process see a partially
+        # copied agent.
+        agent_copy = self._file('setbufsize.so.%d' % threading.get_ident())
+        shutil.copyfile(setbufsize_path, agent_copy)
+        os.replace(agent_copy, agent)
         child_env = {
             # Forward LD_LIBRARY_PATH for systems (e.g. Android Termux) that require
             # it to find shared libraries
@@ -367,7 +372,7 @@ class BaseExecutor(metaclass=ExecutorMeta):
             cwd=utf8bytes(self._dir),
             nproc=self.get_nproc(),
             fsize=self.fsize,
-            cpu_affinity=env.submission_cpu_affinity,
+            cpu_affinity=kwargs.get('cpu_affinity') or env.submission_cpu_affinity,
         )
 
     @classmethod
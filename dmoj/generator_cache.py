@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import Iterable, Optional, Sequence, Tuple
+
+from dmoj.judgeenv import env
+from dmoj.utils.os_ext import private_dir
+
+log = logging.getLogger(__name__)
+
+# Bumped whenever what goes into a key changes, so that old entries are never mistaken for new ones.
+KEY_VERSION = 1
+INPUT = 'input'
+OUTPUT = 'output'
+
+
+def generator_key(
+    filenames: Sequence[str], flags: Iterable[str], args: Iterable[str], lang: Optional[str], stdin: Optional[bytes]
+) -> str:
+    """
+    Returns what identifies a run of a generator: the name and contents of its sources, how it is compiled, and what it
+    is given. Anything else a generator's output depends on makes it non-deterministic.
+    """
+    h = hashlib.sha256()
+
+    def update(value: bytes) -> None:
+        # Length-prefixed, so that no two different sequences of values hash the same.
+        h.update(b'%d:' % len(value))
+        h.update(value)
+
+    update(b'%d' % KEY_VERSION)
+    update((lang or '').encode())
+    for filename in filenames:
+        update(os.path.basename(filename).encode('utf-8', 'surrogateescape'))
+        with open(filename, 'rb') as f:
+            update(hashlib.sha256(f.read()).digest())
+    update(b'flags')
+    for flag in flags:
+        update(flag.encode())
+    update(b'args')
+    for arg in args:
+        update(arg.encode())
+    update(b'stdin' if stdin is not None else b'no stdin')
+    update(stdin or b'')
+    return h.hexdigest()
+
+
+class GeneratorCache:
+    """
+    The input and expected output of generator runs, by `generator_key`, so that a deterministic generator runs once
+    rather than once per submission. Each entry is a read-only folder, and the least recently used ones are deleted to
+    keep the cache under `size` bytes.
+
+    Since entries are used as test data, the cache must be in a folder that only we can write to.
+    """
+
+    def __init__(self, root: str, size: int) -> None:
+        self.root = root
+        self.size = size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the paths of the input and expected output of a cached run. They may be deleted by the time they're
+        opened, which is as good as a miss.
+        """
+        path = self.path(key)
+        try:
+            # The mtime is when the entry was last used.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return os.path.join(path, INPUT), os.path.join(path, OUTPUT)
+
+    def add(self, key: str, input_path: str, output: bytes) -> None:
+        private_dir(self.root)
+        entry = tempfile.mkdtemp(dir=self.root, prefix='.')
+        try:
+            shutil.copyfile(input_path, os.path.join(entry, INPUT))
+            with open(os.path.join(entry, OUTPUT), 'wb') as f:
+                f.write(output)
+            for name in (INPUT, OUTPUT):
+                os.chmod(os.path.join(entry, name), 0o444)
+            try:
+                os.rename(entry, self.path(key))
+            except OSError:
+                # Whoever ran the generator at the same time added the same entry.
+                if not os.path.isdir(self.path(key)):
+                    raise
+        finally:
+            shutil.rmtree(entry, ignore_errors=True)
+        self._trim()
+
+    def _trim(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                size = sum(os.stat(os.path.join(entry.path, name)).st_size for name in (INPUT, OUTPUT))
+            except FileNotFoundError:
+                continue
+            entries.append((mtime, size, entry.path))
+            total += size
+
+        if total <= self.size:
+            return
+        # Workers still reading an entry we delete keep reading it.
+        for _, size, path in sorted(entries):
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            if total <= self.size:
+                break
+
+
+def generator_cache() -> Optional[GeneratorCache]:
+    if env.generator_cache_size <= 0:
+        return None
+    root = env.generator_cache_dir or os.path.join(env.tempdir or tempfile.gettempdir(), 'dmoj-generator-cache')
+    try:
+        return GeneratorCache(private_dir(root), env.generator_cache_size)
+    except OSError:
+        log.warning('Not caching generator output in %s', root, exc_info=True)
+        return None
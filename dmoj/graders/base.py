@@ -1,4 +1,5 @@
-from typing import Optional, TYPE_CHECKING
+from contextlib import nullcontext
+from typing import ContextManager, List, Optional, TYPE_CHECKING
 
 from dmoj.cptbox import TracedPopen
 from dmoj.executors.base_executor import BaseExecutor
@@ -11,12 +12,17 @@ if TYPE_CHECKING:
 
 
 class BaseGrader:
+    # Whether copies of this grader may grade different cases of one submission at the same time.
+    supports_parallel_cases = False
+
     source: bytes
     language: str
     problem: Problem
     judge: 'JudgeWorker'
     binary: BaseExecutor
     _current_proc: Optional[TracedPopen]
+    cpu_affinity: Optional[List[int]] = None
+    _checker_lock: ContextManager = nullcontext()
 
     def __init__(self, judge: 'JudgeWorker', problem: Problem, language: str, source: bytes) -> None:
         self.source = utf8bytes(source)
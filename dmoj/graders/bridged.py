@@ -11,7 +11,7 @@ from dmoj.cptbox.filesystem_policies import ExactFile
 from dmoj.error import CompileError, InternalError
 from dmoj.executors.base_executor import BaseExecutor
 from dmoj.graders.standard import StandardGrader
-from dmoj.judgeenv import env, get_problem_root
+from dmoj.judgeenv import env
 from dmoj.problem import Problem, TestCase
 from dmoj.result import Result
 from dmoj.utils.helper_files import compile_with_auxiliary_files, mktemp
@@ -22,6 +22,9 @@ if TYPE_CHECKING:
 
 
 class BridgedInteractiveGrader(StandardGrader):
+    supports_parallel_cases = False
+    streams_output = False
+
     handler_data: ConfigNode
     interactor_binary: BaseExecutor
     contrib_type: str
@@ -133,9 +136,7 @@ class BridgedInteractiveGrader(StandardGrader):
             filenames = [files]
         elif isinstance(files.unwrap(), list):
             filenames = list(files.unwrap())
-        problem_root = get_problem_root(self.problem.id, self.problem.storage_namespace)
-        assert problem_root is not None
-        filenames = [os.path.join(problem_root, f) for f in filenames]
+        filenames = [os.path.join(self.problem.root_dir, f) for f in filenames]
         flags = self.handler_data.get('flags', [])
         unbuffered = self.handler_data.get('unbuffered', True)
         return compile_with_auxiliary_files(
@@ -15,7 +15,7 @@ from dmoj.error import InternalError
 from dmoj.executors import executors
 from dmoj.executors.base_executor import BaseExecutor
 from dmoj.graders.standard import StandardGrader
-from dmoj.judgeenv import env, get_problem_root
+from dmoj.judgeenv import env
 from dmoj.problem import Problem, TestCase
 from dmoj.result import Result
 from dmoj.utils.helper_files import compile_with_auxiliary_files
@@ -50,6 +50,9 @@ def merge_results(first_result: Result, second_result: Result):
 
 
 class CommunicationGrader(StandardGrader):
+    supports_parallel_cases = False
+    streams_output = False
+
     _fifo_dir: List[str]
     _fifo_user_to_manager: List[str]
     _fifo_manager_to_user: List[str]
@@ -246,9 +249,7 @@ class CommunicationGrader(StandardGrader):
             filenames = [files]
         elif isinstance(files.unwrap(), list):
             filenames = list(files.unwrap())
-        problem_root = get_problem_root(self.problem.id, self.problem.storage_namespace)
-        assert problem_root is not None
-        filenames = [os.path.join(problem_root, f) for f in filenames]
+        filenames = [os.path.join(self.problem.root_dir, f) for f in filenames]
         flags = self.handler_data.manager.get('flags', [])
         unbuffered = self.handler_data.manager.get('unbuffered', True)
         lang = self.handler_data.manager.lang
@@ -1,15 +1,15 @@
 import os
 
-from dmoj.judgeenv import get_problem_root
 from dmoj.utils.module import load_module_from_file
 
 
 class CustomGrader:
+    # Custom graders may keep arbitrary per-case state, so never grade their cases concurrently.
+    supports_parallel_cases = False
+
     def __init__(self, judge, problem, language, source):
         self.judge = judge
-        self.mod = load_module_from_file(
-            os.path.join(get_problem_root(problem.id, problem.storage_namespace), problem.config['custom_judge'])
-        )
+        self.mod = load_module_from_file(os.path.join(problem.root_dir, problem.config['custom_judge']))
         self._grader = self.mod.Grader(judge, problem, language, source)
 
     def __getattr__(self, item):
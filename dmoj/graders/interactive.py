@@ -103,6 +103,9 @@ class Interactor:
 
 
 class InteractiveGrader(StandardGrader):
+    supports_parallel_cases = False
+    streams_output = False
+
     check: CheckerOutput
 
     def _launch_process(self, case, input_file=None):
@@ -15,6 +15,8 @@ if TYPE_CHECKING:
 
 
 class OutputOnlyGrader(StandardGrader):
+    supports_parallel_cases = False
+
     def __init__(self, judge: 'JudgeWorker', problem: Problem, language: str, source: bytes) -> None:
         super().__init__(judge, problem, language, source)
         if language == 'OUTPUT':
@@ -0,0 +1,145 @@
+import copy
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Set, TYPE_CHECKING
+
+from dmoj.problem import TestCase
+from dmoj.result import Result
+
+if TYPE_CHECKING:
+    from dmoj.graders.base import BaseGrader
+
+
+class ParallelCaseGrader:
+    """
+    Grades several test cases of one submission at once.
+
+    Every lane is a shallow copy of the submission's grader pinned to its own set of CPUs, so each running case has
+    its CPUs to itself and timing stays comparable to sequential grading. Cases are started in order, at most one per
+    lane, and results are handed back in the order they are asked for.
+    """
+
+    def __init__(self, grader: 'BaseGrader', cpu_affinities: List[List[int]]) -> None:
+        self._lanes: 'queue.Queue[BaseGrader]' = queue.Queue()
+        # Checkers may compile and cache helper programs, which is not safe to do concurrently.
+        checker_lock = threading.Lock()
+        for cpus in cpu_affinities:
+            lane = copy.copy(grader)
+            lane.cpu_affinity = cpus
+            lane._current_proc = None
+            lane._checker_lock = checker_lock
+            self._lanes.put(lane)
+
+        self.concurrency = len(cpu_affinities)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        self._lock = threading.Lock()
+        # Materialising test data may run generators, which share compiled executors.
+        self._data_lock = threading.Lock()
+        self._queued: Deque[TestCase] = deque()
+        self._futures: Dict[TestCase, Future] = {}
+        self._running: Dict[TestCase, 'BaseGrader'] = {}
+        self._cancelled: Set[TestCase] = set()
+        self._aborted = False
+
+    def schedule(self, cases: List[TestCase]) -> None:
+        """
+        Queues cases to be graded. Up to `concurrency` of them run at any time.
+        """
+        with self._lock:
+            self._queued.extend(cases)
+        self._fill()
+
+    def result(self, case: TestCase) -> Result:
+        """
+        Waits for the result of a scheduled case, starting the next queued case in its place.
+        """
+        future = self._futures.pop(case, None)
+        if future is None:
+            # Not started yet, e.g. because it was never scheduled; grade it now.
+            with self._lock:
+                try:
+                    self._queued.remove(case)
+                except ValueError:
+                    pass
+            future = self._pool.submit(self._grade, case)
+        try:
+            return future.result()
+        finally:
+            self._fill()
+
+    def discard(self, case: TestCase) -> None:
+        """
+        Drops a scheduled case whose result is no longer needed, killing it if it is already running.
+        """
+        future = self._futures.pop(case, None)
+        with self._lock:
+            try:
+                self._queued.remove(case)
+            except ValueError:
+                pass
+        if future is not None:
+            self._cancel(case, future)
+        self._fill()
+
+    def discard_all(self) -> None:
+        """
+        Drops every scheduled case, e.g. because the rest of a batch is being short-circuited.
+        """
+        with self._lock:
+            self._queued.clear()
+        futures, self._futures = self._futures, {}
+        for case, future in futures.items():
+            self._cancel(case, future)
+
+    def abort_grading(self) -> None:
+        self._aborted = True
+        with self._lock:
+            self._queued.clear()
+            lanes = list(self._running.values())
+        for lane in lanes:
+            lane.abort_grading()
+
+    def close(self) -> None:
+        self.discard_all()
+        self._pool.shutdown(wait=True)
+        self._cancelled.clear()
+
+    def _fill(self) -> None:
+        with self._lock:
+            while self._queued and len(self._futures) < self.concurrency:
+                case = self._queued.popleft()
+                self._futures[case] = self._pool.submit(self._grade, case)
+
+    def _cancel(self, case: TestCase, future: Future) -> None:
+        if future.cancel() or future.done():
+            return
+        with self._lock:
+            self._cancelled.add(case)
+            lane = self._running.get(case)
+        # If the lane has not launched the process yet, it runs to completion and its result is thrown away.
+        if lane is not None:
+            lane.abort_grading()
+
+    def _grade(self, case: TestCase) -> Result:
+        # There are exactly as many pool threads as lanes, so this never blocks.
+        lane = self._lanes.get()
+        try:
+            with self._lock:
+                if self._aborted or case in self._cancelled:
+                    # Nobody will look at this besides an aborting judge, which ignores results anyway.
+                    return Result(case, result_flag=Result.SC)
+                self._running[case] = lane
+
+            with self._data_lock:
+                case.input_data_io()
+
+            return lane.grade(case)
+        finally:
+            with self._lock:
+                self._running.pop(case, None)
+                self._cancelled.discard(case)
+            # A lane that killed a discarded case must still be usable for the next one.
+            lane._abort_requested = False
+            self._lanes.put(lane)
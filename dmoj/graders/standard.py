@@ -1,7 +1,8 @@
 import logging
 import subprocess
+from typing import Optional
 
-from dmoj.checkers import CheckerOutput
+from dmoj.checkers import CheckerOutput, StreamingChecker
 from dmoj.cptbox import TracedPopen
 from dmoj.cptbox.lazy_bytes import LazyBytes
 from dmoj.error import OutputLimitExceeded
@@ -14,9 +15,25 @@ from dmoj.result import CheckerResult, Result
 log = logging.getLogger('dmoj.graders')
 
 
+class _OutputRejected(Exception):
+    pass
+
+
 class StandardGrader(BaseGrader):
+    supports_parallel_cases = True
+    # Whether the output of the submission is read by `_interact_with_process`, so that it can be checked as it is
+    # produced.
+    streams_output = True
+    # The checker fed the output of the case being graded, if it is checked as the output is produced.
+    _checker_stream: Optional[StreamingChecker] = None
+    # Whether the submission was killed because its checker had already rejected its output.
+    _output_rejected = False
+
     def grade(self, case: TestCase) -> Result:
         result = Result(case)
+        self._output_rejected = False
+        # The expected output is loaded before the submission starts, so that its output is never left unread meanwhile.
+        self._checker_stream = self._open_checker_stream(case) if self.streams_output else None
 
         input_file = case.input_data_io()
 
@@ -29,7 +46,8 @@ class StandardGrader(BaseGrader):
         assert process is not None
         self.populate_result(error, result, process)
 
-        check = self.check_result(case, result)
+        with self._checker_lock:
+            check = self.check_result(case, result)
 
         # checkers must either return a boolean (True: full points, False: 0 points)
         # or a CheckerResult, so convert to CheckerResult if it returned bool
@@ -47,6 +65,11 @@ class StandardGrader(BaseGrader):
 
     def populate_result(self, error: bytes, result: Result, process: TracedPopen) -> None:
         self.binary.populate_result(error, result, process)
+        if self._output_rejected:
+            # Killing the submission for its wrong output is not a runtime error of its own.
+            result.result_flag &= ~Result.RTE
+            if not result.result_flag:
+                result.feedback = ''
 
     def check_result(self, case: TestCase, result: Result) -> CheckerOutput:
         # If the submission didn't crash and didn't time out, there's a chance it might be AC
@@ -54,24 +77,28 @@ class StandardGrader(BaseGrader):
         # might be very computationally expensive.
         # See https://github.com/DMOJ/judge-server/issues/170
         checker = case.checker()
+        stream, self._checker_stream = self._checker_stream, None
         # checker is a `partial` object, NOT a `function` object
         if not result.result_flag or getattr(checker.func, 'run_on_error', False):
             try:
-                check = checker(
-                    result.proc_output,
-                    case.output_data(),
-                    submission_source=self.source,
-                    judge_input=LazyBytes(case.input_data),
-                    point_value=case.points,
-                    case_position=case.position,
-                    batch=case.batch,
-                    submission_language=self.language,
-                    binary_data=case.has_binary_data,
-                    execution_time=result.execution_time,
-                    problem_id=self.problem.id,
-                    case=case,
-                    result=result,
-                )
+                if stream is not None:
+                    check = stream.finish()
+                else:
+                    check = checker(
+                        result.proc_output,
+                        case.output_data(),
+                        submission_source=self.source,
+                        judge_input=LazyBytes(case.input_data),
+                        point_value=case.points,
+                        case_position=case.position,
+                        batch=case.batch,
+                        submission_language=self.language,
+                        binary_data=case.has_binary_data,
+                        execution_time=result.execution_time,
+                        problem_id=self.problem.id,
+                        case=case,
+                        result=result,
+                    )
             except UnicodeDecodeError:
                 # Don't rely on problemsetters to do sane things when it comes to Unicode handling, so
                 # just proactively swallow all Unicode-related checker errors.
@@ -92,22 +119,69 @@ class StandardGrader(BaseGrader):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             wall_time=case.config.wall_time_factor * self.problem.time_limit,
+            cpu_affinity=self.cpu_affinity,
         )
 
     def _interact_with_process(self, case: TestCase, result: Result) -> bytes:
         process = self._current_proc
         assert process is not None
         try:
-            result.proc_output, error = process.communicate(
-                None, outlimit=case.config.output_limit_length, errlimit=1048576
-            )
+            if self._checker_stream is None:
+                result.proc_output, error = process.communicate(
+                    None, outlimit=case.config.output_limit_length, errlimit=1048576
+                )
+            else:
+                error = self._stream_to_checker(case, result, self._checker_stream)
         except OutputLimitExceeded:
             error = b''
             process.kill()
+        except _OutputRejected:
+            error = b''
+            process.kill()
+            self._output_rejected = True
         finally:
             process.wait()
         return error
 
+    def _open_checker_stream(self, case: TestCase) -> Optional[StreamingChecker]:
+        stream = case.streaming_checker()
+        if stream is None:
+            return None
+        return stream(
+            case.output_data(),
+            submission_source=self.source,
+            judge_input=LazyBytes(case.input_data),
+            point_value=case.points,
+            case_position=case.position,
+            batch=case.batch,
+            submission_language=self.language,
+            binary_data=case.has_binary_data,
+            problem_id=self.problem.id,
+            case=case,
+        )
+
+    def _stream_to_checker(self, case: TestCase, result: Result, stream: StreamingChecker) -> bytes:
+        process = self._current_proc
+        assert process is not None
+        # Only as much output as is shown is kept, rather than all of it, and the submission is stopped as soon as its
+        # output is known to be wrong.
+        keep = case.output_prefix_length or 0
+        prefix = bytearray()
+
+        def feed(data: bytes) -> None:
+            if len(prefix) < keep:
+                prefix.extend(data[: keep - len(prefix)])
+            if not stream.feed(data):
+                raise _OutputRejected()
+
+        try:
+            _, error = process.communicate(
+                None, outlimit=case.config.output_limit_length, errlimit=1048576, stdout_callback=feed
+            )
+        finally:
+            result.proc_output = bytes(prefix)
+        return error
+
     def _generate_binary(self) -> BaseExecutor:
         return executors[self.language].Executor(
             self.problem.id,
@@ -1,29 +1,64 @@
 #!/usr/bin/python
 import logging
 import multiprocessing
+import multiprocessing.connection
 import os
+import queue
 import signal
 import sys
 import threading
 import time
 import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import ExitStack
 from enum import Enum
 from http.server import HTTPServer
 from itertools import groupby
 from operator import itemgetter
-from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Tuple,
+    cast,
+)
 
 from dmoj import packet
+from dmoj.case_generation import CaseGenerationPool
 from dmoj.control import JudgeControlRequestHandler
 from dmoj.error import CompileError
-from dmoj.judgeenv import env, get_supported_problems_and_mtimes, startup_warnings
+from dmoj.judgeenv import (
+    ProblemScan,
+    env,
+    get_problem_root,
+    get_supported_problems_and_mtimes,
+    reconcile_supported_problems,
+    scan_problem_dirs,
+    startup_warnings,
+    update_supported_problems,
+)
 from dmoj.monitor import Monitor
-from dmoj.problem import BaseTestCase, BatchedTestCase, Problem, TestCase
+from dmoj.problem import BaseTestCase, BatchedTestCase, Problem, TestCase, cache_problem, problem_cache
 from dmoj.result import Result
+from dmoj.testcase_sync import ProblemDataSync, StorageCredentials, problem_lock, problem_version_lock
 from dmoj.utils import builtin_int_patch
 from dmoj.utils.ansi import ansi_style, print_ansi, strip_ansi
+from dmoj.utils.os_ext import lower_thread_priority
+from dmoj.utils.result_ring import PIPE_MESSAGE, ResultRing
 from dmoj.utils.unicode import unicode_stdout_stderr, utf8bytes, utf8text
 
+if TYPE_CHECKING:
+    from dmoj.graders.parallel import ParallelCaseGrader
+
 try:
     from setproctitle import setproctitle
 except ImportError:
@@ -45,12 +80,16 @@ class IPC(Enum):
     GRADING_ABORTED = 'GRADING-ABORTED'
     UNHANDLED_EXCEPTION = 'UNHANDLED-EXCEPTION'
     REQUEST_ABORT = 'REQUEST-ABORT'
+    SUBMISSION = 'SUBMISSION'
+    KEEPALIVE = 'KEEPALIVE'
 
 
 # This needs to be at least as large as the timeout for the largest compiler time limit, but we don't enforce that here.
 # (Otherwise, aborting during a compilation that exceeds this time limit would result in a `TimeoutError` IE instead of
 # a `CompileError`.)
 IPC_TIMEOUT = 60  # seconds
+# How often a worker that is busy with something other than grading, like fetching test data, tells the judge so.
+IPC_KEEPALIVE_INTERVAL = 10  # seconds
 
 
 logger = logging.getLogger(__name__)
@@ -72,20 +111,91 @@ Submission = NamedTuple(
 )
 
 
+def partition_cpu_affinity(cpus: List[int], slots: int) -> List[Optional[List[int]]]:
+    """
+    Splits the CPUs submissions may run on into `slots` contiguous, disjoint sets, one per grading slot.
+
+    If there are fewer CPUs than slots, CPUs are shared between slots round-robin, which means timing is no longer
+    isolated between concurrently grading submissions.
+    """
+    if not cpus:
+        return [None] * slots
+
+    if len(cpus) < slots:
+        logger.warning('Only %d CPUs available for %d grading slots, slots will share CPUs', len(cpus), slots)
+        return [[cpus[slot % len(cpus)]] for slot in range(slots)]
+
+    size, extra = divmod(len(cpus), slots)
+    affinities: List[Optional[List[int]]] = []
+    start = 0
+    for slot in range(slots):
+        end = start + size + (slot < extra)
+        affinities.append(cpus[start:end])
+        start = end
+    return affinities
+
+
+def spare_cpu_affinity(cpus: List[int]) -> List[int]:
+    """
+    Returns the CPUs that submissions pinned to `cpus` never run on. Submissions that aren't pinned may run anywhere.
+    """
+    if not cpus or not hasattr(os, 'sched_getaffinity'):
+        return []
+    return sorted(os.sched_getaffinity(0) - set(cpus))
+
+
 class Judge:
     def __init__(self, packet_manager: packet.PacketManager) -> None:
         self.packet_manager = packet_manager
-        self.current_judge_worker: Optional[JudgeWorker] = None
-        self._grading_lock = threading.Lock()
+        self.judge_workers: Dict[int, JudgeWorker] = {}
+        self._judge_workers_lock = threading.Lock()
+
+        # Each grading slot runs at most one submission at a time, pinned to its own set of CPUs. With a single slot
+        # and no `submission_cpu_affinity`, we keep the historical behaviour of not pinning submissions at all.
+        slots = max(1, env.grading_slots)
+        if slots > 1 and not env.submission_cpu_affinity and hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(env.submission_cpu_affinity or [])
+        self._slot_cpu_affinities = partition_cpu_affinity(cpus, slots)
+        if env.generator_cpu_affinity is None:
+            # Worker processes, which are forked from us, generate test data ahead of time on these.
+            env['generator_cpu_affinity'] = spare_cpu_affinity(cpus)
+        self._free_slots: 'queue.Queue[int]' = queue.Queue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+
+        self._worker_pool = JudgeWorkerPool(env.worker_pool_size, env.worker_max_submissions)
+        # Where to fetch problems that aren't here from, if test data is synced lazily.
+        self.problem_storage: Optional[StorageCredentials] = None
 
         self.updater_exit = False
         self.updater_signal = threading.Event()
+        # Paths that changed since the last update, or None if every problem should be looked at again.
+        self._updated_problem_paths: Optional[Set[str]] = set()
+        self._updated_problem_paths_lock = threading.Lock()
         self.updater = threading.Thread(target=self._updater_thread)
+        # A full rescan of the problem folders waiting to be applied, and the paths the updater looked at since it
+        # began, which it may have missed. Both are guarded by `_updated_problem_paths_lock`.
+        self._problem_scan: Optional[ProblemScan] = None
+        self._paths_since_scan: Optional[Set[str]] = None
+        self._reconciler_exit = threading.Event()
+        self.reconciler = threading.Thread(target=self._reconciler_thread, daemon=True)
 
     @property
-    def current_submission(self):
-        worker = self.current_judge_worker
-        return worker.submission if worker else None
+    def grading_slots(self) -> int:
+        return len(self._slot_cpu_affinities)
+
+    @property
+    def current_submissions(self) -> List[Submission]:
+        with self._judge_workers_lock:
+            return [worker.submission for worker in self.judge_workers.values()]
+
+    @property
+    def current_submission(self) -> Optional[Submission]:
+        # The oldest submission still grading, kept for callers that predate grading slots.
+        submissions = self.current_submissions
+        return submissions[0] if submissions else None
 
     def _updater_thread(self) -> None:
         log = logging.getLogger('dmoj.updater')
@@ -102,8 +212,39 @@ class Judge:
             # if thread:
             #    thread.join()
 
+            with self._updated_problem_paths_lock:
+                paths, self._updated_problem_paths = self._updated_problem_paths, set()
+                scan, self._problem_scan = self._problem_scan, None
+                if scan is not None:
+                    paths_since_scan, self._paths_since_scan = self._paths_since_scan or set(), None
+                elif self._paths_since_scan is not None and paths:
+                    self._paths_since_scan.update(paths)
+
             try:
-                self.packet_manager.supported_problems_packet(get_supported_problems_and_mtimes(force_update=True))
+                if scan is not None and paths is not None:
+                    # The rescan may predate changes the updater has seen since it began, so those are looked at again.
+                    paths |= paths_since_scan
+                    updated, removed = reconcile_supported_problems(scan, paths)
+                    changed_dirs = {
+                        scan.problem_dirs[problem] for problem, _ in updated if problem in scan.problem_dirs
+                    }
+                    problem_cache.invalidate(paths | changed_dirs)
+                    if not updated and not removed:
+                        continue
+                    self.packet_manager.supported_problems_diff_packet(updated, removed)
+                elif paths is None:
+                    problem_cache.invalidate()
+                    # Explicitly asked for, so the site gets the full list even if nothing changed.
+                    update_supported_problems()
+                    self.packet_manager.supported_problems_packet(get_supported_problems_and_mtimes())
+                else:
+                    problem_cache.invalidate(paths)
+                    updated, removed = update_supported_problems(paths)
+                    if not updated and not removed:
+                        continue
+                    self.packet_manager.supported_problems_diff_packet(updated, removed)
+                # Idle workers were forked with the old view of the problem roots.
+                self._worker_pool.recycle_idle()
 
                 # When copying large test file, updater_signal can be set multiple times in very short burst
                 # (e.g. 10 times during 0.2s). Meanwhile, bridged can take up to 1 seconds to process updates.
@@ -112,20 +253,45 @@ class Judge:
             except Exception:
                 log.exception('Failed to update problems.')
 
-    def update_problems(self) -> None:
+    def _reconciler_thread(self) -> None:
+        log = logging.getLogger('dmoj.updater')
+        # Rescans are never urgent, and on a large or remote problem tree they take long enough to get in the way.
+        try:
+            lower_thread_priority()
+        except OSError:
+            log.warning('Failed to lower the priority of problem rescans', exc_info=True)
+
+        while not self._reconciler_exit.wait(env.problem_reconcile_interval):
+            with self._updated_problem_paths_lock:
+                self._paths_since_scan = set()
+            try:
+                scan = scan_problem_dirs()
+            except Exception:
+                log.exception('Failed to rescan problems.')
+                with self._updated_problem_paths_lock:
+                    self._paths_since_scan = None
+                continue
+            with self._updated_problem_paths_lock:
+                self._problem_scan = scan
+            self.updater_signal.set()
+
+    def update_problems(self, paths: Optional[Iterable[str]] = None) -> None:
         """
-        Pushes current problem set to server.
+        Pushes changes to the problem set to server, looking only at the problems containing the given paths if any.
         """
+        with self._updated_problem_paths_lock:
+            if paths is None:
+                self._updated_problem_paths = None
+            elif self._updated_problem_paths is not None:
+                self._updated_problem_paths.update(paths)
         self.updater_signal.set()
 
     def begin_grading(self, submission: Submission, report=logger.info, blocking=False) -> None:
-        # Ensure only one submission is running at a time; this lock is released at the end of submission grading.
-        # This is necessary because `begin_grading` is "re-entrant"; after e.g. grading-end is sent, the network
-        # thread may receive a new submission before the grading thread and worker from the *previous* submission
-        # have finished tearing down. Trashing global state (e.g. `self.current_judge_worker`) before then would be
-        # an error.
-        self._grading_lock.acquire()
-        assert self.current_judge_worker is None
+        # Ensure at most one submission is running per grading slot; the slot is released at the end of submission
+        # grading. This is necessary because `begin_grading` is "re-entrant"; after e.g. grading-end is sent, the
+        # network thread may receive a new submission before the grading thread and worker from the *previous*
+        # submission have finished tearing down. Handing out the slot (and its CPUs) before then would be an error.
+        slot = self._free_slots.get()
 
         report(
             ansi_style(
@@ -136,11 +302,22 @@ class Judge:
 
         # FIXME(tbrindus): what if we receive an abort from the judge before IPC handshake completes? We'll send
         # an abort request down the pipe, possibly messing up the handshake.
-        self.current_judge_worker = JudgeWorker(submission)
+        worker = JudgeWorker(
+            submission, cpu_affinity=self._slot_cpu_affinities[slot], problem_storage=self.problem_storage
+        )
+        try:
+            worker.start(self._worker_pool.acquire())
+        except BaseException:
+            self._free_slots.put(slot)
+            raise
+
+        with self._judge_workers_lock:
+            assert submission.id not in self.judge_workers
+            self.judge_workers[submission.id] = worker
 
         ipc_ready_signal = threading.Event()
         grading_thread = threading.Thread(
-            target=self._grading_thread_main, args=(ipc_ready_signal, report), daemon=True
+            target=self._grading_thread_main, args=(worker, slot, ipc_ready_signal, report), daemon=True
         )
         grading_thread.start()
 
@@ -149,12 +326,11 @@ class Judge:
         if blocking:
             grading_thread.join()
 
-    def _grading_thread_main(self, ipc_ready_signal: threading.Event, report) -> None:
-        assert self.current_judge_worker is not None
-
+    def _grading_thread_main(self, worker: 'JudgeWorker', slot: int, ipc_ready_signal: threading.Event, report) -> None:
+        submission = worker.submission
         try:
             ipc_handler_dispatch: Dict[IPC, Callable] = {
-                IPC.HELLO: lambda _report: ipc_ready_signal.set(),
+                IPC.HELLO: lambda _submission, _report: ipc_ready_signal.set(),
                 IPC.COMPILE_ERROR: self._ipc_compile_error,
                 IPC.COMPILE_MESSAGE: self._ipc_compile_message,
                 IPC.GRADING_BEGIN: self._ipc_grading_begin,
@@ -166,7 +342,7 @@ class Judge:
                 IPC.UNHANDLED_EXCEPTION: self._ipc_unhandled_exception,
             }
 
-            for ipc_type, data in self.current_judge_worker.communicate():
+            for ipc_type, data in worker.communicate():
                 try:
                     handler_func = ipc_handler_dispatch[ipc_type]
                 except KeyError:
@@ -174,41 +350,64 @@ class Judge:
                         'judge got unexpected IPC message from worker: %s' % ((ipc_type, data),)
                     ) from None
 
-                handler_func(report, *data)
+                handler_func(submission, report, *data)
 
             report(
                 ansi_style(
-                    'Done grading #ansi[%s](yellow)/#ansi[%s](green|bold).\n'
-                    % (self.current_submission.problem_id, self.current_submission.id)
+                    'Done grading #ansi[%s](yellow)/#ansi[%s](green|bold).\n' % (submission.problem_id, submission.id)
                 )
             )
         except Exception:  # noqa: E722, we want to catch everything
-            self.log_internal_error()
+            self.log_internal_error(submission_id=submission.id)
         finally:
-            self.current_judge_worker.wait_with_timeout()
-            self.current_judge_worker = None
+            worker.release(self._worker_pool)
+            with self._judge_workers_lock:
+                del self.judge_workers[submission.id]
 
             # Might not have been set if an exception was encountered before HELLO message, so signal here to keep the
             # other side from waiting forever.
             ipc_ready_signal.set()
 
-            self._grading_lock.release()
+            self._free_slots.put(slot)
+
+        # Only once the slot is free, so that the next submission doesn't wait for it.
+        if self._worker_pool.size:
+            self._cache_problem(submission)
 
-    def _ipc_compile_error(self, report, error_message: str) -> None:
+    def _cache_problem(self, submission: Submission) -> None:
+        # Workers replenishing the pool are forked from us, and start out with whatever we have parsed.
+        try:
+            cache_problem(submission.problem_id, submission.storage_namespace)
+        except Exception:
+            logger.debug('Failed to cache problem %s', submission.problem_id, exc_info=True)
+
+    def _ipc_compile_error(self, submission: Submission, report, error_message: str) -> None:
         report(ansi_style('#ansi[Failed compiling submission!](red|bold)'))
         report(error_message.rstrip())  # don't print extra newline
-        self.packet_manager.compile_error_packet(error_message)
+        self.packet_manager.compile_error_packet(submission.id, error_message)
 
-    def _ipc_compile_message(self, _report, compile_message: str) -> None:
-        self.packet_manager.compile_message_packet(compile_message)
+    def _ipc_compile_message(self, submission: Submission, _report, compile_message: str) -> None:
+        self.packet_manager.compile_message_packet(submission.id, compile_message)
 
-    def _ipc_grading_begin(self, _report, is_pretested: bool) -> None:
-        self.packet_manager.begin_grading_packet(is_pretested)
+    def _ipc_grading_begin(
+        self, submission: Submission, _report, is_pretested: bool, timings: Dict[str, float]
+    ) -> None:
+        logger.info(
+            'Submission %d ready to grade in %.1fms: %s',
+            submission.id,
+            timings['ready'] * 1000,
+            ', '.join(
+                '%s %.1fms' % (phase, duration * 1000) for phase, duration in timings.items() if phase != 'ready'
+            ),
+        )
+        self.packet_manager.begin_grading_packet(submission.id, is_pretested)
 
-    def _ipc_grading_end(self, _report) -> None:
-        self.packet_manager.grading_end_packet()
+    def _ipc_grading_end(self, submission: Submission, _report) -> None:
+        self.packet_manager.grading_end_packet(submission.id)
 
-    def _ipc_result(self, report, batch_number: Optional[int], case_number: int, result: Result) -> None:
+    def _ipc_result(
+        self, submission: Submission, report, batch_number: Optional[int], case_number: int, result: Result
+    ) -> None:
         codes = result.readable_codes()
 
         is_sc = result.result_flag & Result.SC
@@ -229,40 +428,46 @@ class Judge:
             )
         case_padding = '  ' if batch_number is not None else ''
         report(ansi_style('%sTest case %2d %-3s %s' % (case_padding, case_number, colored_codes[0], case_info)))
-        self.packet_manager.test_case_status_packet(case_number, result)
+        self.packet_manager.test_case_status_packet(submission.id, case_number, result)
 
-    def _ipc_batch_begin(self, report, batch_number: int) -> None:
-        self.packet_manager.batch_begin_packet()
+    def _ipc_batch_begin(self, submission: Submission, report, batch_number: int) -> None:
+        self.packet_manager.batch_begin_packet(submission.id)
         report(ansi_style('#ansi[Batch #%d](yellow|bold)' % batch_number))
 
-    def _ipc_batch_end(self, _report, _batch_number: int) -> None:
-        self.packet_manager.batch_end_packet()
+    def _ipc_batch_end(self, submission: Submission, _report, _batch_number: int) -> None:
+        self.packet_manager.batch_end_packet(submission.id)
 
-    def _ipc_grading_aborted(self, report) -> None:
-        self.packet_manager.submission_aborted_packet()
+    def _ipc_grading_aborted(self, submission: Submission, report) -> None:
+        self.packet_manager.submission_aborted_packet(submission.id)
         report(ansi_style('#ansi[Forcefully terminating grading. Temporary files may not be deleted.](red|bold)'))
 
-    def _ipc_unhandled_exception(self, _report, message: str) -> None:
+    def _ipc_unhandled_exception(self, submission: Submission, _report, message: str) -> None:
         logger.error('Unhandled exception in worker process')
-        self.log_internal_error(message=message)
+        self.log_internal_error(message=message, submission_id=submission.id)
 
     def abort_grading(self, submission_id: Optional[int] = None) -> None:
-        # Capture locally so we don't end up with a TOCTOU NoneType error. This function is typically called
-        # from the network thread, but `current_judge_worker` is updated from the grading thread.
-        worker = self.current_judge_worker
-        if not worker:
+        """
+        Aborts the submission with the given id, or every grading submission if no id is given.
+        """
+        # Capture locally so we don't race with the grading threads, which remove their workers when they finish.
+        with self._judge_workers_lock:
+            if submission_id is None:
+                workers = list(self.judge_workers.values())
+            else:
+                workers = [self.judge_workers[submission_id]] if submission_id in self.judge_workers else []
+
+        if not workers:
             if submission_id is not None:
                 # This can happen because message delivery is async; the user may have pressed "Abort" before we
                 # finished grading, but by the time the message reached us we may have finished grading already.
-                logger.info('Received abortion request, but nothing is running')
-        elif submission_id is not None and worker.submission.id != submission_id:
-            logger.warning(
-                'Received abortion request for %d, but %d is currently running', submission_id, worker.submission.id
-            )
-        else:
+                logger.info('Received abortion request for %d, but it is not running', submission_id)
+            return
+
+        for worker in workers:
             logger.info('Received abortion request for %d', worker.submission.id)
             # These calls are idempotent, so it doesn't matter if we raced and the worker has exited already.
             worker.request_abort_grading()
+        for worker in workers:
             worker.wait_with_timeout()
 
     def listen(self) -> None:
@@ -270,6 +475,8 @@ class Judge:
         Attempts to connect to the handler server specified in command line.
         """
         self.updater.start()
+        if env.problem_reconcile_interval > 0:
+            self.reconciler.start()
         self.packet_manager.run()
 
     def murder(self) -> None:
@@ -277,12 +484,16 @@ class Judge:
         End any submission currently executing, and exit the judge.
         """
         self.abort_grading()
+        self._worker_pool.close()
         self.updater_exit = True
         self.updater_signal.set()
+        self._reconciler_exit.set()
         if self.packet_manager:
             self.packet_manager.close()
 
-    def log_internal_error(self, exc: Optional[BaseException] = None, message: Optional[str] = None) -> None:
+    def log_internal_error(
+        self, exc: Optional[BaseException] = None, message: Optional[str] = None, submission_id: Optional[int] = None
+    ) -> None:
         if not message:
             # If exc exists, raise it so that sys.exc_info() is populated with its data.
             if exc:
@@ -298,40 +509,61 @@ class Judge:
 
         logger.error(message)
 
+        if submission_id is None:
+            return
+
         try:
             # Strip ANSI from the message, since this might be a checker's CompileError ...we don't want to see the raw
             # ANSI codes from GCC/Clang on the site. We could use format_ansi and send HTML to the site, but the site
             # doesn't presently support HTML internal error formatting.
-            self.packet_manager.internal_error_packet(strip_ansi(message))
+            self.packet_manager.internal_error_packet(submission_id, strip_ansi(message))
         except Exception:  # noqa E722: don't want `log_internal_error` to trigger `log_internal_error`, ever
             logger.exception('Error encountered while reporting error to site!')
 
 
 class JudgeWorker:
-    def __init__(self, submission: Submission) -> None:
+    def __init__(
+        self,
+        submission: Submission,
+        cpu_affinity: Optional[List[int]] = None,
+        problem_storage: Optional[StorageCredentials] = None,
+    ) -> None:
         self.submission = submission
+        self.cpu_affinity = cpu_affinity
+        self.problem_storage = problem_storage
         self._abort_requested = False
+        self._sent_abort_request = False
         self._sent_sigkill_to_worker_process = False
         # FIXME(tbrindus): marked Any pending grader cleanups.
         self.grader: Any = None
+        self._parallel_grader: Optional['ParallelCaseGrader'] = None
 
-        self.worker_process_conn, child_conn = multiprocessing.Pipe()
-        self.worker_process = multiprocessing.Process(
-            name='DMOJ Judge Handler for %s/%d' % (self.submission.problem_id, self.submission.id),
-            target=self._worker_process_main,
-            args=(child_conn, self.worker_process_conn),
-        )
-        self.worker_process.start()
-        child_conn.close()
+        self.process: Optional[JudgeWorkerProcess] = None
+        self.result_ring: Optional[ResultRing] = None
+        # Set once the worker process finished this submission in a state that lets it grade another one.
+        self.reusable = False
+        self._released = threading.Event()
+
+    def start(self, process: 'JudgeWorkerProcess') -> None:
+        """
+        Hands the submission to a (possibly already running) worker process.
+        """
+        self.process = process
+        self.worker_process = process.process
+        self.worker_process_conn = process.conn
+        self.result_ring = process.result_ring
+        try:
+            self.worker_process_conn.send((IPC.SUBMISSION, (self.submission, self.cpu_affinity, self.problem_storage)))
+        except BaseException:
+            process.shutdown()
+            raise
 
     def communicate(self) -> Generator[Tuple[IPC, tuple], None, None]:
         recv_timeout = max(60, int(2 * self.submission.time_limit))
+        raised_exception = False
         while True:
             try:
-                if not self.worker_process_conn.poll(timeout=recv_timeout):
-                    raise TimeoutError('worker did not send a message in %d seconds' % recv_timeout)
-
-                ipc_type, data = self.worker_process_conn.recv()
+                ipc_type, data = self._recv(recv_timeout)
             except TimeoutError:
                 logger.error('Worker has not sent a message in %d seconds, assuming dead and killing.', recv_timeout)
                 self.worker_process.kill()
@@ -346,42 +578,79 @@ class JudgeWorker:
 
             if ipc_type == IPC.BYE:
                 self.worker_process_conn.send((IPC.BYE, ()))
+                # Only trust a worker with another submission if this one went entirely according to plan.
+                self.reusable = not raised_exception and not self._sent_abort_request
                 return
+            elif ipc_type == IPC.KEEPALIVE:
+                # Only there to restart the timeout.
+                continue
             else:
+                raised_exception |= ipc_type == IPC.UNHANDLED_EXCEPTION
                 yield ipc_type, data
 
+    def _recv(self, timeout: float) -> Tuple[IPC, tuple]:
+        ring = self.result_ring
+        if ring is None:
+            if not self.worker_process_conn.poll(timeout=timeout):
+                raise TimeoutError('worker did not send a message in %d seconds' % timeout)
+            return self.worker_process_conn.recv()
+
+        while True:
+            record = ring.get()
+            if record is PIPE_MESSAGE:
+                return self.worker_process_conn.recv()
+            elif record is not None:
+                return IPC.RESULT, cast(tuple, record)
+
+            ready = multiprocessing.connection.wait([self.worker_process_conn, ring.doorbell], timeout=timeout)
+            if not ready:
+                raise TimeoutError('worker did not send a message in %d seconds' % timeout)
+            ring.clear_doorbell()
+
+            # Every message on the pipe is announced in the ring first, so a readable pipe with nothing in the ring
+            # means the worker hung up.
+            if self.worker_process_conn in ready and ring.is_empty():
+                return self.worker_process_conn.recv()
+
+    def release(self, pool: 'JudgeWorkerPool') -> None:
+        """
+        Gives the worker process back to the pool once the judge is done with this submission, shutting it down if it
+        can't be reused.
+        """
+        try:
+            if self.process is not None:
+                pool.release(self.process, reusable=self.reusable and not self._sent_abort_request)
+        finally:
+            self._released.set()
+
     def wait_with_timeout(self) -> None:
-        if self.worker_process and self.worker_process.is_alive():
-            # Might be None if run was never called, or failed.
-            try:
-                self.worker_process.join(timeout=IPC_TIMEOUT)
-            except OSError:
-                logger.exception('Exception while waiting for worker to shut down, ignoring...')
-            finally:
-                if self.worker_process.is_alive():
-                    logger.error('Worker is still alive, sending SIGKILL!')
-                    self._sent_sigkill_to_worker_process = True
-                    self.worker_process.kill()
+        if self.process is None or self._released.wait(timeout=IPC_TIMEOUT):
+            return
+
+        # The grading thread is still talking to the worker, so the worker must be stuck.
+        logger.error('Worker is still grading, sending SIGKILL!')
+        self._sent_sigkill_to_worker_process = True
+        self.worker_process.kill()
+        self._released.wait(timeout=IPC_TIMEOUT)
 
     def request_abort_grading(self) -> None:
         assert self.worker_process_conn
 
+        self._sent_abort_request = True
         try:
             self.worker_process_conn.send((IPC.REQUEST_ABORT, ()))
         except Exception:
             logger.exception('Failed to send abort request to worker, did it race?')
 
     def _worker_process_main(
-        self,
-        judge_process_conn: 'multiprocessing.connection.Connection',
-        worker_process_conn: 'multiprocessing.connection.Connection',
-    ) -> None:
+        self, judge_process_conn: 'multiprocessing.connection.Connection', result_ring: Optional[ResultRing]
+    ) -> bool:
         """
         Main body of judge worker process, which handles grading and sends grading results to the judge controller via
         IPC.
+
+        Returns whether the connection to the judge is still in a state where the process can grade another submission.
         """
-        worker_process_conn.close()
-        setproctitle(multiprocessing.current_process().name)
 
         def _ipc_recv_thread_main() -> None:
             """
@@ -402,15 +671,25 @@ class JudgeWorker:
                 else:
                     raise RuntimeError('worker got unexpected IPC message from judge: %s' % ((ipc_type, data),))
 
+        def _send(ipc_msg: Tuple[IPC, tuple]) -> None:
+            ipc_type, data = ipc_msg
+            if result_ring is not None:
+                if ipc_type == IPC.RESULT and result_ring.put_result(*data):
+                    return
+                # Tell the judge to read the pipe at this point, so it sees everything in the order we sent it.
+                result_ring.put_pipe_marker()
+            judge_process_conn.send(ipc_msg)
+
         def _report_unhandled_exception() -> None:
             # We can't pickle the whole traceback object, so just send the formatted exception.
             message = ''.join(traceback.format_exception(*sys.exc_info()))
-            judge_process_conn.send((IPC.UNHANDLED_EXCEPTION, (message,)))
-            judge_process_conn.send((IPC.BYE, ()))
+            _send((IPC.UNHANDLED_EXCEPTION, (message,)))
+            _send((IPC.BYE, ()))
 
         ipc_recv_thread = None
+        case_gen = None
         try:
-            judge_process_conn.send((IPC.HELLO, ()))
+            _send((IPC.HELLO, ()))
 
             ipc_recv_thread = threading.Thread(target=_ipc_recv_thread_main, daemon=True)
             ipc_recv_thread.start()
@@ -425,11 +704,11 @@ class JudgeWorker:
                     # A grader can raise a `BrokenPipeError` that's indistinguishable from one caused by
                     # `judge_process_conn.send`, but should be handled differently (i.e. not quit the judge).
                     _report_unhandled_exception()
-                    return
+                    return False
 
-                judge_process_conn.send(ipc_msg)
+                _send(ipc_msg)
 
-            judge_process_conn.send((IPC.BYE, ()))
+            _send((IPC.BYE, ()))
         except BrokenPipeError:
             # There's nothing we can do about this... the general except branch would just fail again. Just re-raise and
             # hope for the best.
@@ -445,32 +724,128 @@ class JudgeWorker:
                 if ipc_recv_thread.is_alive():
                     logger.error('Judge IPC recv thread is still alive after timeout, shutting worker down anyway!')
 
+            if case_gen is not None:
+                # Make sure any cases still running in parallel are torn down before the worker exits.
+                case_gen.close()
+
             self.grader = None
 
+        # A recv thread that is still alive would steal the next submission from us.
+        return ipc_recv_thread is None or not ipc_recv_thread.is_alive()
+
     def _grade_cases(self) -> Generator[Tuple[IPC, tuple], None, None]:
-        problem = Problem(
-            self.submission.problem_id,
-            self.submission.time_limit,
-            self.submission.memory_limit,
-            self.submission.meta,
-            storage_namespace=self.submission.storage_namespace,
-        )
+        timings: Dict[str, float] = {}
+        start_time = time.perf_counter()
+        sync = None
+        # A sync may swap in a new version of the test data at any time except while we load the problem, and the
+        # version we load from is kept around until we're done grading with it.
+        with ExitStack() as stack:
+            with ExitStack() as loading:
+                if (
+                    self.problem_storage is not None
+                    and self.submission.storage_namespace is None
+                    and get_problem_root(self.submission.problem_id) is None
+                ):
+                    # Test data is synced lazily, and this is the first time the problem is graded here. What we fetch
+                    # stays locked until we've loaded it, so that nothing evicts it in the meantime.
+                    sync = ProblemDataSync(env.get('id') or '', env.testcase_sync_interval)
+                    yield from self._keep_alive_until(
+                        loading.enter_context, sync.fetch_locked(self.problem_storage, self.submission.problem_id)
+                    )
+                    timings['problem-fetch'] = time.perf_counter() - start_time
+                else:
+                    loading.enter_context(problem_lock(self.submission.problem_id))
+
+                load_start_time = time.perf_counter()
+                problem = Problem(
+                    self.submission.problem_id,
+                    self.submission.time_limit,
+                    self.submission.memory_limit,
+                    self.submission.meta,
+                    storage_namespace=self.submission.storage_namespace,
+                )
+                stack.enter_context(problem_version_lock(problem.root_dir))
+            timings['problem-load'] = time.perf_counter() - load_start_time
+
+            if sync is not None:
+                # Making room for the problem can't evict it any more, now that we're grading with it.
+                sync.evict()
+
+            yield from self._prepare_and_grade_cases(problem, timings, start_time)
 
+    def _keep_alive_until(self, func: Callable, *args) -> Generator[Tuple[IPC, tuple], None, None]:
+        """
+        Runs something that may take longer than the judge waits for a worker to say anything, telling it that we're
+        still alive in the meantime.
+        """
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(func, *args)
+            while True:
+                try:
+                    future.result(timeout=IPC_KEEPALIVE_INTERVAL)
+                except FutureTimeoutError:
+                    yield IPC.KEEPALIVE, ()
+                else:
+                    return
+
+    def _prepare_and_grade_cases(
+        self, problem: Problem, timings: Dict[str, float], start_time: float
+    ) -> Generator[Tuple[IPC, tuple], None, None]:
+        generation_pool: Optional[CaseGenerationPool] = None
         try:
-            self.grader = problem.grader_class(
-                self, problem, self.submission.language, utf8bytes(self.submission.source)
-            )
-        except CompileError as compilation_error:
-            error = compilation_error.message
-            yield IPC.COMPILE_ERROR, (error,)
-            return
-        else:
+            # Compile while the test cases are set up and the first few inputs are prepared, so that the first case can
+            # start as soon as the binary exists.
+            with ThreadPoolExecutor(max_workers=1) as compile_pool:
+                grader_future = compile_pool.submit(self._compile_submission, problem, timings)
+
+                setup_start_time = time.perf_counter()
+                try:
+                    flattened_cases, batch_dependencies = self._flatten_cases(problem)
+                    generation_pool = self._make_generation_pool(flattened_cases)
+                    self._prefetch_case_inputs(flattened_cases, grader_future)
+                except Exception:
+                    # A broken test case only matters if the submission compiles, just like when we used to compile
+                    # first.
+                    if not isinstance(grader_future.exception(), CompileError):
+                        raise
+                timings['case-setup'] = time.perf_counter() - setup_start_time
+
+                try:
+                    self.grader = grader_future.result()
+                except CompileError as compilation_error:
+                    error = compilation_error.message
+                    yield IPC.COMPILE_ERROR, (error,)
+                    return
+
             warning = getattr(self.grader.binary, 'warning', None)
             if warning is not None:
                 yield IPC.COMPILE_MESSAGE, (warning,)
 
-        yield IPC.GRADING_BEGIN, (problem.run_pretests_only,)
+            timings['ready'] = time.perf_counter() - start_time
+            yield IPC.GRADING_BEGIN, (problem.run_pretests_only, timings)
 
+            parallel_grader = self._parallel_grader = self._make_parallel_grader(
+                [cast(TestCase, case) for _, case in flattened_cases]
+            )
+            try:
+                yield from self._grade_flattened_cases(
+                    flattened_cases, batch_dependencies, parallel_grader, generation_pool
+                )
+            finally:
+                if parallel_grader is not None:
+                    parallel_grader.close()
+        finally:
+            if generation_pool is not None:
+                generation_pool.close()
+
+    def _compile_submission(self, problem: Problem, timings: Dict[str, float]) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return problem.grader_class(self, problem, self.submission.language, utf8bytes(self.submission.source))
+        finally:
+            timings['compile'] = time.perf_counter() - start_time
+
+    def _flatten_cases(self, problem: Problem) -> Tuple[List[Tuple[Optional[int], BaseTestCase]], List[Set[int]]]:
         flattened_cases: List[Tuple[Optional[int], BaseTestCase]] = []
         batch_number = 0
         batch_dependencies: List[Set[int]] = []
@@ -482,14 +857,72 @@ class JudgeWorker:
                 batch_dependencies.append(set(case.dependencies))
             else:
                 flattened_cases.append((None, case))
+        return flattened_cases, batch_dependencies
+
+    def _prefetch_case_inputs(
+        self, flattened_cases: List[Tuple[Optional[int], BaseTestCase]], grader_future: 'Future[Any]'
+    ) -> None:
+        for index, (_, case) in enumerate(flattened_cases[: env.case_prefetch]):
+            # The first case's input is needed right away, but there is no point holding up grading for the rest.
+            if index and grader_future.done():
+                return
+            try:
+                cast(TestCase, case).input_data_io()
+            except Exception:
+                # Nothing is cached on failure, so this is reported when the case is graded, as it always was.
+                logger.debug('Failed to prefetch input for case %d', index + 1, exc_info=True)
+                return
 
+    def _make_generation_pool(
+        self, flattened_cases: List[Tuple[Optional[int], BaseTestCase]]
+    ) -> Optional[CaseGenerationPool]:
+        cpus = list(env.generator_cpu_affinity or [])
+        concurrency = min(env.generator_parallelism, len(cpus))
+        cases = [cast(TestCase, case) for _, case in flattened_cases if cast(TestCase, case).uses_generator()]
+        if concurrency < 1 or not cases:
+            return None
+        # Enough generated ahead to keep every generator busy while the earliest generated cases wait to be graded.
+        return CaseGenerationPool(cases, cpus, concurrency, 2 * concurrency)
+
+    def _make_parallel_grader(self, cases: List[TestCase]) -> Optional['ParallelCaseGrader']:
+        concurrency = env.case_parallelism
+        if concurrency <= 1 or not self.grader.supports_parallel_cases:
+            return None
+
+        # Cases with file IO or symlinks create links in the shared submission directory, so they can't run side by
+        # side.
+        if any(case.config.file_io or case.config.symlinks for case in cases):
+            return None
+
+        # In a grading slot, this has already been narrowed down to the slot's CPUs.
+        cpus = list(env.submission_cpu_affinity or [])
+        if not cpus and hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+
+        # Never run more than one case per CPU, otherwise concurrently running cases would skew each other's times.
+        concurrency = min(concurrency, len(cpus))
+        if concurrency <= 1:
+            return None
+
+        from dmoj.graders.parallel import ParallelCaseGrader
+
+        return ParallelCaseGrader(self.grader, cast(List[List[int]], partition_cpu_affinity(cpus, concurrency)))
+
+    def _grade_flattened_cases(
+        self,
+        flattened_cases: List[Tuple[Optional[int], BaseTestCase]],
+        batch_dependencies: List[Set[int]],
+        parallel_grader: Optional['ParallelCaseGrader'],
+        generation_pool: Optional[CaseGenerationPool] = None,
+    ) -> Generator[Tuple[IPC, tuple], None, None]:
         case_number = 0
         is_short_circuiting = False
         is_short_circuiting_enabled = self.submission.short_circuit
         judged_results: Dict[Tuple[str, str], Optional[Result]] = {}
         result: Optional[Result] = None
         passed_batches: Set[int] = set()
-        for batch_number, cases in groupby(flattened_cases, key=itemgetter(0)):
+        for batch_number, batch_cases in groupby(flattened_cases, key=itemgetter(0)):
+            cases = [cast(TestCase, case) for _, case in batch_cases]
             if batch_number:
                 yield IPC.BATCH_BEGIN, (batch_number,)
 
@@ -497,7 +930,12 @@ class JudgeWorker:
                 if passed_batches & dependencies != dependencies:
                     is_short_circuiting = True
 
-            for _, case in cases:
+            # Start running this batch (or run of non-batched cases) ahead of time. Results are still consumed in order
+            # below, and whatever is left over is discarded as soon as we start short-circuiting.
+            if parallel_grader is not None and not is_short_circuiting:
+                parallel_grader.schedule(cases)
+
+            for case in cases:
                 case_number += 1
                 assert isinstance(case, TestCase)
 
@@ -509,11 +947,17 @@ class JudgeWorker:
                     result = judged_results.get(case_cache_key, None)
 
                     if result is None:
-                        result = self.grader.grade(case)
+                        if parallel_grader is not None:
+                            result = parallel_grader.result(case)
+                        else:
+                            result = self.grader.grade(case)
                         # only cache on case has positive points
                         if case.points != 0 and case_cache_key != (None, None):
                             judged_results[case_cache_key] = result
                     else:
+                        if parallel_grader is not None:
+                            parallel_grader.discard(case)
+
                         # TODO: this is a bit of a hack, but it's the best we can do for now
 
                         # Cache hit, now we need to change the points of the result
@@ -537,6 +981,13 @@ class JudgeWorker:
                         # past).
                         is_short_circuiting |= batch_number is not None or is_short_circuiting_enabled
 
+                        if is_short_circuiting and parallel_grader is not None:
+                            parallel_grader.discard_all()
+
+                if generation_pool is not None:
+                    # Short-circuited cases are done too, and no longer need generating.
+                    generation_pool.done(case)
+
                 # Legacy hack: we need to allow graders to read and write `proc_output` on the `Result` object, but the
                 # judge controller only cares about the trimmed output, and shouldn't waste memory buffering the full
                 # output. So, we trim it here so we don't run out of memory in the controller.
@@ -556,11 +1007,215 @@ class JudgeWorker:
         self._abort_requested = True
         if self.grader:
             self.grader.abort_grading()
+        if self._parallel_grader:
+            self._parallel_grader.abort_grading()
+
+
+class JudgeWorkerProcess:
+    """
+    A worker process, which grades the submissions the judge controller sends it one at a time until it is told to
+    exit.
+    """
+
+    def __init__(self) -> None:
+        self.submissions_graded = 0
+        self.generation = 0
+
+        # Results go through shared memory where we can, sparing the judge from unpickling thousands of messages.
+        self.result_ring = ResultRing() if ResultRing.is_supported() else None
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            name='DMOJ Judge Handler', target=self._process_main, args=(child_conn, self.conn)
+        )
+        start = time.perf_counter()
+        self.process.start()
+        self.spawn_time = time.perf_counter() - start
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def shutdown(self) -> None:
+        try:
+            self.conn.send((IPC.BYE, ()))
+        except OSError:
+            # Already dead, nothing to tell it.
+            pass
+
+        try:
+            self.process.join(timeout=IPC_TIMEOUT)
+        except OSError:
+            logger.exception('Exception while waiting for worker to shut down, ignoring...')
+        finally:
+            if self.process.is_alive():
+                logger.error('Worker is still alive, sending SIGKILL!')
+                self.process.kill()
+                self.process.join()
+            self.conn.close()
+            if self.result_ring is not None:
+                self.result_ring.close()
+
+    def _process_main(
+        self,
+        judge_process_conn: 'multiprocessing.connection.Connection',
+        worker_process_conn: 'multiprocessing.connection.Connection',
+    ) -> None:
+        worker_process_conn.close()
+        setproctitle('DMOJ Judge Handler (idle)')
+
+        # Graders are imported on first use; get that out of the way while we wait for a submission. Executors, checkers
+        # and the problem loader were already imported by the controller we forked from.
+        from dmoj import graders  # noqa: F401, imported for side effect
+
+        default_cpu_affinity = env.submission_cpu_affinity
+        while True:
+            try:
+                ipc_type, data = judge_process_conn.recv()
+            except EOFError:
+                # The judge went away without saying goodbye.
+                return
+
+            if ipc_type == IPC.BYE:
+                return
+            elif ipc_type == IPC.REQUEST_ABORT:
+                # An abort request that raced with the end of the previous submission, nothing left to abort.
+                continue
+            elif ipc_type != IPC.SUBMISSION:
+                raise RuntimeError('worker got unexpected IPC message from judge: %s' % ((ipc_type, data),))
+
+            submission, cpu_affinity, problem_storage = data
+            setproctitle('DMOJ Judge Handler for %s/%d' % (submission.problem_id, submission.id))
+
+            # We are in our own process, so this only pins the submissions (and compilers) launched by this worker.
+            env['submission_cpu_affinity'] = cpu_affinity if cpu_affinity is not None else default_cpu_affinity
+
+            worker = JudgeWorker(submission, cpu_affinity, problem_storage)
+            if not worker._worker_process_main(judge_process_conn, self.result_ring):
+                return
+            setproctitle('DMOJ Judge Handler (idle)')
+
+
+class JudgeWorkerPool:
+    """
+    Keeps `size` worker processes started ahead of time, so that grading a submission doesn't have to wait for a
+    process to be spawned.
+
+    Processes go back to the pool after grading and are reused for up to `max_submissions` submissions, after which
+    they are replaced in the background. Processes that crashed or were aborted are never reused, and idle processes
+    are replaced when problems are updated, since they were forked with a stale view of the problem roots. With a
+    `size` of 0, every submission gets a fresh process, as it always used to.
+    """
+
+    def __init__(self, size: int, max_submissions: int) -> None:
+        self.size = max(0, size)
+        self.max_submissions = max(1, max_submissions)
+        self._idle: Deque[JudgeWorkerProcess] = deque()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._closed = False
+
+        # Time not spent spawning processes while a submission was waiting for one.
+        self.spawn_time_saved = 0.0
+
+        self._replenish()
+
+    def acquire(self) -> JudgeWorkerProcess:
+        while True:
+            with self._lock:
+                process = self._idle.popleft() if self._idle else None
+
+            if process is None:
+                # Either there is no pool, or every process is busy or still being replaced. If there's room, this one
+                # joins the pool once it's done.
+                process = JudgeWorkerProcess()
+                break
+
+            if process.is_alive():
+                self.spawn_time_saved += process.spawn_time
+                logger.debug(
+                    'Using warm worker %d, saved %.1fms spawning it (%.1fms in total)',
+                    process.process.pid,
+                    process.spawn_time * 1000,
+                    self.spawn_time_saved * 1000,
+                )
+                break
+
+            logger.warning('Idle worker %d died, discarding', process.process.pid)
+            process.shutdown()
+
+        process.submissions_graded += 1
+        return process
+
+    def release(self, process: JudgeWorkerProcess, reusable: bool) -> None:
+        with self._lock:
+            if (
+                reusable
+                and not self._closed
+                and process.generation == self._generation
+                and process.submissions_graded < self.max_submissions
+                and len(self._idle) < self.size
+                and process.is_alive()
+            ):
+                self._idle.append(process)
+                return
+
+        process.shutdown()
+        if self.size:
+            self._replenish_async()
+
+    def recycle_idle(self) -> None:
+        with self._lock:
+            self._generation += 1
+            stale, self._idle = list(self._idle), deque()
+
+        for process in stale:
+            process.shutdown()
+        self._replenish()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+
+        for process in idle:
+            process.shutdown()
+        if self.spawn_time_saved:
+            logger.info('Worker pool saved %.1fms of worker spawn time', self.spawn_time_saved * 1000)
+
+    def _replenish_async(self) -> None:
+        # Spawning is done off the grading path, otherwise we'd just be moving the latency around.
+        threading.Thread(target=self._replenish, daemon=True).start()
+
+    def _replenish(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= self.size:
+                    return
+                generation = self._generation
+
+            process = JudgeWorkerProcess()
+            process.generation = generation
+
+            with self._lock:
+                if self._closed or generation != self._generation or len(self._idle) >= self.size:
+                    stale = True
+                else:
+                    self._idle.append(process)
+                    stale = False
+
+            if stale:
+                process.shutdown()
+                return
 
 
 class ClassicJudge(Judge):
     def __init__(self, host, port, **kwargs) -> None:
-        super().__init__(packet.PacketManager(host, port, self, env['id'], env['key'], **kwargs))
+        packet_manager_class = packet.PacketManager
+        if env.packet_transport == 'asyncio':
+            from dmoj.async_packet import AsyncPacketManager
+
+            packet_manager_class = AsyncPacketManager
+        super().__init__(packet_manager_class(host, port, self, env['id'], env['key'], **kwargs))
 
 
 def sanity_check():
@@ -6,7 +6,7 @@ import ssl
 from collections import defaultdict
 from fnmatch import fnmatch
 from operator import itemgetter
-from typing import Dict, Iterable, List, Optional, Set, Tuple
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 
 import yaml
 
@@ -57,8 +57,83 @@ env: ConfigNode = ConfigNode(
         # Directory to use as temporary submission storage, system default
         # (e.g. /tmp) if left blank.
         'tempdir': None,
+        # How to talk to the site: 'threaded' sends packets from whichever thread produced them, 'asyncio' queues them
+        # for a single event loop that owns the connection, so a slow site never blocks grading.
+        'packet_transport': 'threaded',
+        # Packets smaller than this many bytes are sent uncompressed, if the site negotiated a packet codec.
+        'packet_compression_threshold': 256,
+        # zlib compression levels for packets in general, and for packets sent many times per submission.
+        'packet_compression_level': 6,
+        'packet_hot_compression_level': 1,
+        # Whether to offer the site a zlib context shared by all packets on a connection.
+        'packet_stream_compression': True,
+        # A test case result is sent right away if no other result came in for this many seconds. Otherwise, it is held
+        # back for up to `testcase_batch_delay` seconds, to be sent with the results that follow it in a single packet,
+        # unless that packet would have more than `testcase_batch_max_cases` results or roughly
+        # `testcase_batch_max_bytes` bytes.
+        'testcase_batch_idle_time': 0.1,
+        'testcase_batch_delay': 0.05,
+        'testcase_batch_max_cases': 64,
+        'testcase_batch_max_bytes': 65536,
+        # Minimum number of seconds between syncs of test data from the site's storage bucket, which the site asks for
+        # with every ping.
+        'testcase_sync_interval': 60,
+        # Number of test data files (or parts of large files) downloaded at once while syncing.
+        'testcase_sync_concurrency': 8,
+        # Files larger than this many bytes are downloaded in parts of this size.
+        'testcase_sync_part_size': 8 << 20,
+        # Number of times a failed download is retried before giving up on the file until the next sync.
+        'testcase_sync_retries': 3,
+        # Whether to check the MD5 of synced test data against the bucket when the judge starts, rather than only its size
+        # and mtime. This reads all of it.
+        'testcase_sync_verify_checksums': False,
+        # Whether to only download a problem's test data the first time it is graded, instead of all of it ahead of
+        # time. Problems in the bucket are advertised either way.
+        'testcase_sync_lazy': False,
+        # With `testcase_sync_lazy`, the least recently graded problems are deleted to keep the downloaded test data
+        # under this many bytes. 0 means no limit.
+        'testcase_sync_cache_size': 0,
         # CPU affinity (as a list of 0-indexed CPU IDs) to run submissions on
         'submission_cpu_affinity': None,
+        # Number of submissions to grade concurrently. Each grading slot is pinned to a disjoint subset of
+        # `submission_cpu_affinity` (or of all CPUs, if that is not set).
+        'grading_slots': 1,
+        # Maximum number of test cases of a single submission to run at the same time, each on its own CPUs. Cases are
+        # graded one after another if this is 1.
+        'case_parallelism': 1,
+        # Number of test cases whose input is prepared (e.g. by running generators) while the submission compiles.
+        'case_prefetch': 2,
+        # CPUs to run the generators of upcoming test cases on while earlier cases are graded, so that grading a case
+        # doesn't wait for its data to be generated. Defaults to the CPUs no grading slot runs submissions on; if there are
+        # none, each case's generator runs right before the case, on the submission's CPUs.
+        'generator_cpu_affinity': None,
+        # Maximum number of generators of a single submission to run ahead of time at once.
+        'generator_parallelism': 2,
+        # Number of idle worker processes to keep started ahead of time, so that submissions don't have to wait for one
+        # to spawn. If 0, a fresh worker process is spawned for every submission.
+        'worker_pool_size': 0,
+        # Number of submissions a pooled worker process grades before it is replaced. Workers are always replaced after
+        # a submission is aborted or crashes the worker.
+        'worker_max_submissions': 50,
+        # Number of parsed problems (init.yml, archive and guessed test cases) each process keeps, so that grading a
+        # problem again doesn't parse it again. 0 disables the cache.
+        'problem_cache_size': 32,
+        # Where manifests of parsed problems are kept, so that a restarted judge doesn't have to parse them again. Defaults
+        # to a folder in tempdir.
+        'problem_manifest_dir': None,
+        # Where normalized copies of test data are kept for every worker to share, and how many bytes of them. Defaults to a
+        # folder in /dev/shm, or in tempdir if there is no /dev/shm. 0 disables the cache.
+        'normalized_cache_dir': None,
+        'normalized_cache_size': 256 << 20,
+        # Where the input and expected output of generators are kept, so that a generator given the same sources and
+        # arguments runs once instead of once per submission, and how many bytes of them. Defaults to a folder in
+        # tempdir. 0 disables the cache; problems with non-deterministic generators opt out with
+        # `generator_cache: false` in init.yml.
+        'generator_cache_dir': None,
+        'generator_cache_size': 0,
+        # Seconds between full rescans of the problem directories, made in the background at low priority to catch
+        # changes the problem monitor missed (e.g. made over NFS by another machine). 0 disables them.
+        'problem_reconcile_interval': 3600,
     },
     dynamic=False,
 )
@@ -81,11 +156,22 @@ class StorageNamespaceCache:
     problem_root_cache: Dict[str, str] = {}
     problem_roots_cache: Optional[List[str]] = None
     supported_problems_cache: Optional[List[Tuple[str, float]]] = None
+    problem_dirs_cache: Optional[Dict[str, str]] = None
+    remote_problems: Dict[str, float] = {}
 
 
 _storage_namespace_cache: Dict[Optional[str], StorageNamespaceCache] = defaultdict(StorageNamespaceCache)
 
 
+class ProblemScan(NamedTuple):
+    # Folders containing problems, earliest-listed first.
+    root_dirs: List[str]
+    # The folder of each problem.
+    problem_dirs: Dict[str, str]
+    # The mtime of each problem's folder.
+    problems: Dict[str, float]
+
+
 def load_env(cli: bool = False, testsuite: bool = False) -> None:  # pragma: no cover
     global storage_namespaces, problem_globs, only_executors, exclude_executors, log_file, server_host, server_port, no_ansi, no_ansi_emu, skip_self_test, env, startup_warnings, no_watchdog, problem_regex, case_regex, api_listen, secure, no_cert_check, cert_store, problem_watches, cli_history_file, cli_command, log_level
 
@@ -265,22 +351,22 @@ def get_problem_watches():
 
 def get_problem_root(problem_id, namespace=None) -> Optional[str]:
     cache = _storage_namespace_cache[namespace]
-    cached_root = cache.problem_root_cache.get(problem_id)
-    if cached_root is None or not os.path.isfile(os.path.join(cached_root, 'init.yml')):
-        for root_dir in get_problem_roots(namespace):
-            problem_root_dir = os.path.join(root_dir, problem_id)
-            problem_config = os.path.join(problem_root_dir, 'init.yml')
-            if os.path.isfile(problem_config):
-                if problem_globs and not any(
-                    fnmatch(problem_config, os.path.join(problem_glob, 'init.yml')) for problem_glob in problem_globs
-                ):
-                    continue
-                cache.problem_root_cache[problem_id] = problem_root_dir
-                break
-        else:
-            return None
-
-    return cache.problem_root_cache[problem_id]
+    # The supported problems are kept up to date as problems change, so there's usually no need to look for a problem.
+    cached_root = (cache.problem_dirs_cache or {}).get(problem_id) or cache.problem_root_cache.get(problem_id)
+    if cached_root is not None and os.path.isfile(os.path.join(cached_root, 'init.yml')):
+        return cached_root
+
+    for root_dir in get_problem_roots(namespace):
+        problem_root_dir = os.path.join(root_dir, problem_id)
+        problem_config = os.path.join(problem_root_dir, 'init.yml')
+        if os.path.isfile(problem_config):
+            if problem_globs and not any(
+                fnmatch(problem_config, os.path.join(problem_glob, 'init.yml')) for problem_glob in problem_globs
+            ):
+                continue
+            cache.problem_root_cache[problem_id] = problem_root_dir
+            return problem_root_dir
+    return None
 
 
 def get_problem_roots(namespace=None) -> List[str]:
@@ -301,7 +387,15 @@ def get_supported_problems_and_mtimes(warnings: bool = True, force_update: bool
     if cache.supported_problems_cache is not None and not force_update:
         return cache.supported_problems_cache
 
-    problems = []
+    return _apply_scan(cache, scan_problem_dirs(warnings))
+
+
+def scan_problem_dirs(warnings: bool = False) -> ProblemScan:
+    """
+    Finds every problem the slow way, by globbing `problem_globs` and looking at every problem folder found, without
+    changing the supported problems.
+    """
+    problems: Dict[str, float] = {}
     root_dirs = []
     root_dirs_set = set()
     problem_dirs: Dict[str, str] = {}
@@ -317,22 +411,183 @@ def get_supported_problems_and_mtimes(warnings: bool = True, force_update: bool
                     root_dirs.append(root_dir)
                     root_dirs_set.add(root_dir)
 
-                if problem in problem_dirs:
-                    if warnings:
-                        print_ansi(
-                            f'#ansi[Warning: duplicate problem {problem} found at {problem_dir},'
-                            f' ignoring in favour of {problem_dirs[problem]}](yellow)'
-                        )
-                else:
+                kept, ignored = problem_dirs.get(problem), problem_dir
+                if kept is None or _problem_dir_precedence(problem_dir) < _problem_dir_precedence(kept):
+                    try:
+                        problems[problem] = os.path.getmtime(problem_dir)
+                    except FileNotFoundError:
+                        # Removed since we found it.
+                        continue
                     problem_dirs[problem] = problem_dir
-                    problems.append((problem, os.path.getmtime(problem_dir)))
+                    kept, ignored = problem_dir, kept
+                if ignored is not None and warnings:
+                    print_ansi(
+                        f'#ansi[Warning: duplicate problem {problem} found at {ignored},'
+                        f' ignoring in favour of {kept}](yellow)'
+                    )
 
-    cache.problem_roots_cache = root_dirs
-    cache.supported_problems_cache = problems
+    return ProblemScan(root_dirs, problem_dirs, problems)
 
+
+def _problem_dir_precedence(problem_dir: str) -> Tuple[int, str]:
+    """
+    Orders the copies of a problem found in several roots, the first of which is used: those matched by an earlier
+    problem glob first, and otherwise by root. Both scans and updates go by this, so they always pick the same copy.
+    """
+    problem_config = os.path.join(problem_dir, 'init.yml')
+    for index, problem_glob in enumerate(problem_globs):
+        pattern = os.path.join(problem_glob, 'init.yml')
+        # fnmatch lets `*` match across folders, which glob doesn't.
+        if fnmatch(problem_config, pattern) and (
+            '**' in pattern or problem_config.count(os.sep) == pattern.count(os.sep)
+        ):
+            return index, os.path.dirname(problem_dir)
+    return len(problem_globs), os.path.dirname(problem_dir)
+
+
+def _apply_scan(cache: StorageNamespaceCache, scan: ProblemScan) -> List[Tuple[str, float]]:
+    cache.problem_roots_cache = list(scan.root_dirs)
+    cache.supported_problems_cache = problems = _with_remote_problems(cache, dict(scan.problems))
+    cache.problem_dirs_cache = dict(scan.problem_dirs)
     return problems
 
 
+def set_remote_problems(problems: Dict[str, float]) -> None:
+    """
+    Sets the problems that can be fetched from storage when they are first graded, which are supported even if they
+    aren't here, along with when each last changed there.
+    """
+    _storage_namespace_cache[None].remote_problems = dict(problems)
+
+
+def _with_remote_problems(cache: StorageNamespaceCache, problems: Dict[str, float]) -> List[Tuple[str, float]]:
+    # Fetching or evicting a problem in storage doesn't change it, so it goes by when it last changed there.
+    problems.update(cache.remote_problems)
+    return list(problems.items())
+
+
+def _is_problem_dir_candidate(path: str) -> bool:
+    problem_config = os.path.join(path, 'init.yml')
+    return any(fnmatch(problem_config, os.path.join(problem_glob, 'init.yml')) for problem_glob in problem_globs)
+
+
+def _is_hidden_path(path: str) -> bool:
+    # Globs skip names starting with a dot, so nothing under them can be a problem, e.g. problem data being synced.
+    for problem_glob in problem_globs:
+        parts = os.path.relpath(path, find_glob_root(problem_glob)).split(os.sep)
+        if parts[0] != os.pardir and any(part.startswith('.') and part != os.curdir for part in parts):
+            return True
+    return False
+
+
+def _containing_problem_dir(path: str, known_dirs: Set[str]) -> Optional[str]:
+    while True:
+        if path in known_dirs or (_is_problem_dir_candidate(path) and os.path.isfile(os.path.join(path, 'init.yml'))):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def update_supported_problems(
+    paths: Optional[Iterable[str]] = None,
+) -> Tuple[List[Tuple[str, float]], List[str]]:
+    """
+    Brings the supported problems up to date after the given paths changed, or after anything might have changed if no
+    paths are given, looking only at the problems containing those paths where possible.
+    :return:
+        The problems that were added or changed, as (problem id, mtime), and the ids of problems that were removed.
+    """
+    cache = _storage_namespace_cache[None]
+    old_problems = dict(cache.supported_problems_cache or [])
+
+    if paths is None or cache.problem_dirs_cache is None:
+        new_problems = dict(get_supported_problems_and_mtimes(force_update=True))
+    else:
+        new_problems = _update_problem_dirs(cache, old_problems, paths)
+    return _diff_problems(old_problems, new_problems)
+
+
+def reconcile_supported_problems(
+    scan: ProblemScan, paths: Iterable[str] = ()
+) -> Tuple[List[Tuple[str, float]], List[str]]:
+    """
+    Replaces the supported problems with those found by a full scan made in the background, then brings them up to date
+    with the given paths, which changed while the scan was being made.
+    :return:
+        The problems that were added or changed, as (problem id, mtime), and the ids of problems that were removed.
+    """
+    cache = _storage_namespace_cache[None]
+    old_problems = dict(cache.supported_problems_cache or [])
+    new_problems = dict(_apply_scan(cache, scan))
+    paths = list(paths)
+    if paths:
+        new_problems = _update_problem_dirs(cache, new_problems, paths)
+    return _diff_problems(old_problems, new_problems)
+
+
+def _diff_problems(
+    old_problems: Dict[str, float], new_problems: Dict[str, float]
+) -> Tuple[List[Tuple[str, float]], List[str]]:
+    updated = [(problem, mtime) for problem, mtime in new_problems.items() if old_problems.get(problem) != mtime]
+    removed = [problem for problem in old_problems if problem not in new_problems]
+    return updated, removed
+
+
+def _update_problem_dirs(
+    cache: StorageNamespaceCache, problems: Dict[str, float], paths: Iterable[str]
+) -> Dict[str, float]:
+    assert cache.problem_dirs_cache is not None and cache.problem_roots_cache is not None
+    problem_dirs = dict(cache.problem_dirs_cache)
+    known_dirs = set(problem_dirs.values())
+    problems = dict(problems)
+
+    for path in set(map(os.path.normpath, paths)):
+        if _is_hidden_path(path):
+            continue
+        problem_dir = _containing_problem_dir(path, known_dirs)
+        if problem_dir is None:
+            if os.path.isdir(path) and os.listdir(path):
+                # e.g. a directory of problems moved in at once, which we only hear about as the directory.
+                return dict(get_supported_problems_and_mtimes(force_update=True))
+            continue
+
+        problem = utf8text(os.path.basename(problem_dir))
+        if os.access(os.path.join(problem_dir, 'init.yml'), os.R_OK):
+            kept = problem_dirs.get(problem, problem_dir)
+            if kept != problem_dir and _problem_dir_precedence(kept) < _problem_dir_precedence(problem_dir):
+                # A duplicate of a problem we already have, which we keep ignoring.
+                continue
+            problem_dirs[problem] = problem_dir
+            known_dirs.add(problem_dir)
+            problems[problem] = os.path.getmtime(problem_dir)
+
+            root_dir = os.path.dirname(problem_dir)
+            if root_dir not in cache.problem_roots_cache:
+                cache.problem_roots_cache.append(root_dir)
+        elif problem_dirs.get(problem) == problem_dir:
+            del problem_dirs[problem]
+            known_dirs.discard(problem_dir)
+            # A duplicate we ignored before, in another root we know of, takes over the problem.
+            duplicates = {os.path.join(root_dir, problem) for root_dir in cache.problem_roots_cache} - {problem_dir}
+            for duplicate in sorted(duplicates, key=_problem_dir_precedence):
+                if os.access(os.path.join(duplicate, 'init.yml'), os.R_OK):
+                    try:
+                        problems[problem] = os.path.getmtime(duplicate)
+                    except FileNotFoundError:
+                        continue
+                    problem_dirs[problem] = duplicate
+                    known_dirs.add(duplicate)
+                    break
+
+    cache.problem_dirs_cache = problem_dirs
+    cache.supported_problems_cache = _with_remote_problems(
+        cache, {problem: mtime for problem, mtime in problems.items() if problem in problem_dirs}
+    )
+    return dict(cache.supported_problems_cache)
+
+
 def get_supported_problems(warnings: bool = True) -> Iterable[str]:
     return map(itemgetter(0), get_supported_problems_and_mtimes(warnings=warnings))
 
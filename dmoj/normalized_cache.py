@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import IO, Optional
+
+from dmoj.judgeenv import env
+from dmoj.utils.normalize import normalized_file_copy
+from dmoj.utils.os_ext import private_dir
+
+log = logging.getLogger(__name__)
+
+
+class NormalizedCache:
+    """
+    Normalized copies of test data, and decompressed copies of compressed archive members, named by a hash of what
+    identifies the file they were made from, so that every worker reads the same copy instead of decompressing and
+    normalizing its own. Copies are read-only, and the least recently used ones are deleted to keep the cache under
+    `size` bytes.
+
+    Since the copies are read as test data, the cache must be in a folder that only we can write to.
+    """
+
+    def __init__(self, root: str, size: int) -> None:
+        self.root = root
+        self.size = size
+
+    def path(self, identity: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(identity.encode('utf-8', 'surrogateescape')).hexdigest())
+
+    def get(self, identity: str) -> Optional[str]:
+        path = self.path(identity)
+        try:
+            # The mtime is when the copy was last used.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def add(self, identity: str, src: IO[bytes], normalize: bool = True) -> str:
+        private_dir(self.root)
+        path = self.path(identity)
+        with tempfile.NamedTemporaryFile(dir=self.root, prefix='.', delete=False) as dst:
+            try:
+                if normalize:
+                    normalized_file_copy(src, dst)
+                else:
+                    shutil.copyfileobj(src, dst)
+                os.fchmod(dst.fileno(), 0o444)
+            except BaseException:
+                os.unlink(dst.name)
+                raise
+        # Whoever normalized it at the same time made the same copy.
+        os.replace(dst.name, path)
+        self._trim()
+        return path
+
+    def _trim(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= self.size:
+            return
+        # Workers still reading a copy we delete keep reading it.
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.size:
+                break
+
+
+def normalized_cache() -> Optional[NormalizedCache]:
+    if env.normalized_cache_size <= 0:
+        return None
+    root = env.normalized_cache_dir
+    if root is None:
+        # tmpfs, where there is one, since the copies are read far more often than they are written.
+        shm = '/dev/shm'
+        root = os.path.join(shm if os.path.isdir(shm) else env.tempdir or tempfile.gettempdir(), 'dmoj-normalized')
+    return NormalizedCache(private_dir(root), env.normalized_cache_size)
@@ -1,5 +1,4 @@
 import errno
-import json
 import logging
 import os
 import socket
@@ -10,17 +9,14 @@ import threading
 import time
 import traceback
 import zlib
-from typing import List, Optional, TYPE_CHECKING, Tuple
-from datetime import datetime, timezone
-
-import boto3
-from botocore.config import Config as BotoConfig
-from botocore.exceptions import BotoCoreError, ClientError
+from typing import Dict, List, Optional, TYPE_CHECKING, Tuple
 
 from dmoj import sysinfo
-from dmoj.judgeenv import get_runtime_versions, get_supported_problems_and_mtimes, get_problem_roots, env
+from dmoj.judgeenv import env, get_runtime_versions, get_supported_problems_and_mtimes
+from dmoj.packet_codec import PacketCodec, SerializedPacket, negotiate, protocol_offer
+from dmoj.packet_journal import PacketJournal
 from dmoj.result import Result
-from dmoj.utils.unicode import utf8bytes, utf8text
+from dmoj.testcase_sync import ProblemDataSync, StorageCredentials
 
 if TYPE_CHECKING:
     from dmoj.judge import Judge
@@ -80,14 +76,39 @@ class PacketManager:
         self.cert_store = cert_store
 
         self._lock = threading.RLock()
-        self._batch = 0
+        self._batches: Dict[int, int] = {}
         self._testcase_queue_lock = threading.Lock()
-        self._testcase_queue: List[Tuple[int, Result]] = []
+        self._testcase_queue_changed = threading.Condition(self._testcase_queue_lock)
+        self._testcase_queue: List[Tuple[int, int, Result]] = []
+        self._testcase_queue_bytes = 0
+        # When the oldest queued test case result must be sent by, if it is being held back to be sent with others.
+        self._testcase_flush_deadline: Optional[float] = None
+        self._last_testcase_time = 0.0
+
+        # Test case results are sent as soon as they arrive if none arrived for `testcase_batch_idle_time` seconds, so
+        # slow cases are reported right away. Bursts of fast cases are held back for up to `testcase_batch_delay`
+        # seconds, and sent together in one packet, unless that packet would exceed either of the size caps.
+        self.testcase_batch_idle_time: float = env.testcase_batch_idle_time
+        self.testcase_batch_delay: float = env.testcase_batch_delay
+        self.testcase_batch_max_cases: int = env.testcase_batch_max_cases
+        self.testcase_batch_max_bytes: int = env.testcase_batch_max_bytes
+        self.testcase_packets_sent = 0
+        self.testcases_sent = 0
 
         # Exponential backoff: starting at 4 seconds, max 60 seconds.
         # If it fails to connect for something like 7 hours, it could RecursionError.
-        self.fallback = 4
-
+        self.fallback: float = 4
+
+        # Every connection starts out speaking the original protocol; the handshake may negotiate something better.
+        self._codec = PacketCodec()
+        self._journal = PacketJournal()
+        # Every problem list or change to it sent to the site has a version, so that the site can tell if it missed one.
+        self._problems_version = 0
+        self._problem_diffs = False
+        # Synced problems are swapped in whole, so the site hears about each one once, however many files changed.
+        self._testcase_sync = ProblemDataSync(
+            env.get('id') or name, env.testcase_sync_interval, on_update=lambda paths: self.judge.update_problems(paths)
+        )
         self.conn = None
         self._do_reconnect()
 
@@ -130,7 +151,9 @@ class PacketManager:
 
     def _do_reconnect(self):
         try:
-            self._connect()
+            # Nothing may be sent until the journal has been replayed on the new connection.
+            with self._lock:
+                self._connect()
         except JudgeAuthenticationFailed:
             log.error('Authentication as "%s" failed on: [%s]:%s', self.name, self.host, self.port)
             self._reconnect()
@@ -150,6 +173,9 @@ class PacketManager:
             except socket.error:
                 pass
         self._closed = True
+        self._testcase_sync.close()
+        with self._testcase_queue_changed:
+            self._testcase_queue_changed.notify_all()
 
     def _read_forever(self):
         try:
@@ -157,11 +183,11 @@ class PacketManager:
                 self._receive_packet(self._read_single())
         except KeyboardInterrupt:
             pass
-        except Exception:  # connection reset by peer
-            log.exception('Exception while reading packet from site, will not attempt to reconnect! Quitting judge.')
-            # TODO(tbrindus): this is really sad. This isn't equivalent to `raise SystemExit(1)` since we're not on the
-            # main thread, and doing the latter would only exit the network thread. We should fix mid-grading reconnects
-            # so that we don't need this sledgehammer approach that relies on Docker restarting the judge for us.
+        except Exception:
+            log.exception('Exception while handling packet from site! Quitting judge.')
+            # Connection errors are handled by `_read_single` reconnecting, so this is a bug in the judge. This isn't
+            # equivalent to `raise SystemExit(1)` since we're not on the main thread, and doing the latter would only
+            # exit the network thread.
             os._exit(1)
 
     def _read_single(self) -> dict:
@@ -170,20 +196,18 @@ class PacketManager:
         except socket.error:
             self._reconnect()
             return self._read_single()
-        if not data:
+        if len(data) < PacketManager.SIZE_PACK.size:
             self._reconnect()
             return self._read_single()
         size = PacketManager.SIZE_PACK.unpack(data)[0]
         try:
-            packet = zlib.decompress(self.input.read(size))
-        except zlib.error:
+            return self._codec.decode(self.input.read(size))
+        except (zlib.error, ValueError):
             self._reconnect()
             return self._read_single()
-        else:
-            return json.loads(utf8text(packet))
 
     def run(self):
-        threading.Thread(target=self._periodically_flush_testcase_queue).start()
+        threading.Thread(target=self._flush_testcase_queue_forever).start()
         self._read_forever()
 
     def disconnect(self):
@@ -191,50 +215,107 @@ class PacketManager:
         self.judge.abort_grading()
         sys.exit(0)
 
-    def _flush_testcase_queue(self):
+    def _flush_testcase_queue(self, submission_id: Optional[int] = None):
+        """
+        Sends the queued test case results of the given submission, or of every submission if no id is given.
+        """
         with self._testcase_queue_lock:
+            for queued_submission_id, cases in self._take_testcase_queue(submission_id).items():
+                self._send_test_case_status(queued_submission_id, cases)
             if not self._testcase_queue:
-                return
-
-            self._send_packet(
+                self._testcase_flush_deadline = None
+
+    def _take_testcase_queue(self, submission_id: Optional[int] = None) -> Dict[int, List[Tuple[int, Result]]]:
+        # Several submissions may be grading at once, so group their cases into one packet per submission, keeping the
+        # order in which each submission reported them.
+        cases_by_submission: Dict[int, List[Tuple[int, Result]]] = {}
+        remaining: List[Tuple[int, int, Result]] = []
+        for queued_submission_id, position, result in self._testcase_queue:
+            if submission_id is None or queued_submission_id == submission_id:
+                cases_by_submission.setdefault(queued_submission_id, []).append((position, result))
+            else:
+                remaining.append((queued_submission_id, position, result))
+        self._testcase_queue[:] = remaining
+        self._testcase_queue_bytes = sum(self._estimate_testcase_size(result) for _, _, result in remaining)
+        for cases in cases_by_submission.values():
+            self.testcase_packets_sent += 1
+            self.testcases_sent += len(cases)
+        return cases_by_submission
+
+    @staticmethod
+    def _estimate_testcase_size(result: Result) -> int:
+        # Close enough to the size of the case in a packet for deciding when a packet is big enough.
+        output = min(len(result.proc_output or b''), result.case.output_prefix_length or 0)
+        return 256 + output + len(result.feedback or '') + len(result.extended_feedback or '')
+
+    def _testcase_queued(self, result: Result) -> bool:
+        """
+        Called with the test case queue locked after a result is queued. Returns whether the queue should be sent now.
+        """
+        now = time.monotonic()
+        was_idle = len(self._testcase_queue) == 1 and now - self._last_testcase_time >= self.testcase_batch_idle_time
+        self._last_testcase_time = now
+        self._testcase_queue_bytes += self._estimate_testcase_size(result)
+
+        if (
+            was_idle
+            or len(self._testcase_queue) >= self.testcase_batch_max_cases
+            or self._testcase_queue_bytes >= self.testcase_batch_max_bytes
+        ):
+            return True
+        if self._testcase_flush_deadline is None:
+            self._testcase_flush_deadline = now + self.testcase_batch_delay
+            self._testcase_queue_changed.notify()
+        return False
+
+    def _send_test_case_status(self, submission_id: int, cases: List[Tuple[int, Result]]):
+        self._send_packet(self._test_case_status(submission_id, cases))
+
+    def _test_case_status(self, submission_id: int, cases: List[Tuple[int, Result]]) -> dict:
+        return {
+            'name': 'test-case-status',
+            'submission-id': submission_id,
+            'cases': [
                 {
-                    'name': 'test-case-status',
-                    'submission-id': self.judge.current_submission.id,
-                    'cases': [
-                        {
-                            'position': position,
-                            'status': result.result_flag,
-                            'time': result.execution_time,
-                            'points': result.points,
-                            'total-points': result.total_points,
-                            'memory': result.max_memory,
-                            'output': result.output,
-                            'extended-feedback': result.extended_feedback,
-                            'feedback': result.feedback,
-                            'voluntary-context-switches': result.context_switches[0],
-                            'involuntary-context-switches': result.context_switches[1],
-                            'runtime-version': result.runtime_version,
-                        }
-                        for position, result in self._testcase_queue
-                    ],
+                    'position': position,
+                    'status': result.result_flag,
+                    'time': result.execution_time,
+                    'points': result.points,
+                    'total-points': result.total_points,
+                    'memory': result.max_memory,
+                    'output': result.output,
+                    'extended-feedback': result.extended_feedback,
+                    'feedback': result.feedback,
+                    'voluntary-context-switches': result.context_switches[0],
+                    'involuntary-context-switches': result.context_switches[1],
+                    'runtime-version': result.runtime_version,
                 }
-            )
-
-            self._testcase_queue.clear()
-
-    def _periodically_flush_testcase_queue(self):
+                for position, result in cases
+            ],
+        }
+
+    def _flush_testcase_queue_forever(self):
+        # Sends results held back by `_testcase_queued` once their deadline passes. Results sent early (because the
+        # packet grew big enough, or at a batch or grading boundary) clear the deadline, and with nothing held back this
+        # sleeps until the next result is.
         while not self._closed:
             try:
-                time.sleep(0.25)
-                # It is okay if we flush the testcase queue even while the connection is not open or there's nothing
-                # grading, since the only thing that can queue testcases is a currently-grading submission.
+                with self._testcase_queue_changed:
+                    deadline = self._testcase_flush_deadline
+                    if deadline is None:
+                        self._testcase_queue_changed.wait()
+                        continue
+                    timeout = deadline - time.monotonic()
+                    if timeout > 0:
+                        self._testcase_queue_changed.wait(timeout)
+                        continue
                 self._flush_testcase_queue()
             except KeyboardInterrupt:
                 break
             except Exception:
                 traceback.print_exc()
 
-    def _send_packet(self, packet: dict):
+    def _serialize_packet(self, packet: dict) -> SerializedPacket:
         for k, v in packet.items():
             if isinstance(v, bytes):
                 # Make sure we don't have any garbage utf-8 from e.g. weird compilers
@@ -242,26 +323,59 @@ class PacketManager:
                 # We cannot use utf8text because it may not be text.
                 packet[k] = v.decode('utf-8', 'replace')
 
-        raw = zlib.compress(utf8bytes(json.dumps(packet)))
+        return self._journal.record(packet, self._codec.serialize)
+
+    def _encode_packet(self, packet: dict) -> bytes:
+        return self._codec.frame(self._serialize_packet(packet))
+
+    def _send_packet(self, packet: dict):
+        serialized = self._serialize_packet(packet)
         with self._lock:
             try:
                 assert self.conn is not None
-                self.conn.sendall(PacketManager.SIZE_PACK.pack(len(raw)) + raw)
+                # Framing may compress with state carried over from the previous packet, so it must happen in the
+                # order packets are written.
+                self.conn.sendall(self._codec.frame(serialized))
             except Exception:  # connection reset by peer
-                log.exception('Exception while sending packet to site, will not attempt to reconnect! Quitting judge.')
-                os._exit(1)
+                log.exception('Exception while sending packet to site: [%s]:%s', self.host, self.port)
+                self._journal.written(serialized, delivered=False)
+                # Wake up `_read_single`, which reconnects and replays the journal; packets sent until then that are
+                # not about a grading submission are lost.
+                self._shutdown_connection()
+            else:
+                self._journal.written(serialized)
+
+    def _shutdown_connection(self):
+        try:
+            if self.conn is not None:
+                self.conn.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
 
     def _receive_packet(self, packet: dict):
         name = packet['name']
         if name == 'ping':
             self.ping_packet(packet['when'])
-            self.sync_testcases(packet['storage-endpoint'], packet['storage-access-key-id'], packet['storage-secret-access-key'], packet['storage-bucket'], packet.get('storage-region', 'auto'))
+            if 'storage-endpoint' in packet:
+                credentials = StorageCredentials(
+                    endpoint=packet['storage-endpoint'],
+                    access_key_id=packet['storage-access-key-id'],
+                    secret_access_key=packet['storage-secret-access-key'],
+                    bucket=packet['storage-bucket'],
+                    region=packet.get('storage-region', 'auto'),
+                )
+                if self._testcase_sync.lazy:
+                    # Workers fetch the problems we don't have from here.
+                    self.judge.problem_storage = credentials
+                self._testcase_sync.request(credentials)
         elif name == 'get-current-submission':
             self.current_submission_packet()
         elif name == 'submission-request':
+            self._journal.open(packet['submission-id'])
             self.submission_acknowledged_packet(packet['submission-id'])
             from dmoj.judge import Submission
 
+            self._batches[packet['submission-id']] = 0
             self.judge.begin_grading(
                 Submission(
                     id=packet['submission-id'],
@@ -275,7 +389,6 @@ class PacketManager:
                     meta=packet['meta'],
                 )
             )
-            self._batch = 0
             log.info(
                 'Accept submission: %d: executor: %s, code: %s',
                 packet['submission-id'],
@@ -283,21 +396,79 @@ class PacketManager:
                 packet['problem-id'],
             )
         elif name == 'terminate-submission':
-            self.judge.abort_grading()
+            self.judge.abort_grading(packet.get('submission-id'))
         elif name == 'disconnect':
             log.info('Received disconnect request, shutting down...')
             self.disconnect()
+        elif name == 'get-supported-problems':
+            # The site missed a change to the problem list, and wants to start over.
+            self.supported_problems_packet(get_supported_problems_and_mtimes())
+        elif name == 'packets-acknowledged':
+            self._journal.acknowledge(packet['submission-id'], packet['sequence'])
         else:
             log.error('Unknown packet %s, payload %s', name, packet)
 
+    def _handshake_packet(self, problems, runtimes, id: str, key: str) -> dict:
+        with self._lock:
+            self._problems_version += 1
+            problems_version = self._problems_version
+        return {
+            'name': 'handshake',
+            'problems': problems,
+            'problems-version': problems_version,
+            'executors': runtimes,
+            'id': id,
+            'key': key,
+            'grading-slots': max(1, env.grading_slots),
+            'protocol': protocol_offer(stream=env.packet_stream_compression),
+            # Submissions still grading from before a reconnect, which the site may let us resume.
+            'grading-submissions': self._journal.submission_ids(),
+        }
+
+    def _negotiate_codec(self, resp: dict) -> PacketCodec:
+        try:
+            codec = negotiate(
+                resp.get('protocol'),
+                threshold=env.packet_compression_threshold,
+                level=env.packet_compression_level,
+                hot_level=env.packet_hot_compression_level,
+            )
+        except ValueError:
+            log.exception('Cannot use protocol chosen by site: [%s]:%s', self.host, self.port)
+            raise JudgeAuthenticationFailed()
+        log.info('Using %s packet codec: [%s]:%s', resp.get('protocol') or 'original', self.host, self.port)
+        return codec
+
+    def _resume_submissions(self, resp: dict) -> List[SerializedPacket]:
+        """
+        Returns the packets to replay for the submissions the site lets us resume, as given by the `resume` field of its
+        handshake response: the sequence number of the last packet it received for each submission. Any other
+        submission still grading is aborted, since the site has given up on it.
+        """
+        resume = resp.get('resume') or {}
+        replay: List[SerializedPacket] = []
+        for submission_id in self._journal.submission_ids():
+            received = resume.get(str(submission_id), resume.get(submission_id))
+            if received is None:
+                log.warning('Site did not resume submission %d, aborting it', submission_id)
+                self._journal.discard(submission_id)
+                # Aborting waits for the submission to send its last packets, which can't happen until we're connected.
+                threading.Thread(target=self.judge.abort_grading, args=(submission_id,), daemon=True).start()
+                continue
+            packets = self._journal.replay(submission_id, received)
+            log.info('Resuming submission %d, resending %d packets', submission_id, len(packets))
+            replay += packets
+        return replay
+
     def handshake(self, problems: str, runtimes, id: str, key: str):
-        self._send_packet({'name': 'handshake', 'problems': problems, 'executors': runtimes, 'id': id, 'key': key})
+        with self._lock:
+            self._codec = PacketCodec()
+        self._send_packet(self._handshake_packet(problems, runtimes, id, key))
         log.info('Awaiting handshake response: [%s]:%s', self.host, self.port)
         try:
             data = self.input.read(PacketManager.SIZE_PACK.size)
             size = PacketManager.SIZE_PACK.unpack(data)[0]
-            packet = utf8text(zlib.decompress(self.input.read(size)))
-            resp = json.loads(packet)
+            resp = self._codec.decode(self.input.read(size))
         except Exception:
             log.exception('Cannot understand handshake response: [%s]:%s', self.host, self.port)
             raise JudgeAuthenticationFailed()
@@ -305,15 +476,44 @@ class PacketManager:
             if resp['name'] != 'handshake-success':
                 log.error('Handshake failed.')
                 raise JudgeAuthenticationFailed()
+        codec = self._negotiate_codec(resp)
+        self._problem_diffs = bool(resp.get('problems-diff'))
+        with self._lock:
+            self._codec = codec
+            assert self.conn is not None
+            for serialized in self._resume_submissions(resp):
+                self.conn.sendall(self._codec.frame(serialized))
+                # A resent final packet closes the submission's journal, as it would have the first time.
+                self._journal.written(serialized)
 
     def supported_problems_packet(self, problems: List[Tuple[str, float]]):
         log.debug('Update problems')
-        self._send_packet({'name': 'supported-problems', 'problems': problems})
+        with self._lock:
+            self._problems_version += 1
+            self._send_packet({'name': 'supported-problems', 'problems': problems, 'version': self._problems_version})
 
-    def test_case_status_packet(self, position: int, result: Result):
+    def supported_problems_diff_packet(self, updated: List[Tuple[str, float]], removed: List[str]):
+        if not self._problem_diffs:
+            self.supported_problems_packet(get_supported_problems_and_mtimes())
+            return
+
+        log.debug('Update problems: %d added or changed, %d removed', len(updated), len(removed))
+        with self._lock:
+            self._problems_version += 1
+            self._send_packet(
+                {
+                    'name': 'supported-problems-diff',
+                    'base-version': self._problems_version - 1,
+                    'version': self._problems_version,
+                    'updated': updated,
+                    'removed': removed,
+                }
+            )
+
+    def test_case_status_packet(self, submission_id: int, position: int, result: Result):
         log.debug(
             'Test case on %d: #%d, %s [%.3fs | %.2f MB], %.1f/%.0f',
-            self.judge.current_submission.id,
+            submission_id,
             position,
             ', '.join(result.readable_codes()),
             result.execution_time,
@@ -322,57 +522,70 @@ class PacketManager:
             result.total_points,
         )
         with self._testcase_queue_lock:
-            self._testcase_queue.append((position, result))
+            self._testcase_queue.append((submission_id, position, result))
+            flush = self._testcase_queued(result)
+        if flush:
+            self._flush_testcase_queue()
 
-    def compile_error_packet(self, message: str):
-        log.debug('Compile error: %d', self.judge.current_submission.id)
+    def compile_error_packet(self, submission_id: int, message: str):
+        log.debug('Compile error: %d', submission_id)
         self.fallback = 4
-        self._send_packet({'name': 'compile-error', 'submission-id': self.judge.current_submission.id, 'log': message})
+        self._send_packet({'name': 'compile-error', 'submission-id': submission_id, 'log': message})
 
-    def compile_message_packet(self, message: str):
-        log.debug('Compile message: %d', self.judge.current_submission.id)
-        self._send_packet(
-            {'name': 'compile-message', 'submission-id': self.judge.current_submission.id, 'log': message}
-        )
+    def compile_message_packet(self, submission_id: int, message: str):
+        log.debug('Compile message: %d', submission_id)
+        self._send_packet({'name': 'compile-message', 'submission-id': submission_id, 'log': message})
 
-    def internal_error_packet(self, message: str):
-        log.debug('Internal error: %d', self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet(
-            {'name': 'internal-error', 'submission-id': self.judge.current_submission.id, 'message': message}
-        )
+    def internal_error_packet(self, submission_id: int, message: str):
+        log.debug('Internal error: %d', submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._batches.pop(submission_id, None)
+        self._send_packet({'name': 'internal-error', 'submission-id': submission_id, 'message': message})
 
-    def begin_grading_packet(self, is_pretested: bool):
-        log.debug('Begin grading: %d', self.judge.current_submission.id)
-        self._send_packet(
-            {'name': 'grading-begin', 'submission-id': self.judge.current_submission.id, 'pretested': is_pretested}
-        )
+    def begin_grading_packet(self, submission_id: int, is_pretested: bool):
+        log.debug('Begin grading: %d', submission_id)
+        self._send_packet({'name': 'grading-begin', 'submission-id': submission_id, 'pretested': is_pretested})
 
-    def grading_end_packet(self):
-        log.debug('End grading: %d', self.judge.current_submission.id)
+    def grading_end_packet(self, submission_id: int):
+        log.debug('End grading: %d', submission_id)
         self.fallback = 4
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'grading-end', 'submission-id': self.judge.current_submission.id})
+        self._flush_testcase_queue(submission_id)
+        self._batches.pop(submission_id, None)
+        self._send_packet({'name': 'grading-end', 'submission-id': submission_id})
+        log.debug(
+            'Sent %d test case results in %d packets since startup',
+            self.testcases_sent,
+            self.testcase_packets_sent,
+        )
 
-    def batch_begin_packet(self):
-        self._batch += 1
-        log.debug('Enter batch number %d: %d', self._batch, self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'batch-begin', 'submission-id': self.judge.current_submission.id})
+    def batch_begin_packet(self, submission_id: int):
+        batch = self._batches[submission_id] = self._batches.get(submission_id, 0) + 1
+        log.debug('Enter batch number %d: %d', batch, submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._send_packet({'name': 'batch-begin', 'submission-id': submission_id})
 
-    def batch_end_packet(self):
-        log.debug('Exit batch number %d: %d', self._batch, self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'batch-end', 'submission-id': self.judge.current_submission.id})
+    def batch_end_packet(self, submission_id: int):
+        log.debug('Exit batch number %d: %d', self._batches.get(submission_id, 0), submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._send_packet({'name': 'batch-end', 'submission-id': submission_id})
 
     def current_submission_packet(self):
-        log.debug('Current submission query: %d', self.judge.current_submission.id)
-        self._send_packet({'name': 'current-submission-id', 'submission-id': self.judge.current_submission.id})
+        submissions = self.judge.current_submissions
+        submission_ids = [submission.id for submission in submissions]
+        log.debug('Current submission query: %s', submission_ids)
+        self._send_packet(
+            {
+                'name': 'current-submission-id',
+                'submission-id': submission_ids[0] if submission_ids else None,
+                'submission-ids': submission_ids,
+            }
+        )
 
-    def submission_aborted_packet(self):
-        log.debug('Submission aborted: %d', self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'submission-terminated', 'submission-id': self.judge.current_submission.id})
+    def submission_aborted_packet(self, submission_id: int):
+        log.debug('Submission aborted: %d', submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._batches.pop(submission_id, None)
+        self._send_packet({'name': 'submission-terminated', 'submission-id': submission_id})
 
     def ping_packet(self, when: float):
         data = {'name': 'ping-response', 'when': when, 'time': time.time()}
@@ -383,124 +596,3 @@ class PacketManager:
 
     def submission_acknowledged_packet(self, sub_id: int):
         self._send_packet({'name': 'submission-acknowledged', 'submission-id': sub_id})
-
-    def sync_testcases(self, endpoint: str, access_key_id: str, secret_access_key: str, bucket: str, region: str):
-        """
-        Sync testcases from an S3-compatible bucket, storing the last sync timestamp
-        in a local file inside the problem root (lastsync_<id>).
-        """
-        try:
-            # Determine judge_id
-            judge_id = env.get('id') \
-                    or getattr(self.judge, 'name', None) \
-                    or getattr(self, "name", None) \
-                    or 'unknown'
-
-            # Setup S3 client
-            boto_cfg = BotoConfig(signature_version='s3v4')
-            s3 = boto3.client(
-                's3',
-                aws_access_key_id=access_key_id,
-                aws_secret_access_key=secret_access_key,
-                endpoint_url=endpoint,
-                region_name=(None if region == 'auto' else region),
-                config=boto_cfg,
-            )
-
-            # Locate problem roots
-            roots = get_problem_roots()
-            if not roots:
-                log.error('No configured problem roots to extract testcases into')
-                return
-            dest_root = roots[0]
-
-            # Local lastsync path
-            lastsync_filename = f'lastsync_{judge_id}'
-            lastsync_filepath = os.path.join(dest_root, lastsync_filename)
-
-            # Read lastsync from local file
-            lastsync = 0.0
-            if os.path.isfile(lastsync_filepath):
-                try:
-                    with open(lastsync_filepath, 'r', encoding='utf-8') as f:
-                        lastsync = float(f.read().strip())
-                except Exception:
-                    log.exception('Error reading local lastsync file; defaulting to 0')
-
-            # List objects under 'tests/' prefix
-            paginator = s3.get_paginator('list_objects_v2')
-            prefix = 'tests/'
-            pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
-
-            problem_updates = {}
-            all_objects = {}
-
-            for page in pages:
-                for obj in page.get('Contents', []):
-                    key = obj['Key']
-                    if not key.startswith(prefix):
-                        continue
-                    rel = key[len(prefix):]
-                    if not rel or rel.startswith('/'):
-                        continue
-                    parts = rel.split('/')
-                    problem_slug = parts[0]
-                    lm = obj['LastModified']
-                    lm_ts = (lm.replace(tzinfo=timezone.utc).timestamp()
-                            if isinstance(lm, datetime) else float(lm))
-                    all_objects.setdefault(problem_slug, []).append((key, lm_ts))
-                    if lm_ts > problem_updates.get(problem_slug, 0):
-                        problem_updates[problem_slug] = lm_ts
-
-            problems_to_sync = [slug for slug, ts in problem_updates.items() if ts > lastsync]
-            if not problems_to_sync:
-                log.debug('No updated problem folders to sync (lastsync=%s)', lastsync)
-                return
-
-            # Process each problem slug
-            for slug in problems_to_sync:
-                keys = all_objects.get(slug, [])
-                local_folder = os.path.join(dest_root, slug)
-                # Remove existing folder if present
-                if os.path.isdir(local_folder):
-                    log.info('Removing existing problem folder %s', local_folder)
-                    for root_dir, dirs, files in os.walk(local_folder, topdown=False):
-                        for f in files:
-                            try:
-                                os.unlink(os.path.join(root_dir, f))
-                            except Exception:
-                                log.exception('Failed to remove file %s', os.path.join(root_dir, f))
-                        for d in dirs:
-                            try:
-                                os.rmdir(os.path.join(root_dir, d))
-                            except Exception:
-                                log.exception('Failed to remove dir %s', os.path.join(root_dir, d))
-                    try:
-                        os.rmdir(local_folder)
-                    except Exception:
-                        pass
-
-                for key, _ in keys:
-                    rel_path = key[len(prefix):]
-                    target_path = os.path.join(dest_root, rel_path)
-                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                    log.info('Downloading %s -> %s', key, target_path)
-                    try:
-                        with open(target_path, 'wb') as fobj:
-                            s3.download_fileobj(bucket, key, fobj)
-                    except (BotoCoreError, ClientError) as e:
-                        log.exception('S3 error while downloading %s: %s', key, e)
-                    except Exception:
-                        log.exception('Unexpected error downloading %s', key)
-
-            # Update local lastsync file with current time
-            now_ts = time.time()
-            try:
-                with open(lastsync_filepath, 'w', encoding='utf-8') as f:
-                    f.write(str(now_ts))
-                log.info('Updated local lastsync file at %s to %s', lastsync_filepath, now_ts)
-            except Exception:
-                log.exception('Failed to update local lastsync file %s', lastsync_filepath)
-
-        except Exception:
-            log.exception('sync_testcases failed')
\ No newline at end of file
@@ -0,0 +1,173 @@
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from dmoj.utils.unicode import utf8bytes, utf8text
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SIZE_PACK = struct.Struct('!I')
+
+# Every packet of a negotiated protocol starts with one byte: the serialization format in the high nibble and the
+# compression in the low nibble. Since each packet is tagged, the two sides may use different settings, and a packet
+# that e.g. can't be represented as msgpack can fall back to JSON on its own.
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+# Compressed with a zlib context that lives as long as the connection, so keys repeated across packets cost (almost)
+# nothing after the first packet.
+COMPRESSION_ZLIB_STREAM = 2
+
+CODEC_NAMES = {'json': CODEC_JSON, 'msgpack': CODEC_MSGPACK}
+COMPRESSION_NAMES = {'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB, 'zlib-stream': COMPRESSION_ZLIB_STREAM}
+
+# Packets sent often enough that compressing them quickly matters more than compressing them well.
+HOT_PACKETS = {'test-case-status', 'ping-response'}
+
+
+class SerializedPacket(NamedTuple):
+    packet: Dict[str, Any]
+    codec: int
+    data: bytes
+
+
+def available_codecs() -> List[str]:
+    return ['msgpack', 'json'] if msgpack is not None else ['json']
+
+
+def serialize(packet: Dict[str, Any], codec: int) -> SerializedPacket:
+    if codec == CODEC_MSGPACK:
+        try:
+            return SerializedPacket(packet, CODEC_MSGPACK, msgpack.packb(packet, use_bin_type=True))
+        except (TypeError, ValueError, UnicodeEncodeError):
+            # e.g. lone surrogates, which JSON escapes but msgpack refuses to encode.
+            pass
+    return SerializedPacket(packet, CODEC_JSON, utf8bytes(json.dumps(packet)))
+
+
+def deserialize(data: bytes, codec: int) -> Dict[str, Any]:
+    if codec == CODEC_JSON:
+        return json.loads(utf8text(data))
+    if codec == CODEC_MSGPACK and msgpack is not None:
+        return msgpack.unpackb(data, raw=False)
+    raise ValueError('unknown packet codec: %d' % codec)
+
+
+class PacketCodec:
+    """
+    The original framing: zlib-compressed JSON after a size prefix. Every connection starts out with it, since the
+    handshake is what negotiates anything else, and it is kept for sites that don't negotiate.
+    """
+
+    codec = CODEC_JSON
+
+    def serialize(self, packet: Dict[str, Any]) -> SerializedPacket:
+        return serialize(packet, self.codec)
+
+    def frame(self, serialized: SerializedPacket) -> bytes:
+        data = serialized.data
+        if serialized.codec != CODEC_JSON:
+            # Serialized for a previous connection.
+            data = serialize(serialized.packet, CODEC_JSON).data
+        raw = zlib.compress(data)
+        return SIZE_PACK.pack(len(raw)) + raw
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        return deserialize(zlib.decompress(payload), CODEC_JSON)
+
+
+class NegotiatedPacketCodec(PacketCodec):
+    """
+    Framing agreed on during the handshake: a tag byte, then the packet, compressed only if it is large enough for
+    compression to pay off.
+
+    A codec belongs to a single connection, and `frame` and `decode` must be called in the order packets go on and come
+    off the wire, since streaming compression carries state from one packet to the next.
+    """
+
+    def __init__(
+        self,
+        codec: int,
+        compression: int,
+        threshold: int = 256,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        hot_level: int = 1,
+    ) -> None:
+        self.codec = codec
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self.hot_level = hot_level
+        self._compressor: Optional[Any] = None
+        self._decompressor: Optional[Any] = None
+        if compression == COMPRESSION_ZLIB_STREAM:
+            self._compressor = zlib.compressobj(level)
+
+    def frame(self, serialized: SerializedPacket) -> bytes:
+        codec, data = serialized.codec, serialized.data
+        if codec != CODEC_JSON and codec != self.codec:
+            serialized = serialize(serialized.packet, self.codec)
+            codec, data = serialized.codec, serialized.data
+
+        if len(data) < self.threshold or self.compression == COMPRESSION_NONE:
+            compression = COMPRESSION_NONE
+        elif self._compressor is not None:
+            compression = COMPRESSION_ZLIB_STREAM
+            data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            compression = COMPRESSION_ZLIB
+            hot = serialized.packet.get('name') in HOT_PACKETS
+            data = zlib.compress(data, self.hot_level if hot else self.level)
+
+        return SIZE_PACK.pack(len(data) + 1) + bytes((codec << 4 | compression,)) + data
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        if not payload:
+            raise ValueError('empty packet')
+        codec, compression = payload[0] >> 4, payload[0] & 0xF
+        data = payload[1:]
+        if compression == COMPRESSION_ZLIB:
+            data = zlib.decompress(data)
+        elif compression == COMPRESSION_ZLIB_STREAM:
+            if self._decompressor is None:
+                self._decompressor = zlib.decompressobj()
+            data = self._decompressor.decompress(data)
+        elif compression != COMPRESSION_NONE:
+            raise ValueError('unknown packet compression: %d' % compression)
+        return deserialize(data, codec)
+
+
+def protocol_offer(stream: bool = True) -> Dict[str, List[str]]:
+    """
+    What the judge supports, in order of preference, for the site to choose from in its handshake response.
+    """
+    compression = ['zlib-stream', 'zlib', 'none'] if stream else ['zlib', 'none']
+    return {'codecs': available_codecs(), 'compression': compression}
+
+
+def negotiate(
+    response: Optional[Dict[str, Any]],
+    threshold: int = 256,
+    level: int = zlib.Z_DEFAULT_COMPRESSION,
+    hot_level: int = 1,
+) -> PacketCodec:
+    """
+    Picks the codec for a connection from the `protocol` field of the site's handshake response. Sites that don't know
+    about negotiation leave it out, and keep getting the original framing.
+    """
+    if not response:
+        return PacketCodec()
+    try:
+        codec = CODEC_NAMES[response['codec']]
+        compression = COMPRESSION_NAMES[response['compression']]
+    except (KeyError, TypeError):
+        raise ValueError('unsupported protocol: %r' % (response,))
+    if codec == CODEC_MSGPACK and msgpack is None:
+        raise ValueError('msgpack was chosen, but is not installed')
+    return NegotiatedPacketCodec(codec, compression, threshold=threshold, level=level, hot_level=hot_level)
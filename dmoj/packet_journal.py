@@ -0,0 +1,100 @@
+import threading
+from typing import Callable, Dict, List
+
+from dmoj.packet_codec import SerializedPacket
+
+# Packets after which the site expects nothing more about a submission.
+FINAL_PACKETS = {'grading-end', 'submission-terminated', 'internal-error'}
+# Answers to questions the site asks again after reconnecting, rather than part of grading a submission.
+UNJOURNALED_PACKETS = {'current-submission-id'}
+
+
+class _SubmissionJournal:
+    def __init__(self) -> None:
+        self.packets: List[SerializedPacket] = []
+        self.next_sequence = 0
+        # Sequence number of the last packet handed to the connection.
+        self.written = -1
+
+
+class PacketJournal:
+    """
+    Keeps the packets sent about each grading submission, so that if the connection to the site drops mid-grading, they
+    can be sent again on the next connection instead of the submission being thrown away.
+
+    Journaled packets carry a `sequence` number, counting up from 0 for each submission, which is how the site tells
+    the judge where to resume from. A submission's journal is dropped once its final packet has been written, or as the
+    site acknowledges packets.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._submissions: Dict[int, _SubmissionJournal] = {}
+
+    def open(self, submission_id: int) -> None:
+        with self._lock:
+            self._submissions[submission_id] = _SubmissionJournal()
+
+    def discard(self, submission_id: int) -> None:
+        with self._lock:
+            self._submissions.pop(submission_id, None)
+
+    def record(self, packet: dict, serialize: Callable[[dict], SerializedPacket]) -> SerializedPacket:
+        """
+        Serializes a packet, numbering and journaling it first if it is about a submission with an open journal.
+        """
+        with self._lock:
+            journal = self._submissions.get(packet.get('submission-id'))  # type: ignore
+            if journal is None or packet['name'] in UNJOURNALED_PACKETS:
+                return serialize(packet)
+            packet['sequence'] = journal.next_sequence
+            journal.next_sequence += 1
+            serialized = serialize(packet)
+            journal.packets.append(serialized)
+            return serialized
+
+    def written(self, serialized: SerializedPacket, delivered: bool = True) -> None:
+        """
+        Records that a packet was handed to the connection, and whether the connection took it. Packets are only ever
+        replayed once they have been written; ones still waiting to be sent will be sent on the next connection anyway.
+        """
+        packet = serialized.packet
+        if 'sequence' not in packet:
+            return
+        with self._lock:
+            journal = self._submissions.get(packet['submission-id'])
+            if journal is None:
+                return
+            journal.written = max(journal.written, packet['sequence'])
+            if delivered and packet['name'] in FINAL_PACKETS:
+                del self._submissions[packet['submission-id']]
+
+    def acknowledge(self, submission_id: int, sequence: int) -> None:
+        """
+        Forgets the packets up to and including `sequence`, which the site says it has received.
+        """
+        with self._lock:
+            journal = self._submissions.get(submission_id)
+            if journal is not None:
+                journal.packets = [
+                    serialized for serialized in journal.packets if serialized.packet['sequence'] > sequence
+                ]
+
+    def submission_ids(self) -> List[int]:
+        with self._lock:
+            return sorted(self._submissions)
+
+    def replay(self, submission_id: int, received: int) -> List[SerializedPacket]:
+        """
+        Returns the written packets of a submission that the site has not received, given the sequence number of the
+        last packet it did receive (-1 for none).
+        """
+        with self._lock:
+            journal = self._submissions.get(submission_id)
+            if journal is None:
+                return []
+            return [
+                serialized
+                for serialized in journal.packets
+                if received < serialized.packet['sequence'] <= journal.written
+            ]
@@ -1,12 +1,23 @@
+import copy
+import errno
+import io
 import itertools
+import logging
+import marshal
+import mmap
 import os
 import re
 import shutil
+import struct
 import subprocess
+import tempfile
+import threading
 import zipfile
-from collections import defaultdict
+import zlib
+from collections import OrderedDict, defaultdict
 from functools import partial
 from typing import (
+    Any,
     DefaultDict,
     Dict,
     Iterable,
@@ -28,21 +39,363 @@ from yaml.parser import ParserError
 from yaml.scanner import ScannerError
 
 from dmoj import checkers
+from dmoj.blob_store import file_digest, find_blob_store
 from dmoj.checkers import Checker
 from dmoj.config import ConfigNode, InvalidInitException
-from dmoj.cptbox.utils import MemoryIO, MmapableIO
+from dmoj.cptbox.utils import MemoryIO, MmapableIO, SharedFileIO
 from dmoj.error import InternalError
+from dmoj.generator_cache import GeneratorCache, generator_cache, generator_key
 from dmoj.judgeenv import env, get_problem_root
+from dmoj.normalized_cache import normalized_cache
+from dmoj.problem_manifest import read_manifest, write_manifest
 from dmoj.utils.helper_files import compile_with_auxiliary_files, parse_helper_file_error
 from dmoj.utils.module import load_module_from_file
-from dmoj.utils.normalize import normalized_file_copy
+from dmoj.utils.normalize import normalize, normalized_file_copy
 
 if TYPE_CHECKING:
     from dmoj.graders.base import BaseGrader
 
+log = logging.getLogger(__name__)
+
 DEFAULT_TEST_CASE_INPUT_PATTERN = r'^(?=.*?\.in|in).*?(?:(?:^|\W)(?P<batch>\d+)[^\d\s]+)?(?P<case>\d+)[^\d\s]*$'
 DEFAULT_TEST_CASE_OUTPUT_PATTERN = r'^(?=.*?\.out|out).*?(?:(?:^|\W)(?P<batch>\d+)[^\d\s]+)?(?P<case>\d+)[^\d\s]*$'
 
+# Generators of several cases may run at once, but compiling them writes to the compiled binary cache, which isn't safe
+# to do concurrently.
+_generator_compile_lock = threading.Lock()
+
+# The fixed part of an archive member's local header: its signature, 22 bytes we don't need, and the lengths of the name
+# and extra field that come between it and the member's data.
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class _ParsedProblem:
+    """
+    The parts of a problem that don't depend on the submission being graded: its init.yml, its open archive, and the
+    test cases guessed from the archive's file names.
+
+    All but the open archive can be stored in a manifest, which a restarted judge reads instead of parsing the problem
+    again. The manifest has the archive's central directory, so that opening the archive doesn't have to read it.
+    """
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = root_dir
+        # (mtime, size, inode) of every file the problem was parsed from, or None if one isn't on disk.
+        self.stamps: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        self.doc: Any = None
+        self.archive: Optional[zipfile.ZipFile] = None
+        self.archive_path: Optional[str] = None
+        self.members: Optional[Dict[str, tuple]] = None
+        self.test_cases: Dict[tuple, List[dict]] = {}
+        self.in_manifest = False
+
+    @classmethod
+    def load(cls, root_dir: str, problem_data: 'ProblemDataManager') -> '_ParsedProblem':
+        manifest = read_manifest(root_dir)
+        if manifest is not None:
+            parsed = cls(root_dir)
+            parsed.stamps = manifest['stamps']
+            parsed.doc = manifest['doc']
+            parsed.archive_path = manifest['archive']
+            parsed.members = manifest['members']
+            parsed.test_cases = manifest['test_cases']
+            parsed.in_manifest = True
+            if parsed.is_current():
+                return parsed
+
+        parsed = cls(root_dir)
+        parsed.stamp(os.path.join(root_dir, 'init.yml'))
+        parsed.doc = ProblemConfig.parse(problem_data)
+        return parsed
+
+    def save_manifest(self) -> bool:
+        # Problems that aren't entirely on disk can't be checked for changes.
+        if self.in_manifest or not self.is_current():
+            return False
+        self.in_manifest = write_manifest(
+            self.root_dir,
+            {
+                'stamps': self.stamps,
+                'doc': self.doc,
+                'archive': self.archive_path,
+                'members': self.members,
+                'test_cases': self.test_cases,
+            },
+        )
+        return self.in_manifest
+
+    def stamp(self, path: str) -> None:
+        self.stamps[path] = _file_stamp(path)
+
+    def is_current(self) -> bool:
+        return all(stamp is not None and _file_stamp(path) == stamp for path, stamp in self.stamps.items())
+
+    def open_archive(self, path: str) -> zipfile.ZipFile:
+        if self.archive is not None and self.archive.filename == path:
+            return self.archive
+        if self.members is not None and self.archive_path == path:
+            self.archive = _IndexedZipFile(path, self.members)
+        else:
+            self.stamp(path)
+            self.archive = _MappedZipFile(path, 'r')
+            self.archive_path = path
+            self.members = _archive_members(self.archive)
+            # Test cases guessed from another archive's file names.
+            self.in_manifest = False
+        return self.archive
+
+
+class _MappedZipFile(zipfile.ZipFile):
+    """
+    A ZIP archive whose stored (uncompressed) members are read straight out of the archive file, through a mapping of
+    it shared by every reader, rather than through ZipFile.open. Like ZipFile.open, each member's CRC-32 is checked,
+    but only the first time it is read.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._map: Optional[mmap.mmap] = None
+        self._map_lock = threading.Lock()
+        self._data_offsets: Dict[str, int] = {}
+        self._verified: Set[str] = set()
+        super().__init__(*args, **kwargs)
+
+    def stored_range(self, name: str) -> Optional[Tuple[int, int]]:
+        """
+        Returns where the data of a stored member is in the archive file, as (offset, size), or None if the member is
+        compressed or encrypted.
+        """
+        info = self.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return None
+        offset = self._data_offsets.get(name)
+        if offset is None:
+            assert self.fp is not None
+            header = os.pread(self.fp.fileno(), _LOCAL_HEADER.size, info.header_offset)
+            if len(header) != _LOCAL_HEADER.size:
+                raise zipfile.BadZipFile('Truncated file header')
+            signature, name_length, extra_length = _LOCAL_HEADER.unpack(header)
+            if signature != _LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile('Bad magic number for file header')
+            offset = self._data_offsets[name] = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+        return offset, info.file_size
+
+    def view(self, name: str) -> Optional[memoryview]:
+        """
+        Returns the data of a stored member without copying it, or None if the member is compressed or encrypted.
+        """
+        data_range = self.stored_range(name)
+        if data_range is None:
+            return None
+        offset, size = data_range
+        with self._map_lock:
+            if self._map is None:
+                assert self.fp is not None
+                self._map = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._map)[offset : offset + size]
+        if len(view) != size:
+            raise zipfile.BadZipFile('Truncated data for file %r' % name)
+        if name not in self._verified:
+            if zlib.crc32(view) != self.getinfo(name).CRC:
+                raise zipfile.BadZipFile('Bad CRC-32 for file %r' % name)
+            self._verified.add(name)
+        return view
+
+    def close(self) -> None:
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Still being read, and unmapped once it isn't.
+                pass
+            self._map = None
+        super().close()
+
+
+class _MemoryViewReader(io.RawIOBase):
+    """
+    A read-only file over a memoryview, e.g. of a stored archive member.
+    """
+
+    def __init__(self, view: memoryview) -> None:
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        data = bytes(self._view[self._position : end])
+        self._position = max(self._position, end)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+class _IndexedZipFile(_MappedZipFile):
+    """
+    A ZIP archive whose central directory was read ahead of time, so that opening it is just opening a file. Members
+    are only looked up as they are read, since most problems only ever read a few of them in a worker.
+    """
+
+    def __init__(self, path: str, members: Dict[str, tuple]) -> None:
+        self._members = members
+        super().__init__(path, 'r')
+
+    def _RealGetContents(self) -> None:
+        pass
+
+    def getinfo(self, name: str) -> zipfile.ZipInfo:
+        info = self.NameToInfo.get(name)
+        if info is None:
+            if name not in self._members:
+                raise KeyError('There is no item named %r in the archive' % name)
+            orig_filename, header_offset, compress_size, file_size, compress_type, crc, flag_bits = self._members[name]
+            info = self.NameToInfo[name] = zipfile.ZipInfo(orig_filename)
+            info.header_offset = header_offset
+            info.compress_size = compress_size
+            info.file_size = file_size
+            info.compress_type = compress_type
+            info.CRC = crc
+            info.flag_bits = flag_bits
+        return info
+
+    def infolist(self) -> List[zipfile.ZipInfo]:
+        return [self.getinfo(name) for name in self._members]
+
+    def namelist(self) -> List[str]:
+        return list(self._members)
+
+
+def _archive_members(archive: zipfile.ZipFile) -> Optional[Dict[str, tuple]]:
+    infos = archive.infolist()
+    # Encrypted members need more than this to be read, and aren't worth supporting.
+    if any(info.flag_bits & 0x1 for info in infos):
+        return None
+    return {
+        info.filename: (
+            info.orig_filename,
+            info.header_offset,
+            info.compress_size,
+            info.file_size,
+            info.compress_type,
+            info.CRC,
+            info.flag_bits,
+        )
+        for info in infos
+    }
+
+
+def _copy_data(data: Any) -> Any:
+    # Several times faster than deepcopy, for anything that is just lists, dicts, strings and numbers.
+    try:
+        return marshal.loads(marshal.dumps(data))
+    except ValueError:
+        return copy.deepcopy(data)
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ProblemCache:
+    """
+    Problems parsed by this process, by root folder, so that grading a problem again only has to check that its
+    init.yml and archive haven't changed since. Worker processes start out with the cache of the judge they were
+    forked from.
+    """
+
+    def __init__(self) -> None:
+        self._problems: 'OrderedDict[str, _ParsedProblem]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Another thread may have been holding it when we were forked.
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def get(self, root_dir: str) -> Optional[_ParsedProblem]:
+        with self._lock:
+            parsed = self._problems.get(root_dir)
+        if parsed is None:
+            return None
+        if not parsed.is_current():
+            with self._lock:
+                if self._problems.get(root_dir) is parsed:
+                    del self._problems[root_dir]
+            return None
+        with self._lock:
+            if root_dir in self._problems:
+                self._problems.move_to_end(root_dir)
+        return parsed
+
+    def put(self, parsed: _ParsedProblem) -> None:
+        # Problems that aren't entirely on disk can't be checked for changes.
+        if not parsed.is_current() or env.problem_cache_size <= 0:
+            return
+        with self._lock:
+            self._problems[parsed.root_dir] = parsed
+            self._problems.move_to_end(parsed.root_dir)
+            while len(self._problems) > env.problem_cache_size:
+                # Not closed, since a submission may still be reading from its archive.
+                self._problems.popitem(last=False)
+
+    def invalidate(self, paths: Optional[Iterable[str]] = None) -> None:
+        """
+        Forgets the problems containing the given paths, or all of them if there are none, along with those whose
+        folders are gone.
+        """
+        if paths is None:
+            with self._lock:
+                self._problems.clear()
+            return
+
+        roots = {os.path.realpath(path) for path in paths} | {os.path.abspath(path) for path in paths}
+        with self._lock:
+            root_dirs = list(self._problems)
+        for root_dir in root_dirs:
+            if not os.path.isdir(root_dir) or any(
+                root_dir == root or root_dir.startswith(root + os.sep) or root.startswith(root_dir + os.sep)
+                for root in roots
+            ):
+                with self._lock:
+                    self._problems.pop(root_dir, None)
+
+
+problem_cache = ProblemCache()
+
+
+def cache_problem(problem_id: str, storage_namespace: Optional[str] = None) -> bool:
+    """
+    Parses a problem ahead of time, so that worker processes forked after this don't have to, and writes its manifest,
+    so that the next judge to start doesn't have to either. Returns whether a manifest was written.
+    """
+    root_dir = get_problem_root(problem_id, storage_namespace)
+    if root_dir is None:
+        return False
+    cached = problem_cache.get(os.path.realpath(root_dir))
+    if cached is not None and cached.in_manifest:
+        return False
+
+    parsed = Problem(problem_id, 0, 0, {}, storage_namespace=storage_namespace)._parsed
+    if parsed.archive is not None:
+        # Worker processes open their own, since they'd otherwise all share one file offset.
+        parsed.archive.close()
+        parsed.archive = None
+    return parsed.save_manifest()
+
 
 class BaseTestCase:
     config: ConfigNode
@@ -60,6 +413,7 @@ class Problem:
     _checkers: Dict[str, Checker]
     problem_data: 'ProblemDataManager'
     config: 'ProblemConfig'
+    _parsed: _ParsedProblem
 
     def __init__(
         self, problem_id: str, time_limit: float, memory_limit: int, meta: dict, storage_namespace: Optional[str] = None
@@ -76,14 +430,18 @@ class Problem:
         # Cache root dir so that we don't need to scan all roots (potentially very slow on networked mount).
         root_dir = get_problem_root(problem_id, storage_namespace)
         assert root_dir is not None
-        self.root_dir = root_dir
+        # Resolved, so that we keep reading the same version of synced test data even if a new one is swapped in.
+        self.root_dir = os.path.realpath(root_dir)
         self.problem_data = ProblemDataManager(self.root_dir)
 
         # Checkers modules must be stored in a dict, for the duration of execution,
         # lest globals be deleted with the module.
         self._checkers = {}
 
-        self.config = ProblemConfig(self.problem_data, meta)
+        cached = problem_cache.get(self.root_dir)
+        self._parsed = cached or _ParsedProblem.load(self.root_dir, self.problem_data)
+
+        self.config = ProblemConfig(self.problem_data, meta, doc=self._parsed.doc)
 
         self.problem_data.archive = self._resolve_archive_files()
 
@@ -93,6 +451,9 @@ class Problem:
         if not self._resolve_test_cases():
             raise InvalidInitException('No test cases? What am I judging?')
 
+        if cached is None:
+            problem_cache.put(self._parsed)
+
     def _match_test_cases(
         self,
         filenames: List[str],
@@ -188,13 +549,24 @@ class Problem:
                 return default
             return test_cases[name] or default
 
+        input_format = get_with_default('input_format', DEFAULT_TEST_CASE_INPUT_PATTERN)
+        output_format = get_with_default('output_format', DEFAULT_TEST_CASE_OUTPUT_PATTERN)
+        case_points = get_with_default('case_points', None)
+        if isinstance(case_points, ConfigNode):
+            case_points = tuple(case_points.unwrap())
+        key = (self.config.archive, input_format, output_format, case_points, self.config.points)
+
         # If the `test_cases` node is None, we try to guess the testcase name format.
-        self.config['test_cases'] = self._match_test_cases(
-            self._problem_file_list(),
-            re.compile(get_with_default('input_format', DEFAULT_TEST_CASE_INPUT_PATTERN), re.IGNORECASE),
-            re.compile(get_with_default('output_format', DEFAULT_TEST_CASE_OUTPUT_PATTERN), re.IGNORECASE),
-            iter(get_with_default('case_points', itertools.repeat(self.config.points))),
-        )
+        matched = self._parsed.test_cases.get(key)
+        if matched is None:
+            self._parsed.in_manifest = False
+            matched = self._parsed.test_cases[key] = self._match_test_cases(
+                self._problem_file_list(),
+                re.compile(input_format, re.IGNORECASE),
+                re.compile(output_format, re.IGNORECASE),
+                iter(case_points) if case_points is not None else itertools.repeat(self.config.points),
+            )
+        self.config['test_cases'] = _copy_data(matched)
 
         return self.config['test_cases']
 
@@ -227,10 +599,9 @@ class Problem:
             if not os.path.exists(archive_path):
                 raise InvalidInitException('archive file "%s" does not exist' % archive_path)
             try:
-                archive = zipfile.ZipFile(archive_path, 'r')
+                return self._parsed.open_archive(archive_path)
             except zipfile.BadZipfile:
                 raise InvalidInitException('bad archive: "%s"' % archive_path)
-            return archive
         return None
 
     def _resolve_testcases(self, cfg, batch_no=0) -> List[BaseTestCase]:
@@ -284,54 +655,182 @@ class ProblemDataManager(dict):
             return open(os.path.join(self.problem_root_dir, key), 'rb')
         except IOError:
             if self.archive:
-                zipinfo = self.archive.getinfo(key)
-                if zipinfo.file_size > self.test_size_limit * 1024:
-                    raise InternalError('test file is too large: %s' % key)
+                zipinfo = self._archive_member(key)
+                view = self.archive.view(key) if isinstance(self.archive, _MappedZipFile) else None
+                if view is not None:
+                    return io.BufferedReader(_MemoryViewReader(view))
                 return self.archive.open(zipinfo)
             raise KeyError('file "%s" could not be found in "%s"' % (key, self.problem_root_dir))
 
+    def _archive_member(self, key: str) -> zipfile.ZipInfo:
+        assert self.archive is not None
+        zipinfo = self.archive.getinfo(key)
+        if zipinfo.file_size > self.test_size_limit * 1024:
+            raise InternalError('test file is too large: %s' % key)
+        return zipinfo
+
+    def _in_archive(self, key: str) -> Optional[zipfile.ZipInfo]:
+        """
+        Returns the archive member a key is read from, or None if it is read from disk or doesn't exist.
+        """
+        if self.archive is None or os.path.exists(os.path.join(self.problem_root_dir, key)):
+            return None
+        try:
+            return self._archive_member(key)
+        except KeyError:
+            return None
+
     def as_fd(self, key: str, normalize: bool = False) -> MmapableIO:
+        shared = self._shared_copy(key, normalize)
+        if shared is not None:
+            return shared
+
         memory = MemoryIO()
-        with self.open(key) as f:
-            if normalize:
+        if normalize:
+            with self.open(key) as f:
                 normalized_file_copy(f, memory)
-            else:
+        elif not self._copy_stored_member(key, memory):
+            with self.open(key) as f:
                 shutil.copyfileobj(f, memory)
         memory.seal()
         return memory
 
+    def _copy_stored_member(self, key: str, dst: MmapableIO) -> bool:
+        """
+        Copies a stored archive member to a file inside the kernel, returning whether the key is one.
+        """
+        if not isinstance(self.archive, _MappedZipFile) or self._in_archive(key) is None:
+            return False
+        data_range = self.archive.stored_range(key)
+        if data_range is None:
+            return False
+
+        # Checks the member's CRC-32 the first time it is read.
+        view = self.archive.view(key)
+        assert view is not None and self.archive.fp is not None
+        with view:
+            offset, size = data_range
+            try:
+                while size:
+                    sent = os.sendfile(dst.fileno(), self.archive.fp.fileno(), offset, size)
+                    if not sent:
+                        raise zipfile.BadZipFile('Truncated data for file %r' % key)
+                    offset += sent
+                    size -= sent
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS) or dst.tell():
+                    raise
+                dst.write(view)
+        return True
+
+    def _shared_copy(self, key: str, normalize: bool) -> Optional[MmapableIO]:
+        """
+        Returns a copy of a file that every submission reading it shares, making and storing it first if no submission
+        has before. Only normalized copies, and copies of compressed archive members, are worth sharing, since anything
+        else is copied straight out of a file. Normalized copies of synced files are stored alongside the blob they came
+        from, and everything else in the normalized cache.
+        """
+        if not SharedFileIO.usable_with_name():
+            return None
+        if not normalize:
+            zipinfo = self._in_archive(key)
+            if zipinfo is None or zipinfo.compress_type == zipfile.ZIP_STORED:
+                return None
+        path = os.path.join(self.problem_root_dir, key)
+        digest = file_digest(path) if normalize else None
+        store = find_blob_store(self.problem_root_dir) if digest is not None else None
+
+        try:
+            if digest is not None and store is not None:
+                normalized = store.derived(digest, 'normalized')
+                if normalized is None:
+                    with open(path, 'rb') as src, tempfile.NamedTemporaryFile(dir=store.root, delete=False) as dst:
+                        try:
+                            normalized_file_copy(src, dst)
+                        except BaseException:
+                            # Collecting the store only looks at blobs, so nothing else would delete it.
+                            os.unlink(dst.name)
+                            raise
+                    normalized = store.add_derived(digest, 'normalized', dst.name)
+                return SharedFileIO(normalized)
+
+            cache = normalized_cache()
+            identity = self._identity(key) if cache is not None else None
+            if cache is None or identity is None:
+                return None
+            if not normalize:
+                identity += ':raw'
+            copy = cache.get(identity)
+            if copy is None:
+                with self.open(key) as src:
+                    copy = cache.add(identity, src, normalize=normalize)
+            return SharedFileIO(copy)
+        except OSError:
+            log.warning('Failed to share copy of %s', path, exc_info=True)
+            return None
+
+    def _identity(self, key: str) -> Optional[str]:
+        """
+        Returns what identifies the contents of a file, for as long as it isn't changed, or None if it doesn't exist.
+        """
+        path = os.path.join(self.problem_root_dir, key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            pass
+        else:
+            return f'{os.path.realpath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}'
+
+        if self.archive is None or self.archive.filename is None:
+            return None
+        try:
+            zipinfo = self._archive_member(key)
+        except KeyError:
+            return None
+        archive_path = self.archive.filename
+        stat = os.stat(archive_path)
+        return (
+            f'{os.path.realpath(archive_path)}:{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}:'
+            f'{key}:{zipinfo.CRC}:{zipinfo.file_size}'
+        )
+
     def __missing__(self, key: str) -> bytes:
+        if isinstance(self.archive, _MappedZipFile) and self._in_archive(key) is not None:
+            view = self.archive.view(key)
+            if view is not None:
+                with view:
+                    return bytes(view)
         with self.open(key) as f:
             return f.read()
 
-    def __del__(self):
-        if self.archive:
-            self.archive.close()
-
 
 class ProblemConfig(ConfigNode):
-    def __init__(self, problem_data: ProblemDataManager, meta: dict = {}) -> None:
+    def __init__(self, problem_data: ProblemDataManager, meta: dict = {}, doc: Any = None) -> None:
+        # Copied, since evaluating the dynamic parts of the config modifies it.
+        doc = self.parse(problem_data) if doc is None else _copy_data(doc)
+        if not doc:
+            raise InvalidInitException('I find your lack of content disturbing.')
+        super().__init__(
+            doc,
+            defaults={
+                'wall_time_factor': 3,
+                'output_prefix_length': 0 if 'signature_grader' in doc else 128,
+                'output_limit_length': 25165824,
+                'binary_data': False,
+                'short_circuit': True,
+                'dependencies': [],
+                'points': 1,
+                'symlinks': {},
+                'meta': meta,
+            },
+        )
+
+    @staticmethod
+    def parse(problem_data: ProblemDataManager) -> Any:
         try:
-            doc = yaml.safe_load(problem_data['init.yml'])
+            return yaml.safe_load(problem_data['init.yml'])
         except (IOError, KeyError, ParserError, ScannerError) as e:
             raise InvalidInitException(str(e))
-        else:
-            if not doc:
-                raise InvalidInitException('I find your lack of content disturbing.')
-            super().__init__(
-                doc,
-                defaults={
-                    'wall_time_factor': 3,
-                    'output_prefix_length': 0 if 'signature_grader' in doc else 128,
-                    'output_limit_length': 25165824,
-                    'binary_data': False,
-                    'short_circuit': True,
-                    'dependencies': [],
-                    'points': 1,
-                    'symlinks': {},
-                    'meta': meta,
-                },
-            )
 
 
 class BatchedTestCase(BaseTestCase):
@@ -361,6 +860,7 @@ class TestCase(BaseTestCase):
     has_binary_data: bool
     _input_data_io: Optional[MmapableIO]
     _generated: Optional[Tuple[MmapableIO, bytes]]
+    _generator_proc: Any
 
     def __init__(self, count: int, batch_no: int, config: ConfigNode, problem: Problem):
         self.position = count
@@ -372,6 +872,9 @@ class TestCase(BaseTestCase):
         self.has_binary_data = config.binary_data
         self._generated = None
         self._input_data_io = None
+        # Held while the generator runs, so that a case being generated ahead of time isn't generated twice.
+        self._generator_lock = threading.Lock()
+        self._generator_proc = None
 
     def _normalize(self, data: bytes) -> bytes:
         # Perhaps the correct answer may be 'no output', in which case it'll be
@@ -385,17 +888,44 @@ class TestCase(BaseTestCase):
 
         # Normalize all newline formats (\r\n, \r, \n) to \n, otherwise we have
         # problems with people creating data on Macs (\r newline) when judged
-        # programs assume \n.
-        data = data.replace(b'\r\n', b'\r').replace(b'\r', b'\n')
-
-        # Some data might be missing a trailing newline, which makes the last
-        # line in the file not-a-line.
-        if not data.endswith(b'\n'):
-            data += b'\n'
+        # programs assume \n. Some data might also be missing a trailing newline,
+        # which makes the last line in the file not-a-line.
+        return normalize(data)
 
-        return data
-
-    def _run_generator(self, gen: Union[str, ConfigNode], args: Optional[Iterable[str]] = None) -> None:
+    def uses_generator(self) -> bool:
+        # don't try running the generator if we specify an output file explicitly,
+        # otherwise generator may segfault and we end up returning the output file anyway
+        return bool(self.config.generator) and (not self.config['out'] or not self.config['in'])
+
+    def generate(self, cpu_affinity: Optional[List[int]] = None) -> None:
+        """
+        Runs the case's generator, unless its data doesn't come from one or it already ran. May be called from any
+        thread, e.g. to generate the data of upcoming cases ahead of time.
+        """
+        with self._generator_lock:
+            if self._generated is not None or not self.uses_generator():
+                return
+            try:
+                self._run_generator(self.config.generator, args=self.config.generator_args, cpu_affinity=cpu_affinity)
+            except BaseException:
+                # Nothing is kept on failure, so that the failure is reported when the case is graded.
+                self._generated = None
+                raise
+
+    def abort_generation(self) -> None:
+        """
+        Kills the case's generator, if it is running. A generator that is still being compiled runs anyway.
+        """
+        proc = self._generator_proc
+        if proc is not None:
+            proc.kill()
+
+    def _run_generator(
+        self,
+        gen: Union[str, ConfigNode],
+        args: Optional[Iterable[str]] = None,
+        cpu_affinity: Optional[List[int]] = None,
+    ) -> None:
         flags = []
         args = args or []
 
@@ -405,8 +935,7 @@ class TestCase(BaseTestCase):
         compiler_time_limit = env.generator_compiler_time_limit
         lang = None  # Default to C/C++
 
-        base = get_problem_root(self.problem.id, self.problem.storage_namespace)
-        assert base is not None
+        base = self.problem.root_dir
         filenames: Union[str, list]
         if isinstance(gen, str):
             filenames = gen
@@ -434,13 +963,27 @@ class TestCase(BaseTestCase):
             filenames = [filenames]
 
         filenames = [os.path.abspath(os.path.join(base, name)) for name in filenames]
-        executor = compile_with_auxiliary_files(
-            self.problem.storage_namespace, filenames, flags, lang, compiler_time_limit
-        )
 
         # convert all args to str before launching; allows for smoother int passing
         assert args is not None
-        args = map(str, args)
+        args = [str(arg) for arg in args]
+
+        try:
+            input = self.problem.problem_data[self.config['in']] if self.config['in'] else None
+        except KeyError:
+            input = None
+
+        # Non-deterministic generators opt out, since every submission must see their output anew.
+        cache = generator_cache() if self.config.generator_cache is not False else None
+        if cache is not None:
+            key = generator_key(filenames, map(str, flags), args, lang, input)
+            if self._load_generated(cache, key):
+                return
+
+        with _generator_compile_lock:
+            executor = compile_with_auxiliary_files(
+                self.problem.storage_namespace, filenames, flags, lang, compiler_time_limit
+            )
 
         input_io = MemoryIO()
         # Enable generators to write any size files.
@@ -457,19 +1000,46 @@ class TestCase(BaseTestCase):
             stderr=subprocess.PIPE,
             stderr_buffer_size=65536,
             stdout_buffer_size=65536,
+            cpu_affinity=cpu_affinity,
         )
 
+        self._generator_proc = proc
         try:
-            input = self.problem.problem_data[self.config['in']] if self.config['in'] else None
-        except KeyError:
-            input = None
-
-        _, stderr = proc.unsafe_communicate(input)
+            _, stderr = proc.unsafe_communicate(input)
+        finally:
+            self._generator_proc = None
         input_io.seal()
         self._generated = input_io, self._normalize(stderr)
 
         parse_helper_file_error(proc, executor, 'generator', stderr, time_limit, memory_limit)
 
+        if cache is not None:
+            try:
+                cache.add(key, input_io.to_path(), self._generated[1])
+            except OSError:
+                log.warning('Failed to cache output of generator %s', filenames, exc_info=True)
+
+    def _load_generated(self, cache: GeneratorCache, key: str) -> bool:
+        paths = cache.get(key)
+        if paths is None:
+            return False
+        input_path, output_path = paths
+        try:
+            with open(output_path, 'rb') as f:
+                output = f.read()
+            if SharedFileIO.usable_with_name():
+                input_io: MmapableIO = SharedFileIO(input_path)
+            else:
+                input_io = MemoryIO()
+                with open(input_path, 'rb') as f:
+                    shutil.copyfileobj(f, input_io)
+                input_io.seal()
+        except FileNotFoundError:
+            # Deleted to make room since it was looked up.
+            return False
+        self._generated = input_io, output
+        return True
+
     def input_data(self) -> bytes:
         return self.input_data_io().to_bytes()
 
@@ -481,13 +1051,8 @@ class TestCase(BaseTestCase):
         return result
 
     def _make_input_data_io(self) -> MmapableIO:
-        gen = self.config.generator
-
-        # don't try running the generator if we specify an output file explicitly,
-        # otherwise generator may segfault and we end up returning the output file anyway
-        if gen and (not self.config['out'] or not self.config['in']):
-            if self._generated is None:
-                self._run_generator(gen, args=self.config.generator_args)
+        if self.uses_generator():
+            self.generate()
             assert self._generated is not None
             if self._generated[0]:
                 return self._generated[0]
@@ -500,16 +1065,33 @@ class TestCase(BaseTestCase):
 
     def output_data(self) -> bytes:
         if self.config.out:
-            return self._normalize(self.problem.problem_data[self.config.out])
-        gen = self.config.generator
-        if gen:
-            if self._generated is None:
-                self._run_generator(gen, args=self.config.generator_args)
+            if self.has_binary_data:
+                return self.problem.problem_data[self.config.out]
+            # Normalized the same way as inputs, so that the copy other submissions made can be read instead.
+            with self.problem.problem_data.as_fd(self.config.out, normalize=True) as output:
+                return output.to_bytes()
+        if self.config.generator:
+            self.generate()
             assert self._generated is not None
             return self._generated[1]
         return b''
 
     def checker(self) -> partial:
+        checker, params = self._load_checker()
+        return partial(checker.check, **params)
+
+    def streaming_checker(self) -> Optional[partial]:
+        """
+        Returns what starts a `StreamingChecker` for this case, if its checker can check output as it is produced.
+        Checkers that run on errors see the whole result, so they never stream.
+        """
+        checker, params = self._load_checker()
+        stream = getattr(checker, 'stream', None)
+        if not callable(stream) or getattr(checker.check, 'run_on_error', False):
+            return None
+        return partial(stream, **params)
+
+    def _load_checker(self) -> Tuple[Checker, Dict[str, Any]]:
         try:
             name = self.config['checker'] or 'standard'
             if isinstance(name, ConfigNode):
@@ -530,6 +1112,7 @@ class TestCase(BaseTestCase):
             raise InvalidInitException('malformed checker: no check method found')
 
         params['storage_namespace'] = self.problem.storage_namespace
+        params['problem_root'] = self.problem.root_dir
 
         # Themis checker need input name and output name
         if self.config['in']:
@@ -537,7 +1120,7 @@ class TestCase(BaseTestCase):
         if self.config['out']:
             params['output_name'] = self.config['out']
 
-        return partial(checker.check, **params)
+        return checker, params
 
     def free_data(self) -> None:
         self._generated = None
@@ -549,7 +1132,7 @@ class TestCase(BaseTestCase):
 
     # FIXME(tbrindus): this is a hack working around the fact we can't pickle these fields, but we do need parts of
     # TestCase itself on the other end of the IPC.
-    _pickle_blacklist = ('_generated', 'config', 'problem', '_input_data_io')
+    _pickle_blacklist = ('_generated', 'config', 'problem', '_input_data_io', '_generator_lock', '_generator_proc')
 
     def __getstate__(self) -> dict:
         k = {k: v for k, v in self.__dict__.items() if k not in self._pickle_blacklist}
@@ -557,3 +1140,5 @@ class TestCase(BaseTestCase):
 
     def __setstate__(self, state) -> None:
         self.__dict__.update(state)
+        self._generator_lock = threading.Lock()
+        self._generator_proc = None
@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import marshal
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from dmoj.judgeenv import env
+from dmoj.utils.os_ext import private_dir
+
+log = logging.getLogger(__name__)
+
+# Bumped whenever what goes into a manifest changes, so that old manifests are ignored rather than misread.
+MANIFEST_VERSION = 1
+
+
+def manifest_dir() -> str:
+    # Manifests are trusted as much as init.yml, so no one else may write them.
+    return private_dir(
+        env.problem_manifest_dir or os.path.join(env.tempdir or tempfile.gettempdir(), 'dmoj-problem-manifests')
+    )
+
+
+def manifest_path(root_dir: str) -> str:
+    return os.path.join(manifest_dir(), hashlib.sha256(root_dir.encode('utf-8', 'surrogateescape')).hexdigest())
+
+
+def read_manifest(root_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the manifest written for a problem root folder, if there is one. Whether it is still up to date is for the
+    caller to check, against the stamps of the files it was built from.
+    """
+    try:
+        with open(manifest_path(root_dir), 'rb') as f:
+            manifest = marshal.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError):
+        log.warning('Ignoring unreadable problem manifest for %s', root_dir, exc_info=True)
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION or manifest['root'] != root_dir:
+        return None
+    return manifest
+
+
+def write_manifest(root_dir: str, manifest: Dict[str, Any]) -> bool:
+    """
+    Writes the manifest of a problem root folder, returning whether it could be. Problems whose init.yml holds something
+    other than plain data (e.g. dates) can't have one.
+    """
+    manifest = dict(manifest, version=MANIFEST_VERSION, root=root_dir)
+    try:
+        data = marshal.dumps(manifest)
+    except ValueError:
+        log.debug('Problem in %s cannot be stored in a manifest', root_dir)
+        return False
+
+    try:
+        path = manifest_path(root_dir)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix='.', delete=False) as f:
+            f.write(data)
+        # Readers never see a partially written manifest.
+        os.replace(f.name, path)
+    except OSError:
+        log.warning('Failed to write problem manifest for %s', root_dir, exc_info=True)
+        return False
+    return True
+
+
+def prune_manifests() -> int:
+    """
+    Deletes the manifests of problem root folders that no longer exist, e.g. old versions of synced problems. Returns
+    how many were deleted.
+    """
+    root = manifest_dir()
+    names = os.listdir(root)
+
+    pruned = 0
+    for name in names:
+        if name.startswith('.'):
+            # Still being written.
+            continue
+        path = os.path.join(root, name)
+        try:
+            with open(path, 'rb') as f:
+                root_dir = marshal.load(f)['root']
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            root_dir = None
+        if root_dir is None or not os.path.isdir(root_dir):
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            pruned += 1
+    return pruned
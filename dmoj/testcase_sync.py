@@ -0,0 +1,732 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+
+from dmoj.blob_store import BLOBS_DIR, BlobStore
+from dmoj.judgeenv import env, get_problem_roots, set_remote_problems, update_supported_problems
+from dmoj.problem_manifest import prune_manifests
+from dmoj.utils.os_ext import private_dir
+
+log = logging.getLogger(__name__)
+
+PREFIX = 'tests/'
+# How much of a response body is written to disk at once.
+CHUNK_SIZE = 1 << 20
+# Seconds to wait before retrying a failed download, doubling with each further attempt.
+RETRY_BACKOFF = 0.5
+# What was downloaded into a problem folder: the size and ETag of each object, and the mtime of the file it was saved
+# to, so we can tell which objects changed remotely and which files were touched locally.
+MANIFEST_NAME = '.sync-manifest.json'
+# Every sync of a problem downloads into a new version folder under `<root>/.versions/<problem>`, and then atomically
+# points the symlink `<root>/<problem>` at it. Names starting with a dot are skipped by problem globs.
+VERSIONS_DIR = '.versions'
+
+Manifest = Dict[str, Dict[str, Any]]
+
+
+class StorageCredentials(NamedTuple):
+    endpoint: str
+    access_key_id: str
+    secret_access_key: str
+    bucket: str
+    region: str
+
+
+class RemoteObject(NamedTuple):
+    key: str
+    last_modified: float
+    size: int
+    etag: str
+
+
+def _problem_lock_dir() -> str:
+    return os.path.join(env.tempdir or tempfile.gettempdir(), 'dmoj-problem-locks')
+
+
+@contextmanager
+def _file_lock(name: str, shared: bool) -> Iterator[int]:
+    # Private, since anyone who could hold one of these locks could keep problems from being synced or graded.
+    lock_dir = private_dir(_problem_lock_dir())
+    fd = os.open(os.path.join(lock_dir, name + '.lock'), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def problem_lock(problem_id: str, shared: bool = True) -> Iterator[None]:
+    """
+    Locks a problem's data against being synced (if `shared`), or against being graded while it is synced. This is a
+    file lock, since problems are graded in worker processes.
+    """
+    with _file_lock(problem_id, shared) as fd:
+        if shared:
+            # Only graders take the lock shared, so its mtime is when the problem was last graded.
+            os.utime(fd)
+        yield
+
+
+def _problem_last_used(problem_id: str) -> float:
+    try:
+        return os.stat(os.path.join(_problem_lock_dir(), problem_id + '.lock')).st_mtime
+    except OSError:
+        return 0.0
+
+
+@contextmanager
+def problem_version_lock(problem_dir: str) -> Iterator[None]:
+    """
+    Keeps a version of a problem's data from being deleted after a sync replaces it, so that it can be graded with to
+    the end. `problem_dir` should be resolved while holding `problem_lock`, since that is when versions are swapped.
+    """
+    fd = os.open(problem_dir, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+class ProblemDataSync:
+    """
+    Syncs test data from an S3-compatible bucket into the first problem root, storing the last sync timestamp in a local
+    file inside the problem root (lastsync_<id>).
+
+    The site asks for a sync with every ping, so requests are only queued here: a single background thread runs them,
+    at most once every `min_interval` seconds, and a request made while a sync is running just makes sure another one
+    follows it.
+
+    Problem folders are symlinks to versions under `.versions`, so that each problem can be replaced all at once.
+
+    If `testcase_sync_lazy` is set, only problems that are already here are kept up to date. The rest are only listed,
+    so that the judge can advertise them, and are fetched the first time they are graded. The least recently graded of
+    them are deleted again to keep the test data under `testcase_sync_cache_size` bytes.
+    """
+
+    def __init__(
+        self, judge_id: str, min_interval: float, on_update: Optional[Callable[[List[str]], None]] = None
+    ) -> None:
+        self.judge_id = judge_id
+        self.min_interval = min_interval
+        # Called with the folder of each problem that was swapped for a new version.
+        self.on_update = on_update
+        self._lock = threading.Lock()
+        self._requested = threading.Condition(self._lock)
+        self._pending: Optional[StorageCredentials] = None
+        self._last_sync_time: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.concurrency = max(1, env.testcase_sync_concurrency)
+        self.part_size = env.testcase_sync_part_size
+        self.retries = env.testcase_sync_retries
+        self.verify_checksums = env.testcase_sync_verify_checksums
+        # Whether the problem folders have been checked against their manifests since startup.
+        self._repaired = False
+
+        self.lazy = env.testcase_sync_lazy
+        self.cache_size = env.testcase_sync_cache_size
+        # The problems in the bucket, and when each last changed.
+        self._remote_problems: Dict[str, float] = {}
+
+    def request(self, credentials: StorageCredentials) -> None:
+        with self._lock:
+            # Only the most recent credentials matter.
+            self._pending = credentials
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sync_forever, name='testcase-sync', daemon=True)
+                self._thread.start()
+            self._requested.notify()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._requested.notify()
+
+    def _sync_forever(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._pending is not None:
+                        wait = 0.0
+                        if self._last_sync_time is not None:
+                            wait = self._last_sync_time + self.min_interval - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._requested.wait(wait)
+                    else:
+                        self._requested.wait()
+                if self._closed:
+                    return
+                credentials, self._pending = self._pending, None
+                self._last_sync_time = time.monotonic()
+
+            assert credentials is not None
+            try:
+                self.sync(credentials)
+            except Exception:
+                log.exception('Test case sync failed')
+
+    def _client(self, credentials: StorageCredentials):
+        return boto3.client(
+            's3',
+            aws_access_key_id=credentials.access_key_id,
+            aws_secret_access_key=credentials.secret_access_key,
+            endpoint_url=credentials.endpoint,
+            region_name=(None if credentials.region == 'auto' else credentials.region),
+            # The client is shared by all downloads, so keep a connection around for each of them.
+            config=BotoConfig(signature_version='s3v4', max_pool_connections=self.concurrency),
+        )
+
+    @staticmethod
+    def _dest_root() -> Optional[str]:
+        # Locate problem roots
+        roots = get_problem_roots()
+        if not roots:
+            log.error('No configured problem roots to extract testcases into')
+            return None
+        return roots[0]
+
+    def sync(self, credentials: StorageCredentials) -> None:
+        s3 = self._client(credentials)
+        dest_root = self._dest_root()
+        if dest_root is None:
+            return
+
+        versions_root = os.path.join(dest_root, VERSIONS_DIR)
+        if os.path.isdir(versions_root):
+            # Versions that were still being graded with when they were replaced.
+            for slug in os.listdir(versions_root):
+                self._collect_versions(dest_root, slug)
+        BlobStore(os.path.join(dest_root, BLOBS_DIR)).collect()
+
+        lastsync_filepath = os.path.join(dest_root, f'lastsync_{self.judge_id}')
+        lastsync = self._read_lastsync(lastsync_filepath)
+
+        # Anything uploaded while we list is picked up by the next sync.
+        now_ts = time.time()
+        problem_updates, all_objects = self._list_objects(s3, credentials.bucket)
+        if self.lazy:
+            self._advertise(dest_root, problem_updates)
+            self.evict(dest_root)
+            # The rest are fetched when they're first graded.
+            all_objects = {
+                slug: objects for slug, objects in all_objects.items() if os.path.isdir(os.path.join(dest_root, slug))
+            }
+
+        problems_to_sync = {slug for slug, ts in problem_updates.items() if ts > lastsync and slug in all_objects}
+        if not self._repaired:
+            # A previous run may have died mid-sync, or someone may have touched the files since.
+            problems_to_sync.update(
+                slug
+                for slug, objects in all_objects.items()
+                if slug not in problems_to_sync and not self._is_problem_current(dest_root, slug, objects)
+            )
+            self._repaired = True
+        if not problems_to_sync:
+            log.debug('No updated problem folders to sync (lastsync=%s)', lastsync)
+            return
+
+        complete = True
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='testcase-download') as pool:
+            for slug in sorted(problems_to_sync):
+                if not self._sync_problem(s3, pool, credentials.bucket, dest_root, slug, all_objects[slug]):
+                    complete = False
+
+        if not complete:
+            # Leave lastsync alone so the next sync tries again; whatever did make it is in the manifests.
+            log.warning('Some test data failed to sync, will retry on next sync')
+            return
+
+        try:
+            with open(lastsync_filepath, 'w', encoding='utf-8') as f:
+                f.write(str(now_ts))
+            log.info('Updated local lastsync file at %s to %s', lastsync_filepath, now_ts)
+        except Exception:
+            log.exception('Failed to update local lastsync file %s', lastsync_filepath)
+
+    @staticmethod
+    def _read_lastsync(lastsync_filepath: str) -> float:
+        if os.path.isfile(lastsync_filepath):
+            try:
+                with open(lastsync_filepath, 'r', encoding='utf-8') as f:
+                    return float(f.read().strip())
+            except Exception:
+                log.exception('Error reading local lastsync file; defaulting to 0')
+        return 0.0
+
+    @staticmethod
+    def _list_objects(s3, bucket: str, prefix: str = PREFIX) -> Tuple[Dict[str, float], Dict[str, List[RemoteObject]]]:
+        """
+        Lists the objects under `prefix` (by default, all of `tests/`), grouped by problem, along with when each problem
+        last changed.
+        """
+        problem_updates: Dict[str, float] = {}
+        all_objects: Dict[str, List[RemoteObject]] = {}
+
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if not key.startswith(PREFIX):
+                    continue
+                rel = key[len(PREFIX) :]
+                if not rel or rel.startswith('/'):
+                    continue
+                problem_slug = rel.split('/')[0]
+                lm = obj['LastModified']
+                lm_ts = lm.replace(tzinfo=timezone.utc).timestamp() if isinstance(lm, datetime) else float(lm)
+                all_objects.setdefault(problem_slug, []).append(
+                    RemoteObject(key, lm_ts, obj.get('Size', 0), obj.get('ETag', ''))
+                )
+                if lm_ts > problem_updates.get(problem_slug, 0):
+                    problem_updates[problem_slug] = lm_ts
+
+        return problem_updates, all_objects
+
+    def _sync_problem(
+        self, s3, pool: ThreadPoolExecutor, bucket: str, dest_root: str, slug: str, objects: List[RemoteObject]
+    ) -> bool:
+        """
+        Brings a problem up to date by building a new version of its folder next to the live one, and then swapping it
+        in, so that submissions never see a half-synced problem. Files that didn't change are hard linked from the live
+        version, and only new or changed objects are downloaded. Returns whether the problem is up to date.
+        """
+        live_folder = os.path.join(dest_root, slug)
+        manifest_path = os.path.join(live_folder, MANIFEST_NAME)
+        had_manifest = os.path.isfile(manifest_path)
+        manifest = self._load_manifest(manifest_path)
+        loaded_manifest = dict(manifest)
+
+        remote_keys = {obj.key for obj in objects}
+        stale = [obj for obj in objects if not self._is_object_current(dest_root, obj, manifest)]
+        stale_keys = {obj.key for obj in stale}
+
+        # The files of the live version to carry over, relative to the problem folder.
+        kept: List[str] = []
+        dropped = False
+        for root_dir, _, files in os.walk(live_folder):
+            for f in files:
+                path = os.path.relpath(os.path.join(root_dir, f), live_folder)
+                key = PREFIX + slug + '/' + path.replace(os.sep, '/')
+                if path.startswith(MANIFEST_NAME) or key in stale_keys:
+                    continue
+                # Folders synced before we kept manifests may have anything in them, so like we used to, get rid of
+                # whatever isn't in the bucket. Otherwise, only files of objects that are gone.
+                if key in remote_keys or (had_manifest and key not in manifest):
+                    kept.append(path)
+                else:
+                    dropped = True
+
+        if not stale and not dropped and had_manifest and os.path.islink(live_folder):
+            if manifest != loaded_manifest:
+                # We adopted some files we had no record of.
+                self._save_manifest(manifest_path, manifest)
+            return True
+
+        log.info('Syncing %s: %d of %d files changed', slug, len(stale), len(objects))
+        versions_folder = os.path.join(dest_root, VERSIONS_DIR, slug)
+        version_folder = self._new_version_folder(versions_folder)
+        published = False
+        try:
+            with problem_version_lock(version_folder):
+                for path in kept:
+                    self._link_file(os.path.join(live_folder, path), os.path.join(version_folder, path))
+                new_manifest = {key: entry for key, entry in manifest.items() if key in remote_keys - stale_keys}
+
+                downloaded = self._download_objects(s3, pool, bucket, version_folder, slug, stale)
+                if len(downloaded) != len(stale):
+                    # Keep the live version rather than publish one that's half old and half new.
+                    return False
+                store = BlobStore(os.path.join(dest_root, BLOBS_DIR))
+                paths = [self._object_path(version_folder, slug, obj) for obj in downloaded]
+                for _ in pool.map(partial(self._add_blob, store), paths):
+                    pass
+                for obj in downloaded:
+                    new_manifest[obj.key] = self._manifest_entry(self._object_path(version_folder, slug, obj), obj)
+                self._save_manifest(os.path.join(version_folder, MANIFEST_NAME), new_manifest)
+
+                self._publish(dest_root, slug, version_folder)
+                published = True
+        finally:
+            if not published:
+                shutil.rmtree(version_folder, ignore_errors=True)
+
+        self._collect_versions(dest_root, slug)
+        if self.on_update is not None:
+            self.on_update([live_folder])
+        return True
+
+    @staticmethod
+    def _add_blob(store: BlobStore, path: str) -> None:
+        try:
+            store.add(path)
+        except OSError:
+            # Still usable, just not shared.
+            log.exception('Failed to add %s to the blob store', path)
+
+    @staticmethod
+    def _new_version_folder(versions_folder: str) -> str:
+        os.makedirs(versions_folder, exist_ok=True)
+        version_folder = tempfile.mkdtemp(prefix='v', dir=versions_folder)
+        # mkdtemp makes folders only we can read.
+        os.chmod(version_folder, 0o755)
+        return version_folder
+
+    @staticmethod
+    def _link_file(source: str, target: str) -> None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            # e.g. a filesystem without hard links.
+            shutil.copy2(source, target)
+
+    def _publish(self, dest_root: str, slug: str, version_folder: str) -> None:
+        """
+        Atomically points a problem's folder at a new version. Submissions only resolve the folder while holding the
+        problem lock, so the ones that started before keep grading with the version they loaded.
+        """
+        live_folder = os.path.join(dest_root, slug)
+        swap_link = os.path.join(dest_root, '.%s.swap' % slug)
+        with problem_lock(slug, shared=False):
+            if os.path.isdir(live_folder) and not os.path.islink(live_folder):
+                # Synced before we kept versions, so make it one, to be cleaned up once no one is grading with it.
+                os.rename(live_folder, self._new_version_folder(os.path.dirname(version_folder)))
+            self._remove_file(swap_link)
+            os.symlink(os.path.relpath(version_folder, dest_root), swap_link)
+            os.replace(swap_link, live_folder)
+        log.info('Published new version of %s at %s', slug, version_folder)
+
+    def _collect_versions(self, dest_root: str, slug: str) -> None:
+        """
+        Deletes the versions of a problem that have been replaced, unless some submission is still being graded with
+        them (or they are still being built).
+        """
+        versions_folder = os.path.join(dest_root, VERSIONS_DIR, slug)
+        unused: List[Tuple[str, int]] = []
+        with problem_lock(slug, shared=False):
+            # Versions can't be picked up once they've been replaced, so one that no one holds now never will be.
+            live_folder = os.path.realpath(os.path.join(dest_root, slug))
+            for name in os.listdir(versions_folder):
+                path = os.path.join(versions_folder, name)
+                if os.path.realpath(path) == live_folder:
+                    continue
+                try:
+                    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+                except OSError:
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+                unused.append((path, fd))
+
+        for path, fd in unused:
+            try:
+                log.debug('Removing old version of %s at %s', slug, path)
+                shutil.rmtree(path)
+            except OSError:
+                log.exception('Failed to remove old version of %s at %s', slug, path)
+            finally:
+                os.close(fd)
+
+        try:
+            # Only empty if the problem was evicted.
+            os.rmdir(versions_folder)
+        except OSError:
+            pass
+
+        if unused:
+            # Graders wrote manifests for the versions they loaded, which are of no use any more.
+            try:
+                prune_manifests()
+            except OSError:
+                log.warning('Failed to prune problem manifests', exc_info=True)
+
+    def _advertise(self, dest_root: str, problem_updates: Dict[str, float]) -> None:
+        changed = {
+            slug
+            for slug in self._remote_problems.keys() | problem_updates.keys()
+            if self._remote_problems.get(slug) != problem_updates.get(slug)
+        }
+        self._remote_problems = problem_updates
+        set_remote_problems(problem_updates)
+        if changed and self.on_update is not None:
+            self.on_update([os.path.join(dest_root, slug) for slug in sorted(changed)])
+
+    def fetch(self, credentials: StorageCredentials, problem_id: str) -> bool:
+        """
+        Downloads a problem that isn't here yet, when problems are fetched the first time they are graded, then makes
+        room for it. Returns whether the problem is here now.
+        """
+        with self.fetch_locked(credentials, problem_id) as fetched:
+            pass
+        self.evict()
+        return fetched
+
+    @contextmanager
+    def fetch_locked(self, credentials: StorageCredentials, problem_id: str) -> Iterator[bool]:
+        """
+        Like `fetch`, but yields holding `problem_lock` on the problem, so that it can be loaded before anything evicts
+        it, and leaves eviction to the caller, which should `evict` once it holds the version lock of what it loaded.
+        """
+        dest_root = self._dest_root()
+        if dest_root is None:
+            with problem_lock(problem_id):
+                yield False
+            return
+        live_folder = os.path.join(dest_root, problem_id)
+
+        with ExitStack() as stack:
+            # Other submissions of the problem wait for the first one to fetch it.
+            with _file_lock(problem_id + '.fetch', shared=False):
+                fetched = os.path.isdir(live_folder) or self._download(credentials, dest_root, problem_id)
+                # Taken before the fetch lock is let go of, since an eviction may come in between otherwise.
+                stack.enter_context(problem_lock(problem_id))
+
+            if fetched:
+                # Make this process aware of the problem, since it may have been forked before it was here.
+                update_supported_problems([live_folder])
+            yield fetched
+
+    def _download(self, credentials: StorageCredentials, dest_root: str, problem_id: str) -> bool:
+        s3 = self._client(credentials)
+        _, all_objects = self._list_objects(s3, credentials.bucket, PREFIX + problem_id + '/')
+        if problem_id not in all_objects:
+            return False
+        log.info('Fetching %s on first use', problem_id)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='testcase-download') as pool:
+            return self._sync_problem(s3, pool, credentials.bucket, dest_root, problem_id, all_objects[problem_id])
+
+    def evict(self, dest_root: Optional[str] = None) -> None:
+        """
+        Deletes the least recently graded problems fetched from the bucket until the rest fit in `cache_size` bytes,
+        skipping ones that are being graded. The most recently graded problem is always kept, even if it doesn't fit.
+        """
+        if not self.cache_size:
+            return
+        if dest_root is None:
+            dest_root = self._dest_root()
+            if dest_root is None:
+                return
+        try:
+            slugs = os.listdir(os.path.join(dest_root, VERSIONS_DIR))
+        except FileNotFoundError:
+            return
+
+        cached: List[Tuple[float, str, int]] = []
+        for slug in slugs:
+            manifest = self._load_manifest(os.path.join(dest_root, slug, MANIFEST_NAME))
+            cached.append((_problem_last_used(slug), slug, sum(entry['size'] for entry in manifest.values())))
+        cached.sort()
+
+        total = sum(size for _, _, size in cached)
+        for _, slug, size in cached[:-1]:
+            if total <= self.cache_size:
+                break
+            if self._evict_problem(dest_root, slug):
+                total -= size
+
+    def _evict_problem(self, dest_root: str, slug: str) -> bool:
+        live_folder = os.path.join(dest_root, slug)
+        with problem_lock(slug, shared=False):
+            if not os.path.islink(live_folder):
+                # Not ours to delete.
+                return False
+            try:
+                fd = os.open(live_folder, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+            except OSError:
+                os.unlink(live_folder)
+            else:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Being graded.
+                    return False
+                else:
+                    os.unlink(live_folder)
+                finally:
+                    os.close(fd)
+
+        log.info('Evicted %s from the test data cache', slug)
+        self._collect_versions(dest_root, slug)
+        return True
+
+    def _is_problem_current(self, dest_root: str, slug: str, objects: List[RemoteObject]) -> bool:
+        manifest = self._load_manifest(os.path.join(dest_root, slug, MANIFEST_NAME))
+        return all(self._is_object_current(dest_root, obj, manifest, self.verify_checksums) for obj in objects)
+
+    @staticmethod
+    def _is_object_current(dest_root: str, obj: RemoteObject, manifest: Manifest, verify: bool = False) -> bool:
+        """
+        Returns whether an object's file is what we'd get by downloading it again. Files we have no record of are
+        adopted if they look like they were downloaded after the object was last uploaded.
+        """
+        path = os.path.join(dest_root, obj.key[len(PREFIX) :])
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != obj.size:
+            return False
+
+        entry = manifest.get(obj.key)
+        if entry is None:
+            if stat.st_mtime < obj.last_modified:
+                return False
+        elif entry['etag'] != obj.etag or entry['size'] != obj.size or entry['mtime'] != stat.st_mtime:
+            return False
+
+        # Only single-part uploads have the MD5 of their contents as their ETag.
+        etag = obj.etag.strip('"')
+        if verify and etag and '-' not in etag:
+            md5 = hashlib.md5()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    md5.update(chunk)
+            if md5.hexdigest() != etag:
+                return False
+
+        if entry is None:
+            manifest[obj.key] = ProblemDataSync._manifest_entry(path, obj)
+        return True
+
+    @staticmethod
+    def _object_path(folder: str, slug: str, obj: RemoteObject) -> str:
+        return os.path.join(folder, *obj.key[len(PREFIX) + len(slug) + 1 :].split('/'))
+
+    @staticmethod
+    def _manifest_entry(path: str, obj: RemoteObject) -> Dict[str, Any]:
+        return {'size': obj.size, 'etag': obj.etag, 'mtime': os.stat(path).st_mtime}
+
+    @staticmethod
+    def _load_manifest(manifest_path: str) -> Manifest:
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            log.exception('Failed to read sync manifest %s, resyncing problem', manifest_path)
+            return {}
+
+    @staticmethod
+    def _save_manifest(manifest_path: str, manifest: Manifest) -> None:
+        temp_path = manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            log.exception('Failed to remove file %s', path)
+
+    def _download_objects(
+        self, s3, pool: ThreadPoolExecutor, bucket: str, folder: str, slug: str, objects: List[RemoteObject]
+    ) -> List[RemoteObject]:
+        """
+        Downloads a problem's objects into `folder` side by side, splitting large objects into ranges that are
+        downloaded side by side too. Returns the objects that were downloaded.
+        """
+        start_time = time.monotonic()
+        parts: Dict[RemoteObject, List[Future]] = {}
+        for obj in objects:
+            target_path = self._object_path(folder, slug, obj)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            log.debug('Downloading %s -> %s', obj.key, target_path)
+            with open(target_path, 'wb') as f:
+                # So that every range can be written in place as soon as it arrives.
+                f.truncate(obj.size)
+            parts[obj] = [
+                pool.submit(self._download_range, s3, bucket, obj, target_path, byte_range)
+                for byte_range in self._ranges(obj.size)
+            ]
+
+        downloaded: List[RemoteObject] = []
+        downloaded_bytes = 0
+        for obj, futures in parts.items():
+            try:
+                for future in futures:
+                    future.result()
+            except (BotoCoreError, ClientError) as e:
+                log.exception('S3 error while downloading %s: %s', obj.key, e)
+            except Exception:
+                log.exception('Unexpected error downloading %s', obj.key)
+            else:
+                downloaded.append(obj)
+                downloaded_bytes += obj.size
+
+        elapsed = time.monotonic() - start_time
+        log.info(
+            'Synced %s: %d/%d files, %.1f MiB in %.1fs (%.1f MiB/s)',
+            slug,
+            len(downloaded),
+            len(objects),
+            downloaded_bytes / 1048576,
+            elapsed,
+            downloaded_bytes / 1048576 / max(elapsed, 1e-6),
+        )
+        return downloaded
+
+    def _ranges(self, size: int) -> List[Optional[Tuple[int, int]]]:
+        if size <= self.part_size:
+            return [None]
+        return [(start, min(start + self.part_size, size) - 1) for start in range(0, size, self.part_size)]
+
+    def _download_range(
+        self, s3, bucket: str, obj: RemoteObject, target_path: str, byte_range: Optional[Tuple[int, int]]
+    ) -> None:
+        """
+        Downloads an object, or the given inclusive range of bytes of it, into place, retrying with backoff.
+        """
+        key = obj.key
+        request = {'Bucket': bucket, 'Key': key}
+        if obj.etag:
+            # Don't stitch together ranges of different versions of the object.
+            request['IfMatch'] = obj.etag
+        if byte_range is not None:
+            request['Range'] = 'bytes=%d-%d' % byte_range
+
+        attempt = 0
+        while True:
+            try:
+                body = s3.get_object(**request)['Body']
+                with open(target_path, 'r+b') as f:
+                    f.seek(byte_range[0] if byte_range is not None else 0)
+                    for chunk in iter(lambda: body.read(CHUNK_SIZE), b''):
+                        f.write(chunk)
+                    if byte_range is None:
+                        # The object may have changed size since it was listed.
+                        f.truncate()
+                return
+            except (BotoCoreError, ClientError, OSError):
+                if attempt >= self.retries:
+                    raise
+                delay = RETRY_BACKOFF * 2**attempt
+                attempt += 1
+                log.warning('Failed to download %s, retrying in %.1fs', key, delay, exc_info=True)
+                time.sleep(delay)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import unittest
+import zlib
+from types import SimpleNamespace
+from unittest import mock
+
+from dmoj.async_packet import AsyncPacketManager
+from dmoj.packet import PacketManager
+from dmoj.packet_codec import PacketCodec
+from dmoj.result import Result
+
+
+class AsyncPacketManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = AsyncPacketManager('localhost', 0, None, 'judge', 'key')
+        self.case = SimpleNamespace(points=1, output_prefix_length=0)
+
+    def next_packets(self):
+        packets = []
+        for serialized in self.manager._next_outbound():
+            data = self.manager._codec.frame(serialized)
+            packets.append(json.loads(zlib.decompress(data[PacketManager.SIZE_PACK.size :])))
+        return packets
+
+    def drain(self):
+        packets = []
+        while True:
+            batch = self.next_packets()
+            if not batch:
+                return packets
+            packets += batch
+
+    def test_control_packets_first(self):
+        self.manager.supported_problems_packet([])
+        self.manager.begin_grading_packet(1, False)
+        self.manager.ping_packet(0)
+        self.assertEqual(
+            [packet['name'] for packet in self.drain()], ['ping-response', 'grading-begin', 'supported-problems']
+        )
+
+    def test_results_coalesced(self):
+        for position in range(1, 4):
+            self.manager.test_case_status_packet(1, position, Result(self.case))
+        self.manager.test_case_status_packet(2, 1, Result(self.case))
+
+        packets = self.drain()
+        self.assertEqual(
+            [(packet['name'], packet['submission-id']) for packet in packets],
+            [('test-case-status', 1), ('test-case-status', 2)],
+        )
+        self.assertEqual([case['position'] for case in packets[0]['cases']], [1, 2, 3])
+
+    def test_submission_order_kept(self):
+        self.manager.batch_begin_packet(1)
+        self.manager.test_case_status_packet(1, 1, Result(self.case))
+        self.manager.test_case_status_packet(2, 1, Result(self.case))
+        self.manager.grading_end_packet(1)
+        self.manager.ping_packet(0)
+
+        packets = [(packet['name'], packet.get('submission-id')) for packet in self.drain()]
+        self.assertEqual(
+            packets,
+            [
+                ('ping-response', None),
+                ('batch-begin', 1),
+                ('test-case-status', 1),
+                ('grading-end', 1),
+                ('test-case-status', 2),
+            ],
+        )
+
+    def test_replayed_final_packet_closes_journal(self):
+        self.manager._journal.open(1)
+        for packet in ({'name': 'grading-begin', 'submission-id': 1}, {'name': 'grading-end', 'submission-id': 1}):
+            # Lost with the connection.
+            self.manager._journal.written(self.manager._serialize_packet(packet), delivered=False)
+
+        async def handshake():
+            codec = PacketCodec()
+            reader = asyncio.StreamReader()
+            reader.feed_data(codec.frame(codec.serialize({'name': 'handshake-success', 'resume': {'1': 0}})))
+            writer = mock.Mock(drain=mock.AsyncMock())
+            await self.manager._handshake_async(reader, writer, [], {})
+            return writer
+
+        writer = asyncio.run(handshake())
+        # The handshake, then the final packet.
+        self.assertEqual(writer.write.call_count, 2)
+        self.assertEqual(self.manager._journal.submission_ids(), [])
+
+    def test_close_stops_sync(self):
+        self.manager.close()
+        self.assertTrue(self.manager._testcase_sync._closed)
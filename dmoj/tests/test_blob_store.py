@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dmoj.blob_store import BLOBS_DIR, BlobStore, file_digest, find_blob_store, hash_file
+from dmoj.problem import ProblemDataManager
+
+
+class BlobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = self.tempdir.name
+        self.store = BlobStore(os.path.join(self.root, BLOBS_DIR))
+        os.makedirs(os.path.join(self.root, 'a'))
+        os.makedirs(os.path.join(self.root, 'b'))
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_deduplicated(self):
+        first = self.write('a/1.in', b'1 2\n')
+        second = self.write('b/1.in', b'1 2\n')
+        other = self.write('b/2.in', b'3 4\n')
+
+        digest = self.store.add(first)
+        self.assertEqual(digest, hash_file(first))
+        self.assertEqual(self.store.add(second), digest)
+        self.store.add(other)
+
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertTrue(os.path.samefile(first, self.store.path(digest)))
+        self.assertFalse(os.path.samefile(first, other))
+        self.assertEqual(os.stat(first).st_nlink, 3)
+        with open(second, 'rb') as f:
+            self.assertEqual(f.read(), b'1 2\n')
+
+    def require_xattrs(self, path):
+        try:
+            os.setxattr(path, 'user.dmoj.test', b'')
+        except OSError:
+            self.skipTest('filesystem does not support extended attributes')
+
+    def test_digest(self):
+        path = self.write('a/1.in', b'1 2\n')
+        self.require_xattrs(path)
+        digest = self.store.add(path)
+        self.assertEqual(file_digest(path), digest)
+        self.assertEqual(find_blob_store(os.path.join(self.root, 'a')).root, self.store.root)
+        self.assertIsNone(find_blob_store(tempfile.gettempdir()))
+
+    def test_derived(self):
+        digest = self.store.add(self.write('a/1.in', b'1 2\r\n'))
+        self.assertIsNone(self.store.derived(digest, 'normalized'))
+        derived = self.store.add_derived(digest, 'normalized', self.write('normalized', b'1 2\n'))
+        self.assertEqual(self.store.derived(digest, 'normalized'), derived)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'normalized')))
+        with open(derived, 'rb') as f:
+            self.assertEqual(f.read(), b'1 2\n')
+
+    def test_collect(self):
+        used = self.write('a/1.in', b'1 2\n')
+        unused = self.write('b/1.in', b'3 4\n')
+        used_digest = self.store.add(used)
+        unused_digest = self.store.add(unused)
+        self.store.add_derived(used_digest, 'normalized', self.write('used', b'12\n'))
+        self.store.add_derived(unused_digest, 'normalized', self.write('unused', b'34\n'))
+        os.unlink(unused)
+
+        # Recently unlinked blobs are left alone.
+        self.assertEqual(self.store.collect(), (0, 0))
+
+        with mock.patch('dmoj.blob_store.GRACE_PERIOD', -60):
+            # The unused blob, and its normalized form along with it.
+            self.assertEqual(self.store.collect(), (2, 7))
+            self.assertEqual(self.store.collect(), (0, 0))
+        self.assertTrue(os.path.exists(self.store.path(used_digest)))
+        self.assertIsNotNone(self.store.derived(used_digest, 'normalized'))
+        self.assertFalse(os.path.exists(self.store.path(unused_digest)))
+        self.assertIsNone(self.store.derived(unused_digest, 'normalized'))
+
+    def test_failed_normalization_cleaned_up(self):
+        path = self.write('a/1.in', b'1 2\r\n')
+        self.require_xattrs(path)
+        self.store.add(path)
+        with mock.patch('dmoj.problem.normalized_file_copy', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                ProblemDataManager(os.path.join(self.root, 'a')).as_fd('1.in', normalize=True)
+        self.assertEqual([entry.name for entry in os.scandir(self.store.root) if not entry.is_dir()], [])
@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+from dmoj.case_generation import CaseGenerationPool
+
+
+class FakeCase:
+    def __init__(self, name, generated=True, block=False):
+        self.name = name
+        self.generated = generated
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.cpu_affinity = None
+        self.ran = threading.Event()
+        self.aborted = False
+
+    def uses_generator(self):
+        return self.generated
+
+    def generate(self, cpu_affinity=None):
+        self.cpu_affinity = cpu_affinity
+        self.started.set()
+        self.release.wait(5)
+        if self.aborted:
+            raise RuntimeError('generator killed')
+        self.ran.set()
+
+    def abort_generation(self):
+        self.aborted = True
+        self.release.set()
+
+    def __repr__(self):
+        return self.name
+
+
+class CaseGenerationPoolTest(unittest.TestCase):
+    def make_pool(self, cases, concurrency=1, lookahead=2):
+        pool = CaseGenerationPool(cases, [3], concurrency, lookahead)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_generates_ahead(self):
+        cases = [FakeCase('1'), FakeCase('2'), FakeCase('3', generated=False)]
+        self.make_pool(cases)
+        self.assertTrue(cases[0].ran.wait(5))
+        self.assertTrue(cases[1].ran.wait(5))
+        self.assertFalse(cases[2].started.is_set())
+        self.assertEqual(cases[0].cpu_affinity, [3])
+
+    def test_lookahead_bounded(self):
+        cases = [FakeCase(str(i)) for i in range(4)]
+        pool = self.make_pool(cases)
+        self.assertTrue(cases[1].started.wait(5))
+        self.assertFalse(cases[2].started.is_set())
+
+        pool.done(cases[0])
+        self.assertTrue(cases[2].started.wait(5))
+        self.assertFalse(cases[3].started.is_set())
+
+    def test_done_cancels(self):
+        cases = [FakeCase('1', block=True), FakeCase('2')]
+        pool = self.make_pool(cases)
+        self.assertTrue(cases[0].started.wait(5))
+
+        # The running generator is killed, and the queued one never starts.
+        pool.done(cases[1])
+        pool.done(cases[0])
+        self.assertTrue(cases[0].aborted)
+        pool.close()
+        self.assertFalse(cases[0].ran.is_set())
+        self.assertFalse(cases[1].started.is_set())
+
+    def test_discard_all(self):
+        cases = [FakeCase('1', block=True), FakeCase('2'), FakeCase('3')]
+        pool = self.make_pool(cases)
+        self.assertTrue(cases[0].started.wait(5))
+        pool.discard_all()
+        pool.close()
+        self.assertTrue(cases[0].aborted)
+        self.assertFalse(any(case.started.is_set() for case in cases[1:]))
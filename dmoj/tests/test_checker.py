@@ -79,3 +79,93 @@ class CheckerTest(unittest.TestCase):
         assert is_pe(check(b'a \nb\nc', b'a\nb\nc', point_value=1.0))
         assert is_pe(check(b'a\nb\nc', b'a\nb\nc\n', point_value=1.0))
         assert is_pe(check(b'a\nb\nc', b'a\nb\nc\n', pe_allowed=False, point_value=1.0), feedback=None)
+
+
+class StreamingCheckerTest(unittest.TestCase):
+    CASES = [
+        (b'a', b'a'),
+        (b'a b', b'a  b'),
+        (b'a b   \n', b'a b'),
+        (b'\n\na b \n    ', b'a b'),
+        (b'a\r\n\r\nb\r\n', b'a\nb'),
+        (b'a\nb\nc', b'a \nb\nc'),
+        (b'a\nb\nc', b'a\nb\nc\n'),
+        (b'a\n\n\nb', b'a b'),
+        (b'', b''),
+        (b'', b'\n'),
+        (b'a', b'b'),
+        (b'ab', b'a b'),
+        (b'a b', b'a b b'),
+        (b'a bb', b'a b b'),
+        (b'a ' * 1000, b' a' * 1000),
+        (b'x' * 100 + b' y', b'x' * 99 + b'z y'),
+        (b'ab', b'aabab'),
+        (b'x' * 10, b'x' * 100 + b' y'),
+        (b'1 2 3 4 5 6 7 8 9 10 11 12', b'1 2 3 4 5 6 7 8 9 10 11 13'),
+    ]
+
+    def stream(self, module, process_output, judge_output, chunk_size, **kwargs):
+        stream = module.stream(judge_output, point_value=1.0, **kwargs)
+        for i in range(0, len(process_output), chunk_size):
+            if not stream.feed(process_output[i : i + chunk_size]):
+                break
+        return stream.finish()
+
+    def assert_same(self, module, **kwargs):
+        for judge_output, process_output in self.CASES:
+            for first, second in ((judge_output, process_output), (process_output, judge_output)):
+                expected = module.check(second, first, point_value=1.0, **kwargs)
+                for chunk_size in (1, 2, 3, 7, 1 << 20):
+                    with self.subTest(judge_output=first, process_output=second, chunk_size=chunk_size):
+                        check = self.stream(module, second, first, chunk_size, **kwargs)
+                        self.assertEqual(check_to_bool(check), check_to_bool(expected))
+                        if isinstance(expected, CheckerResult):
+                            self.assertEqual(check.feedback, expected.feedback)
+                            self.assertEqual(check.extended_feedback, expected.extended_feedback)
+
+    def test_standard(self):
+        from dmoj.checkers import standard
+
+        self.assert_same(standard)
+
+    def test_identical(self):
+        from dmoj.checkers import identical
+
+        self.assert_same(identical)
+        self.assert_same(identical, pe_allowed=False)
+
+    def test_rstripped(self):
+        from dmoj.checkers import rstripped
+
+        self.assert_same(rstripped)
+        self.assert_same(rstripped, filter_new_line=True)
+
+    def test_rejects_early(self):
+        from dmoj.checkers import identical, rstripped, standard
+
+        for module in (standard, identical, rstripped):
+            with self.subTest(module=module.__name__):
+                stream = module.stream(b'1\n2\n3\n', point_value=1.0)
+                self.assertTrue(stream.feed(b'1\n'))
+                self.assertFalse(stream.feed(b'4\n'))
+
+        # Output that goes on after the expected output has ended is wrong, however it ends.
+        stream = standard.stream(b'1 2', point_value=1.0)
+        self.assertTrue(stream.feed(b'1 2 '))
+        self.assertFalse(stream.feed(b'3'))
+        self.assertEqual(stream.finish().extended_feedback, "Participant's output contains extra tokens")
+
+    def test_long_token_reported_whole(self):
+        from dmoj.checkers import standard
+
+        stream = standard.stream(b'ab', point_value=1.0)
+        for data in (b'aa', b'bab'):
+            self.assertTrue(stream.feed(data))
+        self.assertEqual(stream.finish().extended_feedback, "1st token differs - expected: 'ab', found: 'aabab'")
+
+    def test_long_expected_output(self):
+        from dmoj.checkers import _streaming, standard
+
+        judge_output = b' '.join(b'%d' % i for i in range(3 * _streaming.JUDGE_BLOCK_SIZE))
+        self.assertTrue(self.stream(standard, judge_output, judge_output, 4096).passed)
+        self.assertFalse(self.stream(standard, judge_output[:-1], judge_output, 4096).passed)
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dmoj.config import ConfigNode
+from dmoj.generator_cache import GeneratorCache, generator_key
+from dmoj.judgeenv import env
+from dmoj.problem import ProblemDataManager, TestCase as ProblemTestCase
+
+
+class GeneratorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.cache = GeneratorCache(os.path.join(self.tempdir.name, 'cache'), 12)
+        self.input = os.path.join(self.tempdir.name, 'input')
+        with open(self.input, 'wb') as f:
+            f.write(b'1 2\n')
+        self.generator = os.path.join(self.tempdir.name, 'gen.py')
+        with open(self.generator, 'wb') as f:
+            f.write(b'print(1)\n')
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_add(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.add('a', self.input, b'3\n')
+        input_path, output_path = self.cache.get('a')
+        self.assertEqual(self.read(input_path), b'1 2\n')
+        self.assertEqual(self.read(output_path), b'3\n')
+        self.assertIsNone(self.cache.get('b'))
+
+        # Adding what is already there is harmless.
+        self.cache.add('a', self.input, b'3\n')
+        self.assertEqual(os.listdir(self.cache.root), ['a'])
+
+    def test_least_recently_used_deleted(self):
+        self.cache.add('a', self.input, b'3\n')
+        self.cache.add('b', self.input, b'3\n')
+        os.utime(self.cache.path('a'), (0, 0))
+        os.utime(self.cache.path('b'), (0, 1))
+        self.cache.get('a')
+
+        self.cache.add('c', self.input, b'3\n')
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_key(self):
+        key = generator_key([self.generator], [], ['1'], None, None)
+        self.assertEqual(key, generator_key([self.generator], [], ['1'], None, None))
+        for other in (
+            generator_key([self.generator], ['-O2'], ['1'], None, None),
+            generator_key([self.generator], [], ['1', '2'], None, None),
+            generator_key([self.generator], [], ['12'], None, None),
+            generator_key([self.generator], [], ['1'], 'PY3', None),
+            generator_key([self.generator], [], ['1'], None, b''),
+        ):
+            self.assertNotEqual(key, other)
+
+        with open(self.generator, 'ab') as f:
+            f.write(b'print(2)\n')
+        self.assertNotEqual(key, generator_key([self.generator], [], ['1'], None, None))
+
+
+class CachedGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = self.tempdir.name
+        with open(os.path.join(self.root, 'gen.py'), 'wb') as f:
+            f.write(b'print(1)\n')
+
+        for name, value in (
+            ('generator_cache_dir', os.path.join(self.root, 'cache')),
+            ('generator_cache_size', 1024),
+        ):
+            self.addCleanup(env.__setitem__, name, env[name])
+            env[name] = value
+
+        self.launches = 0
+        patches = (
+            mock.patch('dmoj.problem.compile_with_auxiliary_files', return_value=mock.Mock(launch=self.launch)),
+            mock.patch('dmoj.problem.parse_helper_file_error'),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def launch(self, *args, stdout, **kwargs):
+        self.launches += 1
+        stdout.write(b'%s\n' % ' '.join(args).encode())
+        return mock.Mock(unsafe_communicate=mock.Mock(return_value=(None, b'answer\r\n')))
+
+    def generate(self, **config):
+        problem = mock.Mock(root_dir=self.root, storage_namespace=None, problem_data=ProblemDataManager(self.root))
+        case = ProblemTestCase(0, 0, ConfigNode(dict(config, generator='gen.py', points=1)), problem)
+        self.addCleanup(case.free_data)
+        return case.input_data(), case.output_data()
+
+    def test_cached(self):
+        self.assertEqual(self.generate(generator_args=[1, 2]), (b'1 2\n', b'answer\n'))
+        self.assertEqual(self.generate(generator_args=[1, 2]), (b'1 2\n', b'answer\n'))
+        self.assertEqual(self.launches, 1)
+
+        self.assertEqual(self.generate(generator_args=[3]), (b'3\n', b'answer\n'))
+        self.assertEqual(self.launches, 2)
+
+    def test_opt_out(self):
+        self.generate(generator_cache=False)
+        self.generate(generator_cache=False)
+        self.assertEqual(self.launches, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'cache')))
+
+    def test_cache_dir_must_be_private(self):
+        cache_dir = os.path.join(self.root, 'cache')
+        os.mkdir(cache_dir)
+        os.chmod(cache_dir, 0o777)
+        self.assertEqual(self.generate(), (b'\n', b'answer\n'))
+        self.assertEqual(self.generate(), (b'\n', b'answer\n'))
+        self.assertEqual(self.launches, 2)
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_disabled(self):
+        env['generator_cache_size'] = 0
+        self.generate()
+        self.generate()
+        self.assertEqual(self.launches, 2)
@@ -0,0 +1,144 @@
+import os
+import queue
+import threading
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from dmoj.error import InternalError
+from dmoj.judge import IPC, Judge, JudgeWorker, JudgeWorkerPool, Submission, partition_cpu_affinity, spare_cpu_affinity
+from dmoj.judgeenv import env
+
+
+class PartitionCpuAffinityTest(unittest.TestCase):
+    def test_no_cpus(self):
+        self.assertEqual(partition_cpu_affinity([], 3), [None, None, None])
+
+    def test_single_slot(self):
+        self.assertEqual(partition_cpu_affinity([0, 1, 2, 3], 1), [[0, 1, 2, 3]])
+
+    def test_even_split(self):
+        self.assertEqual(partition_cpu_affinity([0, 1, 2, 3], 2), [[0, 1], [2, 3]])
+
+    def test_uneven_split(self):
+        self.assertEqual(partition_cpu_affinity([0, 1, 2, 3, 4], 3), [[0, 1], [2, 3], [4]])
+
+    def test_more_slots_than_cpus(self):
+        self.assertEqual(partition_cpu_affinity([4, 5], 3), [[4], [5], [4]])
+
+
+@unittest.skipUnless(hasattr(os, 'sched_getaffinity'), 'needs sched_getaffinity')
+class SpareCpuAffinityTest(unittest.TestCase):
+    def test_unpinned(self):
+        self.assertEqual(spare_cpu_affinity([]), [])
+
+    def test_spare(self):
+        with mock.patch('os.sched_getaffinity', return_value={0, 1, 2, 3}):
+            self.assertEqual(spare_cpu_affinity([0, 2]), [1, 3])
+            self.assertEqual(spare_cpu_affinity([0, 1, 2, 3]), [])
+
+
+class JudgeWorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = JudgeWorkerPool(size=1, max_submissions=2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_reuses_process(self):
+        process = self.pool.acquire()
+        self.pool.release(process, reusable=True)
+        self.assertIs(self.pool.acquire(), process)
+        self.assertGreater(self.pool.spawn_time_saved, 0)
+
+    def test_recycles_after_max_submissions(self):
+        process = self.pool.acquire()
+        self.pool.release(process, reusable=True)
+        self.assertIs(self.pool.acquire(), process)
+        self.pool.release(process, reusable=True)
+        self.assertFalse(process.is_alive())
+
+    def test_never_reuses_unclean_process(self):
+        process = self.pool.acquire()
+        self.pool.release(process, reusable=False)
+        self.assertFalse(process.is_alive())
+        self.assertIsNot(self.pool.acquire(), process)
+
+    def test_recycle_idle(self):
+        process = self.pool.acquire()
+        self.pool.release(process, reusable=True)
+        self.pool.recycle_idle()
+        self.assertFalse(process.is_alive())
+        self.assertIsNot(self.pool.acquire(), process)
+
+
+class PrefetchCaseInputsTest(unittest.TestCase):
+    class FakeCase:
+        def __init__(self, fail=False):
+            self.fail = fail
+            self.prefetched = False
+
+        def input_data_io(self):
+            if self.fail:
+                raise InternalError('generator failed')
+            self.prefetched = True
+
+    def setUp(self):
+        self.worker = JudgeWorker(Submission(1, 'aplusb', None, 'PY3', '', 1, 65536, False, {}))
+        self.cases = [self.FakeCase() for _ in range(4)]
+        self.flattened_cases = [(None, case) for case in self.cases]
+        self.old_case_prefetch = env.case_prefetch
+        env['case_prefetch'] = 3
+
+    def tearDown(self):
+        env['case_prefetch'] = self.old_case_prefetch
+
+    def test_prefetches_while_compiling(self):
+        self.worker._prefetch_case_inputs(self.flattened_cases, Future())
+        self.assertEqual([case.prefetched for case in self.cases], [True, True, True, False])
+
+    def test_only_first_case_once_compiled(self):
+        compiled = Future()
+        compiled.set_result(None)
+        self.worker._prefetch_case_inputs(self.flattened_cases, compiled)
+        self.assertEqual([case.prefetched for case in self.cases], [True, False, False, False])
+
+    def test_failure_left_to_grading(self):
+        self.cases[1].fail = True
+        self.worker._prefetch_case_inputs(self.flattened_cases, Future())
+        self.assertEqual([case.prefetched for case in self.cases], [True, False, False, False])
+
+
+class KeepAliveTest(unittest.TestCase):
+    def setUp(self):
+        self.worker = JudgeWorker(Submission(1, 'aplusb', None, 'PY3', '', 1, 65536, False, {}))
+
+    def test_keep_alive_until_done(self):
+        done = threading.Event()
+        with mock.patch('dmoj.judge.IPC_KEEPALIVE_INTERVAL', 0.01):
+            messages = self.worker._keep_alive_until(done.wait, 5)
+            self.assertEqual(next(messages), (IPC.KEEPALIVE, ()))
+            done.set()
+            self.assertTrue(all(message == (IPC.KEEPALIVE, ()) for message in messages))
+
+    def test_keep_alive_not_passed_on(self):
+        self.worker.result_ring = None
+        self.worker.worker_process_conn = mock.Mock()
+        self.worker.worker_process_conn.recv.side_effect = [(IPC.KEEPALIVE, ()), (IPC.HELLO, ()), (IPC.BYE, ())]
+        self.assertEqual(list(self.worker.communicate()), [(IPC.HELLO, ())])
+
+
+class CacheProblemTest(unittest.TestCase):
+    def test_cached_once_slot_free(self):
+        judge = Judge.__new__(Judge)
+        judge._worker_pool = mock.Mock(size=1)
+        judge._free_slots = queue.Queue()
+        judge._judge_workers_lock = threading.Lock()
+        submission = Submission(1, 'aplusb', None, 'PY3', '', 1, 65536, False, {})
+        worker = mock.Mock(submission=submission, communicate=mock.Mock(return_value=iter(())))
+        judge.judge_workers = {submission.id: worker}
+
+        free_slots = []
+        judge._cache_problem = lambda _submission: free_slots.append(judge._free_slots.qsize())
+        judge._grading_thread_main(worker, 0, threading.Event(), mock.Mock())
+        self.assertEqual(free_slots, [1])
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dmoj import judgeenv
+from dmoj.judgeenv import (
+    StorageNamespaceCache,
+    get_problem_root,
+    get_supported_problems_and_mtimes,
+    reconcile_supported_problems,
+    scan_problem_dirs,
+    update_supported_problems,
+)
+
+
+class UpdateSupportedProblemsTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = self.tempdir.name
+        patches = [
+            mock.patch.object(judgeenv, 'problem_globs', [os.path.join(self.root, '*')]),
+            mock.patch.dict(judgeenv._storage_namespace_cache, {None: StorageNamespaceCache()}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.tempdir.cleanup)
+
+        self.make_problem('aplusb')
+        self.make_problem('helloworld')
+        get_supported_problems_and_mtimes()
+
+    def make_problem(self, problem):
+        os.makedirs(os.path.join(self.root, problem), exist_ok=True)
+        with open(os.path.join(self.root, problem, 'init.yml'), 'w') as f:
+            f.write('test_cases: []\n')
+        return os.path.join(self.root, problem, 'init.yml')
+
+    def problems(self):
+        return sorted(problem for problem, _ in get_supported_problems_and_mtimes())
+
+    def test_added(self):
+        path = self.make_problem('new')
+        updated, removed = update_supported_problems([path, os.path.join(self.root, 'aplusb', 'irrelevant.txt')])
+        self.assertEqual([problem for problem, _ in updated], ['new'])
+        self.assertEqual(removed, [])
+        self.assertEqual(self.problems(), ['aplusb', 'helloworld', 'new'])
+
+    def test_removed(self):
+        path = os.path.join(self.root, 'aplusb', 'init.yml')
+        os.unlink(path)
+        self.assertEqual(update_supported_problems([path]), ([], ['aplusb']))
+        self.assertEqual(self.problems(), ['helloworld'])
+
+    def test_removed_without_rescan(self):
+        # A duplicate, ignored in favour of the problem in the earlier root.
+        other = os.path.join(self.root, 'other')
+        self.make_problem(os.path.join('other', 'aplusb'))
+        with mock.patch.object(judgeenv, 'problem_globs', [os.path.join(self.root, '*'), os.path.join(other, '*')]):
+            get_supported_problems_and_mtimes(force_update=True)
+            with mock.patch('glob.iglob', side_effect=AssertionError('rescanned')):
+                path = os.path.join(self.root, 'aplusb', 'init.yml')
+                os.unlink(path)
+                updated, removed = update_supported_problems([path])
+                self.assertEqual(([problem for problem, _ in updated], removed), (['aplusb'], []))
+                self.assertEqual(get_problem_root('aplusb'), os.path.join(other, 'aplusb'))
+
+                path = os.path.join(other, 'aplusb', 'init.yml')
+                os.unlink(path)
+                self.assertEqual(update_supported_problems([path]), ([], ['aplusb']))
+                self.assertEqual(self.problems(), ['helloworld'])
+
+    def test_duplicate_in_earlier_root(self):
+        first, second = os.path.join(self.root, 'first'), os.path.join(self.root, 'second')
+        self.make_problem(os.path.join('second', 'dup'))
+        self.make_problem(os.path.join('first', 'kept'))
+        with mock.patch.object(judgeenv, 'problem_globs', [os.path.join(first, '*'), os.path.join(second, '*')]):
+            get_supported_problems_and_mtimes(force_update=True)
+            self.assertEqual(get_problem_root('dup'), os.path.join(second, 'dup'))
+
+            # Takes over from the copy in the later root, as a full scan would.
+            path = self.make_problem(os.path.join('first', 'dup'))
+            updated, removed = update_supported_problems([path])
+            self.assertEqual(([problem for problem, _ in updated], removed), (['dup'], []))
+            self.assertEqual(get_problem_root('dup'), os.path.join(first, 'dup'))
+
+            # Whereas one in a later root is ignored.
+            path = self.make_problem(os.path.join('second', 'kept'))
+            self.assertEqual(update_supported_problems([path]), ([], []))
+            self.assertEqual(get_problem_root('kept'), os.path.join(first, 'kept'))
+
+            self.assertEqual(
+                judgeenv._storage_namespace_cache[None].problem_dirs_cache, scan_problem_dirs().problem_dirs
+            )
+
+    def test_changed(self):
+        os.utime(os.path.join(self.root, 'helloworld'), (0, 0))
+        updated, removed = update_supported_problems([os.path.join(self.root, 'helloworld', '1.in')])
+        self.assertEqual((updated, removed), ([('helloworld', 0)], []))
+
+    def test_unchanged(self):
+        self.assertEqual(update_supported_problems([os.path.join(self.root, 'nothing-here')]), ([], []))
+
+    def test_full_rescan(self):
+        self.make_problem('new')
+        updated, removed = update_supported_problems()
+        self.assertEqual([problem for problem, _ in updated], ['new'])
+
+    def test_hidden_ignored(self):
+        # e.g. a new version of a problem being synced, which is only a problem once it's swapped in.
+        path = self.make_problem(os.path.join('.versions', 'aplusb', 'v1'))
+        self.assertEqual(update_supported_problems([path, os.path.dirname(os.path.dirname(path))]), ([], []))
+        self.assertEqual(self.problems(), ['aplusb', 'helloworld'])
+
+    def test_remote_problems(self):
+        judgeenv.set_remote_problems({'aplusb': 1.0, 'remote': 2.0})
+        self.assertEqual(update_supported_problems(), ([('aplusb', 1.0), ('remote', 2.0)], []))
+        self.assertEqual(self.problems(), ['aplusb', 'helloworld', 'remote'])
+
+        # Fetching a problem from storage doesn't change it.
+        path = self.make_problem('remote')
+        self.assertEqual(update_supported_problems([path]), ([], []))
+
+        # Gone from storage, but still here.
+        judgeenv.set_remote_problems({'aplusb': 1.0})
+        updated, removed = update_supported_problems([path])
+        self.assertEqual(([problem for problem, _ in updated], removed), (['remote'], []))
+        os.unlink(path)
+        self.assertEqual(update_supported_problems([path]), ([], ['remote']))
+
+    def test_problem_root_from_index(self):
+        with mock.patch.object(judgeenv, 'get_problem_roots', return_value=[]):
+            self.assertEqual(get_problem_root('aplusb'), os.path.join(self.root, 'aplusb'))
+            self.assertIsNone(get_problem_root('missing'))
+
+        # Found the slow way if the index doesn't know about it yet.
+        self.make_problem('new')
+        self.assertEqual(get_problem_root('new'), os.path.join(self.root, 'new'))
+
+    def test_reconcile(self):
+        # Missed by the monitor.
+        os.unlink(os.path.join(self.root, 'helloworld', 'init.yml'))
+        self.make_problem('missed')
+        scan = scan_problem_dirs()
+
+        # Changed while the scan was being made.
+        path = self.make_problem('late')
+        updated, removed = reconcile_supported_problems(scan, [path])
+        self.assertEqual(sorted(problem for problem, _ in updated), ['late', 'missed'])
+        self.assertEqual(removed, ['helloworld'])
+        self.assertEqual(self.problems(), ['aplusb', 'late', 'missed'])
+
+        self.assertEqual(reconcile_supported_problems(scan_problem_dirs()), ([], []))
@@ -1,7 +1,11 @@
+import os
+import tempfile
 import unittest
 from io import BytesIO
+from unittest import mock
 
-from dmoj.utils.normalize import normalized_file_copy
+from dmoj.utils import normalize as normalize_module
+from dmoj.utils.normalize import normalize, normalized_file_copy
 
 TEST_CASE = b'a\r\n\r\r\nb\r\r\nc\nd\n'
 TEST_CASE_NO_NEWLINE = b'a\r\n\r\r\nb\r\r\nc\nd'
@@ -54,3 +58,37 @@ class TestNormalizedCopy(unittest.TestCase):
         with BytesIO(TEST_CASE_TRAILING_R) as src, BytesIO() as dst:
             normalized_file_copy(src, dst, block_size=len(TEST_CASE_TRAILING_R))
             self.assertEqual(dst.getvalue(), RESULT)
+
+    def test_normalize(self):
+        for data in (TEST_CASE, TEST_CASE_NO_NEWLINE, TEST_CASE_TRAILING_R):
+            self.assertEqual(normalize(data), RESULT)
+        self.assertEqual(normalize(b''), b'')
+        self.assertEqual(normalize(b'\r'), b'\n')
+
+    def test_file_descriptors(self):
+        with tempfile.TemporaryFile() as src, tempfile.TemporaryFile() as dst:
+            src.write(TEST_CASE * 9999 + TEST_CASE_NO_NEWLINE)
+            src.seek(0)
+            with open(os.dup(src.fileno()), 'rb') as src_file, open(
+                os.dup(dst.fileno()), 'wb', buffering=0
+            ) as dst_file:
+                normalized_file_copy(src_file, dst_file, block_size=7)
+            dst.seek(0)
+            self.assertEqual(dst.read(), RESULT * 10000)
+
+    def test_empty(self):
+        with BytesIO() as src, BytesIO() as dst:
+            normalized_file_copy(src, dst)
+            self.assertEqual(dst.getvalue(), b'')
+
+
+class TestPythonNormalizedCopy(TestNormalizedCopy):
+    def setUp(self):
+        patch = mock.patch.multiple(normalize_module, Normalizer=None, native_normalize=None, normalize_fd=None)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+
+@unittest.skipIf(normalize_module.Normalizer is None, 'native normalizer not built')
+class TestNativeNormalizedCopy(TestNormalizedCopy):
+    pass
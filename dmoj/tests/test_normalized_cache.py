@@ -0,0 +1,90 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+
+from dmoj.cptbox.utils import SharedFileIO
+from dmoj.judgeenv import env
+from dmoj.normalized_cache import NormalizedCache
+from dmoj.problem import ProblemDataManager
+
+
+class NormalizedCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.cache = NormalizedCache(os.path.join(self.tempdir.name, 'cache'), 12)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_add(self):
+        self.assertIsNone(self.cache.get('a'))
+        path = self.cache.add('a', io.BytesIO(b'1 2\r\n3'))
+        self.assertEqual(self.read(path), b'1 2\n3\n')
+        self.assertEqual(self.cache.get('a'), path)
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_least_recently_used_deleted(self):
+        first = self.cache.add('a', io.BytesIO(b'12345'))
+        second = self.cache.add('b', io.BytesIO(b'12345'))
+        os.utime(first, (0, 0))
+        os.utime(second, (0, 1))
+        self.cache.get('a')
+
+        self.cache.add('c', io.BytesIO(b'12345'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+class SharedNormalizedDataTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = self.tempdir.name
+        with open(os.path.join(self.root, '1.in'), 'wb') as f:
+            f.write(b'1 2\r\n')
+        with zipfile.ZipFile(os.path.join(self.root, 'tests.zip'), 'w') as archive:
+            archive.writestr('2.in', b'3 4\r5', zipfile.ZIP_DEFLATED)
+
+        for name, value in (
+            ('normalized_cache_dir', os.path.join(self.root, 'cache')),
+            ('normalized_cache_size', 1024),
+        ):
+            self.addCleanup(env.__setitem__, name, env[name])
+            env[name] = value
+
+    def as_fd(self, key):
+        problem_data = ProblemDataManager(self.root)
+        problem_data.archive = zipfile.ZipFile(os.path.join(self.root, 'tests.zip'))
+        self.addCleanup(problem_data.archive.close)
+        data = problem_data.as_fd(key, normalize=True)
+        self.addCleanup(data.close)
+        return data
+
+    @unittest.skipUnless(SharedFileIO.usable_with_name(), 'needs /proc')
+    def test_shared(self):
+        for key, expected in (('1.in', b'1 2\n'), ('2.in', b'3 4\n5\n')):
+            first, second = self.as_fd(key), self.as_fd(key)
+            self.assertIsInstance(second, SharedFileIO)
+            self.assertEqual(second.to_bytes(), expected)
+            self.assertTrue(os.path.samefile(first.to_path(), second.to_path()))
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'cache'))), 2)
+
+    def test_cache_dir_must_be_private(self):
+        cache_dir = os.path.join(self.root, 'cache')
+        os.mkdir(cache_dir)
+        os.chmod(cache_dir, 0o777)
+        data = self.as_fd('1.in')
+        self.assertNotIsInstance(data, SharedFileIO)
+        self.assertEqual(data.to_bytes(), b'1 2\n')
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_raw_data_not_shared(self):
+        data = ProblemDataManager(self.root).as_fd('1.in')
+        self.addCleanup(data.close)
+        self.assertEqual(data.to_bytes(), b'1 2\r\n')
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'cache')))
@@ -0,0 +1,186 @@
+import io
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from dmoj.packet import PacketManager
+from dmoj.packet_codec import PacketCodec
+from dmoj.result import Result
+
+
+class RecordingPacketManager(PacketManager):
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        self.sent_event = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _do_reconnect(self):
+        pass
+
+    def _send_packet(self, packet):
+        self.sent.append(packet)
+        self.sent_event.set()
+
+
+class TestCaseBatchingTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = RecordingPacketManager('localhost', 0, None, 'judge', 'key')
+        self.manager.testcase_batch_idle_time = 10
+        self.manager.testcase_batch_delay = 10
+        # As if a result was just sent, so new results don't go out right away.
+        self.manager._last_testcase_time = time.monotonic()
+        self.case = SimpleNamespace(points=1, output_prefix_length=0)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def statuses(self):
+        return [
+            (packet['submission-id'], [case['position'] for case in packet['cases']])
+            for packet in self.manager.sent
+            if packet['name'] == 'test-case-status'
+        ]
+
+    def test_first_result_after_idle_sent_immediately(self):
+        self.manager.testcase_batch_idle_time = 0
+        self.manager.test_case_status_packet(1, 1, Result(self.case))
+        self.assertEqual(self.statuses(), [(1, [1])])
+
+    def test_burst_coalesced_until_boundary(self):
+        for position in range(1, 4):
+            self.manager.test_case_status_packet(1, position, Result(self.case))
+        self.assertEqual(self.statuses(), [])
+        self.manager.batch_end_packet(1)
+        self.assertEqual(self.statuses(), [(1, [1, 2, 3])])
+        self.assertEqual((self.manager.testcase_packets_sent, self.manager.testcases_sent), (1, 3))
+
+    def test_count_cap(self):
+        self.manager.testcase_batch_max_cases = 2
+        for position in range(1, 4):
+            self.manager.test_case_status_packet(1, position, Result(self.case))
+        self.assertEqual(self.statuses(), [(1, [1, 2])])
+
+    def test_byte_cap(self):
+        self.manager.testcase_batch_max_bytes = 1000
+        self.manager.test_case_status_packet(1, 1, Result(self.case))
+        self.manager.test_case_status_packet(1, 2, Result(self.case, feedback='x' * 1000))
+        self.assertEqual(self.statuses(), [(1, [1, 2])])
+
+    def test_deadline(self):
+        self.manager.testcase_batch_delay = 0.05
+        thread = threading.Thread(target=self.manager._flush_testcase_queue_forever)
+        thread.start()
+        try:
+            start = time.monotonic()
+            self.manager.test_case_status_packet(1, 1, Result(self.case))
+            self.manager.test_case_status_packet(1, 2, Result(self.case))
+            self.assertTrue(self.manager.sent_event.wait(5))
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+            self.assertEqual(self.statuses(), [(1, [1, 2])])
+        finally:
+            self.manager.close()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+class FakeJudge:
+    def __init__(self):
+        self.aborted = threading.Event()
+        self.aborted_ids = []
+
+    def abort_grading(self, submission_id=None):
+        self.aborted_ids.append(submission_id)
+        self.aborted.set()
+
+
+class PacketJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.judge = FakeJudge()
+        self.manager = RecordingPacketManager('localhost', 0, self.judge, 'judge', 'key')
+        self.written = []
+        # Stand in for a connection: journal packets as `PacketManager._send_packet` does.
+        self.manager._send_packet = self.send
+
+    def send(self, packet):
+        serialized = self.manager._serialize_packet(packet)
+        self.manager._journal.written(serialized)
+        self.written.append(serialized.packet)
+
+    def grade(self, submission_id):
+        self.manager._journal.open(submission_id)
+        self.manager.submission_acknowledged_packet(submission_id)
+        self.manager.begin_grading_packet(submission_id, False)
+        self.manager.batch_begin_packet(submission_id)
+        self.manager.batch_end_packet(submission_id)
+
+    def test_replay_after_received(self):
+        self.grade(1)
+        self.assertEqual([packet['sequence'] for packet in self.written], [0, 1, 2, 3])
+        self.assertEqual(self.manager._handshake_packet([], {}, 'judge', 'key')['grading-submissions'], [1])
+
+        replay = self.manager._resume_submissions({'name': 'handshake-success', 'resume': {'1': 1}})
+        self.assertEqual([serialized.packet['name'] for serialized in replay], ['batch-begin', 'batch-end'])
+
+        self.manager._journal.acknowledge(1, 2)
+        replay = self.manager._resume_submissions({'name': 'handshake-success', 'resume': {'1': -1}})
+        self.assertEqual([serialized.packet['name'] for serialized in replay], ['batch-end'])
+
+    def test_journal_closed_by_final_packet(self):
+        self.grade(1)
+        self.manager.grading_end_packet(1)
+        self.assertEqual(self.manager._journal.submission_ids(), [])
+        self.manager.ping_packet(0)
+        self.assertNotIn('sequence', self.written[-1])
+
+    def test_replayed_final_packet_closes_journal(self):
+        self.grade(1)
+        # Lost with the connection.
+        self.manager._journal.written(
+            self.manager._serialize_packet({'name': 'grading-end', 'submission-id': 1}), False
+        )
+        self.assertEqual(self.manager._journal.submission_ids(), [1])
+
+        codec = PacketCodec()
+        self.manager.input = io.BytesIO(codec.frame(codec.serialize({'name': 'handshake-success', 'resume': {'1': 3}})))
+        self.manager.conn = mock.Mock()
+        self.manager.handshake([], {}, 'judge', 'key')
+        self.assertEqual(self.manager.conn.sendall.call_count, 1)
+        self.assertEqual(self.manager._journal.submission_ids(), [])
+
+    def test_unknown_submission_aborted(self):
+        self.grade(1)
+        self.assertEqual(self.manager._resume_submissions({'name': 'handshake-success'}), [])
+        self.assertTrue(self.judge.aborted.wait(5))
+        self.assertEqual(self.judge.aborted_ids, [1])
+        self.assertEqual(self.manager._journal.submission_ids(), [])
+
+
+class SupportedProblemsTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = RecordingPacketManager('localhost', 0, None, 'judge', 'key')
+
+    def test_full_list_without_diffs(self):
+        with mock.patch('dmoj.packet.get_supported_problems_and_mtimes', return_value=[('aplusb', 1.0)]):
+            self.manager.supported_problems_diff_packet([('aplusb', 1.0)], [])
+        self.assertEqual(
+            self.manager.sent, [{'name': 'supported-problems', 'problems': [('aplusb', 1.0)], 'version': 1}]
+        )
+
+    def test_diffs(self):
+        self.manager._problem_diffs = True
+        version = self.manager._handshake_packet([], {}, 'judge', 'key')['problems-version']
+        self.manager.supported_problems_diff_packet([('aplusb', 2.0)], ['helloworld'])
+        self.assertEqual(
+            self.manager.sent,
+            [
+                {
+                    'name': 'supported-problems-diff',
+                    'base-version': version,
+                    'version': version + 1,
+                    'updated': [('aplusb', 2.0)],
+                    'removed': ['helloworld'],
+                }
+            ],
+        )
@@ -0,0 +1,65 @@
+import json
+import unittest
+import zlib
+
+from dmoj.packet_codec import (
+    CODEC_JSON,
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZLIB_STREAM,
+    NegotiatedPacketCodec,
+    PacketCodec,
+    SIZE_PACK,
+    available_codecs,
+    negotiate,
+)
+
+
+def payload(data):
+    (size,) = SIZE_PACK.unpack(data[: SIZE_PACK.size])
+    assert size == len(data) - SIZE_PACK.size
+    return data[SIZE_PACK.size :]
+
+
+class PacketCodecTest(unittest.TestCase):
+    packet = {'name': 'test-case-status', 'submission-id': 1, 'cases': [{'feedback': 'ok' * 200}]}
+
+    def test_legacy_framing(self):
+        codec = PacketCodec()
+        data = payload(codec.frame(codec.serialize(self.packet)))
+        self.assertEqual(json.loads(zlib.decompress(data)), self.packet)
+        self.assertEqual(codec.decode(data), self.packet)
+
+    def test_no_protocol_keeps_legacy(self):
+        self.assertIs(type(negotiate(None)), PacketCodec)
+        with self.assertRaises(ValueError):
+            negotiate({'codec': 'pickle', 'compression': 'zlib'})
+
+    def test_small_packets_uncompressed(self):
+        codec = NegotiatedPacketCodec(CODEC_JSON, COMPRESSION_ZLIB, threshold=256)
+        data = payload(codec.frame(codec.serialize({'name': 'ping-response'})))
+        self.assertEqual(data[0], CODEC_JSON << 4 | COMPRESSION_NONE)
+        self.assertEqual(codec.decode(data), {'name': 'ping-response'})
+
+        data = payload(codec.frame(codec.serialize(self.packet)))
+        self.assertEqual(data[0], CODEC_JSON << 4 | COMPRESSION_ZLIB)
+        self.assertEqual(codec.decode(data), self.packet)
+
+    def test_stream_compression(self):
+        sender = negotiate({'codec': available_codecs()[0], 'compression': 'zlib-stream'}, threshold=0)
+        receiver = negotiate({'codec': available_codecs()[0], 'compression': 'zlib-stream'})
+        sizes = []
+        for i in range(3):
+            packet = dict(self.packet, **{'submission-id': i})
+            data = payload(sender.frame(sender.serialize(packet)))
+            self.assertEqual(data[0] & 0xF, COMPRESSION_ZLIB_STREAM)
+            self.assertEqual(receiver.decode(data), packet)
+            sizes.append(len(data))
+        # Later packets only pay for what differs from earlier ones.
+        self.assertLess(sizes[1], sizes[0] / 2)
+
+    def test_reframe_for_legacy_connection(self):
+        codec = negotiate({'codec': available_codecs()[0], 'compression': 'none'})
+        serialized = codec.serialize(self.packet)
+        legacy = PacketCodec()
+        self.assertEqual(legacy.decode(payload(legacy.frame(serialized))), self.packet)
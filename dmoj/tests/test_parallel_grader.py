@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+
+from dmoj.graders.parallel import ParallelCaseGrader
+from dmoj.result import Result
+
+
+class FakeCase:
+    def __init__(self, position, delay=0.0):
+        self.position = position
+        self.delay = delay
+        self.started = threading.Event()
+
+    def input_data_io(self):
+        pass
+
+
+class FakeGrader:
+    cpu_affinity = None
+    _current_proc = None
+
+    def __init__(self):
+        self._abort_requested = False
+        self.lock = threading.Lock()
+        self.affinities = {}
+        self.graded = []
+
+    def grade(self, case):
+        with self.lock:
+            self.affinities[case.position] = self.cpu_affinity
+        case.started.set()
+        deadline = time.monotonic() + case.delay
+        while time.monotonic() < deadline and not self._abort_requested:
+            time.sleep(0.001)
+        with self.lock:
+            self.graded.append(case.position)
+        return Result(case, result_flag=Result.TLE if self._abort_requested else Result.AC)
+
+    def abort_grading(self):
+        self._abort_requested = True
+
+
+class ParallelCaseGraderTest(unittest.TestCase):
+    def setUp(self):
+        self.grader = FakeGrader()
+        # Lanes are shallow copies, so they share the bookkeeping of the original grader.
+        self.parallel = ParallelCaseGrader(self.grader, [[0], [1]])
+
+    def tearDown(self):
+        self.parallel.close()
+
+    def test_results_in_order(self):
+        cases = [FakeCase(i, delay=0.02 * (5 - i)) for i in range(5)]
+        self.parallel.schedule(cases)
+        for case in cases:
+            self.assertIs(self.parallel.result(case).case, case)
+        self.assertEqual(sorted(self.grader.graded), list(range(5)))
+        self.assertEqual(set(map(tuple, self.grader.affinities.values())), {(0,), (1,)})
+
+    def test_discard_all_kills_running(self):
+        cases = [FakeCase(0), FakeCase(1, delay=10), FakeCase(2, delay=10), FakeCase(3)]
+        self.parallel.schedule(cases)
+        self.assertEqual(self.parallel.result(cases[0]).result_flag, Result.AC)
+        cases[1].started.wait(5)
+
+        start = time.monotonic()
+        self.parallel.discard_all()
+        self.parallel.close()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertNotIn(3, self.grader.graded)
+
+    def test_discard_single(self):
+        cases = [FakeCase(i) for i in range(3)]
+        self.parallel.schedule(cases)
+        self.parallel.discard(cases[1])
+        self.assertEqual(self.parallel.result(cases[0]).result_flag, Result.AC)
+        self.assertEqual(self.parallel.result(cases[2]).result_flag, Result.AC)
@@ -1,9 +1,16 @@
 import os
+import tempfile
+import time
 import unittest
+import zipfile
 from unittest import mock
 
+import yaml
+
 from dmoj.config import InvalidInitException
-from dmoj.problem import Problem, ProblemDataManager
+from dmoj.cptbox.utils import SharedFileIO
+from dmoj.judgeenv import env
+from dmoj.problem import Problem, ProblemDataManager, cache_problem, problem_cache
 
 
 class ProblemTest(unittest.TestCase):
@@ -113,3 +120,151 @@ class ProblemTest(unittest.TestCase):
 
     def tearDown(self):
         self.data_patch.stop()
+
+
+class ProblemCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = os.path.realpath(self.tempdir.name)
+        self.write_init('archive: tests.zip\n')
+        with zipfile.ZipFile(os.path.join(self.root, 'tests.zip'), 'w') as archive:
+            for name in ('1.in', '1.out', '2.in', '2.out'):
+                archive.writestr(name, name, zipfile.ZIP_DEFLATED)
+
+        root_patch = mock.patch('dmoj.problem.get_problem_root', return_value=self.root)
+        root_patch.start()
+        self.addCleanup(root_patch.stop)
+        self.addCleanup(problem_cache.invalidate)
+
+        old_manifest_dir = env.problem_manifest_dir
+        env['problem_manifest_dir'] = os.path.join(self.root, 'manifests')
+        self.addCleanup(env.__setitem__, 'problem_manifest_dir', old_manifest_dir)
+
+    def write_init(self, init):
+        path = os.path.join(self.root, 'init.yml')
+        with open(path, 'w') as f:
+            f.write(init)
+        # Make sure the change shows, however coarse the filesystem's timestamps are.
+        os.utime(path, ns=(0, time.time_ns() + 10**9))
+
+    def load(self):
+        # Archives opened from a manifest never read their central directory.
+        with mock.patch('dmoj.problem.yaml.safe_load', wraps=yaml.safe_load) as safe_load, mock.patch.object(
+            zipfile.ZipFile, '_RealGetContents', autospec=True, side_effect=zipfile.ZipFile._RealGetContents
+        ) as read_archive:
+            problem = Problem('test', 2, 16384, {})
+        return problem, safe_load.call_count + read_archive.call_count
+
+    def test_parsed_once(self):
+        first, parses = self.load()
+        self.assertEqual(parses, 2)
+        second, parses = self.load()
+        self.assertEqual(parses, 0)
+        self.assertEqual(second.config.test_cases.unwrap(), first.config.test_cases.unwrap())
+        self.assertEqual(len(second.config.test_cases), 2)
+
+        # Each submission gets its own config, which it may modify.
+        second.config['test_cases'] = []
+        self.assertEqual(len(self.load()[0].config.test_cases), 2)
+
+    def test_changed_init(self):
+        self.load()
+        self.write_init('archive: tests.zip\ntest_cases:\n- {in: 1.in, out: 1.out}\n')
+        problem, parses = self.load()
+        self.assertEqual(parses, 2)
+        self.assertEqual(len(problem.config.test_cases), 1)
+
+    def test_invalidate(self):
+        self.load()
+        problem_cache.invalidate([os.path.join(self.root, 'init.yml')])
+        self.assertEqual(self.load()[1], 2)
+
+    def test_manifest(self):
+        first, _ = self.load()
+        self.assertTrue(cache_problem('test'))
+        self.assertFalse(cache_problem('test'))
+
+        # As if the judge was restarted.
+        problem_cache.invalidate()
+        problem, parses = self.load()
+        self.assertEqual(parses, 0)
+        self.assertEqual(problem.config.test_cases.unwrap(), first.config.test_cases.unwrap())
+        self.assertEqual(problem.problem_data['2.out'], b'2.out')
+
+        problem_cache.invalidate()
+        self.write_init('archive: tests.zip\ntest_cases:\n- {in: 1.in, out: 1.out}\n')
+        problem, parses = self.load()
+        self.assertEqual(parses, 2)
+        self.assertEqual(len(problem.config.test_cases), 1)
+
+    def test_manifest_dir_must_be_private(self):
+        self.load()
+        self.assertTrue(cache_problem('test'))
+        # Anyone could have written what is in it.
+        os.chmod(os.path.join(self.root, 'manifests'), 0o777)
+        problem_cache.invalidate()
+        self.assertEqual(self.load()[1], 2)
+        self.assertFalse(cache_problem('test'))
+
+
+class ArchiveDataTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = os.path.realpath(self.tempdir.name)
+        with open(os.path.join(self.root, 'init.yml'), 'w') as f:
+            f.write('archive: tests.zip\n')
+        self.archive_path = os.path.join(self.root, 'tests.zip')
+        with zipfile.ZipFile(self.archive_path, 'w') as archive:
+            archive.writestr('1.in', b'1 2\r\n' * 1000, zipfile.ZIP_STORED)
+            archive.writestr('1.out', b'3\r\n', zipfile.ZIP_DEFLATED)
+
+        for name, value in (
+            ('problem_manifest_dir', os.path.join(self.root, 'manifests')),
+            ('normalized_cache_dir', os.path.join(self.root, 'cache')),
+            ('normalized_cache_size', 1 << 20),
+        ):
+            self.addCleanup(env.__setitem__, name, env[name])
+            env[name] = value
+
+        root_patch = mock.patch('dmoj.problem.get_problem_root', return_value=self.root)
+        root_patch.start()
+        self.addCleanup(root_patch.stop)
+        self.addCleanup(problem_cache.invalidate)
+
+    def problem_data(self):
+        problem_cache.invalidate()
+        return Problem('test', 2, 16384, {}).problem_data
+
+    def as_fd(self, key, normalize=False):
+        data = self.problem_data().as_fd(key, normalize=normalize)
+        self.addCleanup(data.close)
+        return data
+
+    def test_stored(self):
+        problem_data = self.problem_data()
+        self.assertEqual(problem_data['1.in'], b'1 2\r\n' * 1000)
+        with problem_data.open('1.in') as f:
+            self.assertEqual(f.read(3), b'1 2')
+            self.assertEqual(f.read(), b'\r\n' + b'1 2\r\n' * 999)
+        self.assertEqual(self.as_fd('1.in').to_bytes(), b'1 2\r\n' * 1000)
+        self.assertEqual(self.as_fd('1.in', normalize=True).to_bytes(), b'1 2\n' * 1000)
+
+    def test_deflated(self):
+        self.assertEqual(self.problem_data()['1.out'], b'3\r\n')
+        first, second = self.as_fd('1.out'), self.as_fd('1.out')
+        self.assertEqual(second.to_bytes(), b'3\r\n')
+        self.assertEqual(self.as_fd('1.out', normalize=True).to_bytes(), b'3\n')
+        if SharedFileIO.usable_with_name():
+            self.assertTrue(os.path.samefile(first.to_path(), second.to_path()))
+
+    def test_bad_crc(self):
+        with open(self.archive_path, 'r+b') as f:
+            data = f.read()
+            f.seek(data.index(b'1 2\r\n'))
+            f.write(b'4')
+        with self.assertRaises(zipfile.BadZipFile):
+            self.problem_data()['1.in']
+        with self.assertRaises(zipfile.BadZipFile):
+            self.as_fd('1.in')
@@ -0,0 +1,87 @@
+import unittest
+from types import SimpleNamespace
+
+from dmoj.result import Result
+from dmoj.utils.result_ring import PIPE_MESSAGE, ResultRing
+
+
+@unittest.skipUnless(ResultRing.is_supported(), 'eventfd is not available')
+class ResultRingTest(unittest.TestCase):
+    def setUp(self):
+        self.ring = ResultRing(size=4096)
+        self.case = SimpleNamespace(points=5, output_prefix_length=3)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def make_result(self, **kwargs):
+        kwargs.setdefault('result_flag', Result.WA)
+        return Result(self.case, **kwargs)
+
+    def test_round_trip(self):
+        result = self.make_result(
+            execution_time=0.5,
+            wall_clock_time=0.75,
+            max_memory=1024,
+            context_switches=(3, 4),
+            runtime_version='1.0',
+            proc_output=b'abc',
+            feedback='wrong \udc80',
+            extended_feedback=None,
+            points=2.5,
+        )
+        self.assertTrue(self.ring.put_result(None, 7, result))
+
+        self.ring.clear_doorbell()
+        batch_number, case_number, received = self.ring.get()
+        self.assertIsNone(batch_number)
+        self.assertEqual(case_number, 7)
+        for field in (
+            'result_flag',
+            'execution_time',
+            'wall_clock_time',
+            'max_memory',
+            'context_switches',
+            'runtime_version',
+            'feedback',
+            'extended_feedback',
+            'points',
+            'total_points',
+            'output',
+        ):
+            self.assertEqual(getattr(received, field), getattr(result, field), field)
+        self.assertIsNone(self.ring.get())
+
+    def test_order_with_pipe_markers(self):
+        self.ring.put_result(1, 1, self.make_result())
+        self.ring.put_pipe_marker()
+        self.ring.put_result(1, 2, self.make_result())
+
+        self.ring.clear_doorbell()
+        self.assertEqual(self.ring.get()[1], 1)
+        self.assertIs(self.ring.get(), PIPE_MESSAGE)
+        self.assertEqual(self.ring.get()[1], 2)
+        self.assertTrue(self.ring.is_empty())
+
+    def test_wraps_around(self):
+        for case_number in range(1000):
+            feedback = 'x' * (case_number % 500)
+            self.assertTrue(self.ring.put_result(None, case_number, self.make_result(feedback=feedback)))
+            self.ring.clear_doorbell()
+            self.assertEqual(self.ring.get()[2].feedback, feedback)
+
+    def test_read_once_announced(self):
+        self.ring.put_result(None, 1, self.make_result())
+        self.ring.put_result(None, 2, self.make_result())
+        self.assertIsNone(self.ring.get())
+
+        self.ring.clear_doorbell()
+        self.ring.put_result(None, 3, self.make_result())
+        self.assertEqual([self.ring.get()[1], self.ring.get()[1]], [1, 2])
+        self.assertIsNone(self.ring.get())
+        self.ring.clear_doorbell()
+        self.assertEqual(self.ring.get()[1], 3)
+
+    def test_large_result_goes_to_pipe(self):
+        self.assertFalse(self.ring.put_result(None, 1, self.make_result(proc_output=b'x' * 4096)))
+        self.assertTrue(self.ring.is_empty())
@@ -0,0 +1,386 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from dmoj.judgeenv import env
+from dmoj.problem_manifest import read_manifest, write_manifest
+from dmoj.testcase_sync import (
+    ProblemDataSync,
+    RemoteObject,
+    StorageCredentials,
+    VERSIONS_DIR,
+    problem_lock,
+    problem_version_lock,
+)
+
+
+def credentials(bucket):
+    return StorageCredentials('http://localhost', 'id', 'secret', bucket, 'auto')
+
+
+class RecordingProblemDataSync(ProblemDataSync):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.synced = []
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def sync(self, credentials):
+        self.synced.append(credentials.bucket)
+        self.started.release()
+        self.release.wait(5)
+
+
+class ProblemDataSyncSchedulingTest(unittest.TestCase):
+    def setUp(self):
+        self.sync = RecordingProblemDataSync('judge', min_interval=0)
+
+    def tearDown(self):
+        self.sync.release.set()
+        self.sync.close()
+
+    def test_requests_during_sync_coalesced(self):
+        self.sync.request(credentials('a'))
+        self.assertTrue(self.sync.started.acquire(timeout=5))
+        for bucket in 'bcd':
+            self.sync.request(credentials(bucket))
+        self.sync.release.set()
+        self.assertTrue(self.sync.started.acquire(timeout=5))
+        self.assertFalse(self.sync.started.acquire(timeout=0.1))
+        self.assertEqual(self.sync.synced, ['a', 'd'])
+
+    def test_min_interval(self):
+        self.sync.min_interval = 0.2
+        self.sync.release.set()
+        start = time.monotonic()
+        self.sync.request(credentials('a'))
+        self.assertTrue(self.sync.started.acquire(timeout=5))
+        self.sync.request(credentials('a'))
+        self.assertTrue(self.sync.started.acquire(timeout=5))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+
+class ProblemLockTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.lock_dir = os.path.join(self.tempdir.name, 'locks')
+        patch = mock.patch('dmoj.testcase_sync._problem_lock_dir', return_value=self.lock_dir)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_sync_waits_for_grading(self):
+        acquired = threading.Event()
+
+        def sync():
+            with problem_lock('aplusb', shared=False):
+                acquired.set()
+
+        with problem_lock('aplusb'), problem_lock('aplusb'):
+            thread = threading.Thread(target=sync)
+            thread.start()
+            self.assertFalse(acquired.wait(0.1))
+            # Other problems are unaffected.
+            with problem_lock('helloworld', shared=False):
+                pass
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_lock_dir_must_be_private(self):
+        with problem_lock('aplusb'):
+            pass
+        self.assertEqual(os.stat(self.lock_dir).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(os.path.join(self.lock_dir, 'aplusb.lock')).st_mode & 0o777, 0o600)
+
+        os.chmod(self.lock_dir, 0o777)
+        with self.assertRaises(PermissionError):
+            with problem_lock('aplusb'):
+                pass
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size):
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+class FakeS3:
+    """
+    Just enough of an S3 client to download objects from, with some latency and the odd failure.
+    """
+
+    def __init__(self, objects, latency=0.0, failures=0):
+        self.objects = objects
+        self.latency = latency
+        self.failures = failures
+        self.lock = threading.Lock()
+        self.requests = []
+        self.active = self.max_active = 0
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        contents = [
+            {'Key': key, 'LastModified': 1.0, 'Size': len(data), 'ETag': 'v1'}
+            for key, data in sorted(self.objects.items())
+            if key.startswith(Prefix)
+        ]
+        return [{'Contents': contents}]
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        with self.lock:
+            self.requests.append((Key, Range))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            fail = self.failures > 0
+            self.failures -= fail
+        try:
+            time.sleep(self.latency)
+            if fail:
+                raise OSError('connection reset')
+            data = self.objects[Key]
+            if Range is not None:
+                start, end = map(int, Range[len('bytes=') :].split('-'))
+                data = data[start : end + 1]
+            return {'Body': FakeBody(data)}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class ParallelDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.sync = ProblemDataSync('judge', min_interval=0)
+        self.sync.concurrency = 4
+        self.sync.part_size = 1000
+        self.objects = {
+            'tests/aplusb/init.yml': b'archive: data.zip\n',
+            'tests/aplusb/data.zip': bytes(range(256)) * 10,
+            'tests/aplusb/1.in': b'1 2\n',
+        }
+
+    def download(self, s3):
+        remote = [RemoteObject(key, 0, len(data), '') for key, data in self.objects.items()]
+        with ThreadPoolExecutor(self.sync.concurrency) as pool:
+            self.sync._download_objects(s3, pool, 'bucket', os.path.join(self.tempdir.name, 'aplusb'), 'aplusb', remote)
+        for key, data in self.objects.items():
+            with open(os.path.join(self.tempdir.name, key[len('tests/') :]), 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def test_ranged_parallel(self):
+        s3 = FakeS3(self.objects, latency=0.05)
+        self.download(s3)
+        self.assertEqual(
+            sorted(r for k, r in s3.requests if k == 'tests/aplusb/data.zip'),
+            ['bytes=0-999', 'bytes=1000-1999', 'bytes=2000-2559'],
+        )
+        self.assertGreater(s3.max_active, 1)
+
+    def test_retry(self):
+        self.sync.retries = 2
+        with mock.patch('dmoj.testcase_sync.RETRY_BACKOFF', 0):
+            self.download(FakeS3(self.objects, failures=2))
+
+
+class DeltaSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = self.tempdir.name
+        self.updates = []
+        self.sync = ProblemDataSync('judge', min_interval=0, on_update=self.updates.append)
+        self.objects = {'tests/aplusb/init.yml': b'test_cases: []\n', 'tests/aplusb/1.in': b'1 2\n'}
+        self.addCleanup(env.__setitem__, 'problem_manifest_dir', env.problem_manifest_dir)
+        env['problem_manifest_dir'] = os.path.join(self.tempdir.name, 'manifests')
+        self.etags = {key: 'v1' for key in self.objects}
+
+    def remote(self):
+        return [RemoteObject(key, 0, len(data), self.etags[key]) for key, data in self.objects.items()]
+
+    def sync_problem(self, success=True, failures=0):
+        s3 = FakeS3(self.objects, failures=failures)
+        with ThreadPoolExecutor(2) as pool:
+            self.assertEqual(self.sync._sync_problem(s3, pool, 'bucket', self.root, 'aplusb', self.remote()), success)
+        return sorted(key for key, _ in s3.requests)
+
+    def read(self, path):
+        with open(os.path.join(self.root, 'aplusb', path), 'rb') as f:
+            return f.read()
+
+    def versions(self):
+        return os.listdir(os.path.join(self.root, VERSIONS_DIR, 'aplusb'))
+
+    def test_only_changes_downloaded(self):
+        self.assertEqual(self.sync_problem(), ['tests/aplusb/1.in', 'tests/aplusb/init.yml'])
+        self.assertEqual(self.sync_problem(), [])
+
+        self.objects['tests/aplusb/init.yml'] = b'test_cases: [{in: 2.in}]\n'
+        self.etags['tests/aplusb/init.yml'] = 'v2'
+        del self.objects['tests/aplusb/1.in']
+        self.assertEqual(self.sync_problem(), ['tests/aplusb/init.yml'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'aplusb'))), ['.sync-manifest.json', 'init.yml'])
+
+    def test_repair(self):
+        self.sync_problem()
+        self.assertTrue(self.sync._is_problem_current(self.root, 'aplusb', self.remote()))
+        # Test data is read-only, since it is shared with the blob store.
+        os.unlink(os.path.join(self.root, 'aplusb', '1.in'))
+        with open(os.path.join(self.root, 'aplusb', '1.in'), 'wb') as f:
+            f.write(b'1')
+        self.assertFalse(self.sync._is_problem_current(self.root, 'aplusb', self.remote()))
+        self.assertEqual(self.sync_problem(), ['tests/aplusb/1.in'])
+
+    def test_identical_files_shared(self):
+        self.objects['tests/aplusb/2.in'] = self.objects['tests/aplusb/1.in']
+        self.etags['tests/aplusb/2.in'] = 'v1'
+        self.sync_problem()
+        self.assertTrue(
+            os.path.samefile(os.path.join(self.root, 'aplusb', '1.in'), os.path.join(self.root, 'aplusb', '2.in'))
+        )
+        self.assertTrue(self.sync._is_problem_current(self.root, 'aplusb', self.remote()))
+
+    def test_swapped_atomically(self):
+        self.sync_problem()
+        self.assertTrue(os.path.islink(os.path.join(self.root, 'aplusb')))
+        self.assertEqual(self.updates, [[os.path.join(self.root, 'aplusb')]])
+        old_version = os.path.realpath(os.path.join(self.root, 'aplusb'))
+
+        self.objects['tests/aplusb/1.in'] = b'3 4\n'
+        self.etags['tests/aplusb/1.in'] = 'v2'
+        with problem_version_lock(old_version):
+            self.assertEqual(self.sync_problem(), ['tests/aplusb/1.in'])
+            self.assertEqual(self.read('1.in'), b'3 4\n')
+            # Submissions that loaded the old version keep grading with it...
+            with open(os.path.join(old_version, '1.in'), 'rb') as f:
+                self.assertEqual(f.read(), b'1 2\n')
+            self.assertEqual(len(self.versions()), 2)
+        # ...until they're done.
+        write_manifest(old_version, {})
+        self.sync._collect_versions(self.root, 'aplusb')
+        self.assertEqual(len(self.versions()), 1)
+        self.assertIsNone(read_manifest(old_version))
+        self.assertEqual(len(self.updates), 2)
+
+        # Nothing changed, so nothing was swapped.
+        self.assertEqual(self.sync_problem(), [])
+        self.assertEqual(len(self.updates), 2)
+
+    def test_failed_sync_keeps_live_version(self):
+        self.sync_problem()
+        self.objects['tests/aplusb/1.in'] = b'3 4\n'
+        self.etags['tests/aplusb/1.in'] = 'v2'
+        self.sync.retries = 0
+        self.sync_problem(success=False, failures=1)
+        self.assertEqual(self.read('1.in'), b'1 2\n')
+        self.assertEqual(len(self.versions()), 1)
+        self.assertEqual(len(self.updates), 1)
+
+    def test_unversioned_folder_replaced(self):
+        os.makedirs(os.path.join(self.root, 'aplusb'))
+        for name in ('init.yml', 'stale.txt'):
+            with open(os.path.join(self.root, 'aplusb', name), 'wb') as f:
+                f.write(self.objects['tests/aplusb/init.yml'])
+        self.assertEqual(self.sync_problem(), ['tests/aplusb/1.in'])
+        self.assertTrue(os.path.islink(os.path.join(self.root, 'aplusb')))
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.root, 'aplusb'))), ['.sync-manifest.json', '1.in', 'init.yml']
+        )
+        self.assertEqual(len(self.versions()), 1)
+
+
+class LazySyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = os.path.join(self.tempdir.name, 'problems')
+        os.makedirs(self.root)
+        self.updates = []
+        self.sync = ProblemDataSync('judge', min_interval=0, on_update=self.updates.append)
+        self.sync.lazy = True
+        self.objects = {
+            'tests/%s/%s' % (problem, name): problem.encode() * 100
+            for problem in ('aplusb', 'helloworld', 'seed2')
+            for name in ('init.yml', '1.in')
+        }
+        self.s3 = FakeS3(self.objects)
+        self.remote_problems = {}
+
+        patches = [
+            mock.patch.object(ProblemDataSync, '_client', return_value=self.s3),
+            mock.patch('dmoj.testcase_sync.get_problem_roots', return_value=[self.root]),
+            mock.patch('dmoj.testcase_sync._problem_lock_dir', return_value=os.path.join(self.tempdir.name, 'locks')),
+            mock.patch('dmoj.testcase_sync.set_remote_problems', side_effect=self.remote_problems.update),
+            mock.patch('dmoj.testcase_sync.update_supported_problems'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def cached(self):
+        return sorted(
+            name
+            for name in os.listdir(self.root)
+            if not name.startswith('.') and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def test_fetch_on_first_use(self):
+        self.assertTrue(self.sync.fetch(credentials('bucket'), 'aplusb'))
+        self.assertEqual(self.cached(), ['aplusb'])
+        with open(os.path.join(self.root, 'aplusb', '1.in'), 'rb') as f:
+            self.assertEqual(f.read(), b'aplusb' * 100)
+
+        # Already here.
+        requests = len(self.s3.requests)
+        self.assertTrue(self.sync.fetch(credentials('bucket'), 'aplusb'))
+        self.assertEqual(len(self.s3.requests), requests)
+
+        self.assertFalse(self.sync.fetch(credentials('bucket'), 'missing'))
+
+    def test_fetched_problem_locked_until_loaded(self):
+        self.sync.cache_size = 1
+        with self.sync.fetch_locked(credentials('bucket'), 'aplusb') as fetched:
+            self.assertTrue(fetched)
+            evict = threading.Thread(target=self.sync._evict_problem, args=(self.root, 'aplusb'))
+            evict.start()
+            evict.join(0.1)
+            # Waiting for the problem to be loaded.
+            self.assertTrue(evict.is_alive())
+        evict.join(5)
+        self.assertEqual(self.cached(), [])
+
+    def test_sync_only_updates_cached_problems(self):
+        self.sync.fetch(credentials('bucket'), 'aplusb')
+        self.updates.clear()
+        self.s3.requests.clear()
+        self.sync.sync(credentials('bucket'))
+        self.assertEqual(sorted(self.remote_problems), ['aplusb', 'helloworld', 'seed2'])
+        self.assertEqual(len(self.updates), 1)
+        self.assertEqual(self.cached(), ['aplusb'])
+        self.assertEqual(self.s3.requests, [])
+
+    def test_least_recently_graded_evicted(self):
+        # Problems take 1200, 2000, and 1000 bytes respectively.
+        self.sync.cache_size = 3200
+        for problem in ('aplusb', 'helloworld'):
+            self.sync.fetch(credentials('bucket'), problem)
+        os.utime(os.path.join(self.tempdir.name, 'locks', 'aplusb.lock'), (0, 0))
+
+        with problem_version_lock(os.path.realpath(os.path.join(self.root, 'aplusb'))):
+            self.sync.fetch(credentials('bucket'), 'seed2')
+            # aplusb was graded the longest time ago, but it is being graded now.
+            self.assertEqual(self.cached(), ['aplusb', 'seed2'])
+
+        self.sync.cache_size = 1000
+        self.sync.evict(self.root)
+        self.assertEqual(self.cached(), ['seed2'])
+        self.assertEqual(os.listdir(os.path.join(self.root, VERSIONS_DIR)), ['seed2'])
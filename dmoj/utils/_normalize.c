@@ -0,0 +1,236 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <errno.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#define UNREFERENCED_PARAMETER(p)
+#define BLOCK_SIZE 65536
+
+/* What has to be remembered between the blocks of a stream: whether the last block ended with a \r, in which case a \n
+ * starting the next one belongs to it, and the last byte written, to know whether a final newline is needed. */
+typedef struct {
+    int after_cr;
+    int written;
+    char last;
+} normalize_state;
+
+/* Converts \r\n and \r to \n, writing to out, which must be at least as long as in. Returns the length written. */
+static size_t normalize_block(normalize_state *state, const char *in, size_t length, char *out) {
+    const char *end = in + length;
+    char *start = out;
+
+    if (state->after_cr && in < end && *in == '\n')
+        ++in;
+    while (in < end) {
+        const char *cr = memchr(in, '\r', end - in);
+        size_t run = (cr ? cr : end) - in;
+
+        memcpy(out, in, run);
+        out += run;
+        in += run;
+        if (!cr)
+            break;
+
+        *out++ = '\n';
+        ++in;
+        if (in < end && *in == '\n')
+            ++in;
+    }
+
+    state->after_cr = length && end[-1] == '\r';
+    if (out != start) {
+        state->written = 1;
+        state->last = out[-1];
+    }
+    return out - start;
+}
+
+/* Returns whether a final newline has to be appended to what was written so far. */
+static inline int needs_newline(const normalize_state *state) {
+    return state->written && state->last != '\n';
+}
+
+static int write_all(int fd, const char *buf, size_t length) {
+    while (length) {
+        ssize_t written = write(fd, buf, length);
+        if (written < 0) {
+            if (errno == EINTR)
+                continue;
+            return -1;
+        }
+        buf += written;
+        length -= written;
+    }
+    return 0;
+}
+
+static PyObject *normalize_normalize(PyObject *self, PyObject *args) {
+    Py_buffer data;
+    PyObject *result;
+    normalize_state state = { 0, 0, 0 };
+    size_t length;
+
+    UNREFERENCED_PARAMETER(self);
+    if (!PyArg_ParseTuple(args, "y*:normalize", &data))
+        return NULL;
+
+    result = PyBytes_FromStringAndSize(NULL, data.len + 1);
+    if (!result) {
+        PyBuffer_Release(&data);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    length = normalize_block(&state, data.buf, data.len, PyBytes_AS_STRING(result));
+    if (needs_newline(&state))
+        PyBytes_AS_STRING(result)[length++] = '\n';
+    Py_END_ALLOW_THREADS;
+
+    PyBuffer_Release(&data);
+    if (_PyBytes_Resize(&result, length) < 0)
+        return NULL;
+    return result;
+}
+
+static PyObject *normalize_normalize_fd(PyObject *self, PyObject *args) {
+    int src, dst, error = 0;
+    long long total = 0;
+    normalize_state state = { 0, 0, 0 };
+    char *in, *out;
+
+    UNREFERENCED_PARAMETER(self);
+    if (!PyArg_ParseTuple(args, "ii:normalize_fd", &src, &dst))
+        return NULL;
+
+    in = malloc(BLOCK_SIZE);
+    out = malloc(BLOCK_SIZE + 1);
+    if (!in || !out) {
+        free(in);
+        free(out);
+        return PyErr_NoMemory();
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    for (;;) {
+        ssize_t bytes = read(src, in, BLOCK_SIZE);
+        size_t length;
+
+        if (bytes < 0) {
+            if (errno == EINTR)
+                continue;
+            error = errno;
+            break;
+        }
+        if (!bytes) {
+            length = 0;
+            if (needs_newline(&state))
+                out[length++] = '\n';
+        } else {
+            length = normalize_block(&state, in, bytes, out);
+        }
+        if (write_all(dst, out, length) < 0) {
+            error = errno;
+            break;
+        }
+        total += length;
+        if (!bytes)
+            break;
+    }
+    Py_END_ALLOW_THREADS;
+
+    free(in);
+    free(out);
+    if (error) {
+        errno = error;
+        return PyErr_SetFromErrno(PyExc_OSError);
+    }
+    return PyLong_FromLongLong(total);
+}
+
+typedef struct {
+    PyObject_HEAD
+    normalize_state state;
+} NormalizerObject;
+
+static PyObject *normalizer_feed(NormalizerObject *self, PyObject *args) {
+    Py_buffer data;
+    PyObject *result;
+    size_t length;
+
+    if (!PyArg_ParseTuple(args, "y*:feed", &data))
+        return NULL;
+
+    result = PyBytes_FromStringAndSize(NULL, data.len);
+    if (!result) {
+        PyBuffer_Release(&data);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS;
+    length = normalize_block(&self->state, data.buf, data.len, PyBytes_AS_STRING(result));
+    Py_END_ALLOW_THREADS;
+
+    PyBuffer_Release(&data);
+    if (_PyBytes_Resize(&result, length) < 0)
+        return NULL;
+    return result;
+}
+
+static PyObject *normalizer_finish(NormalizerObject *self, PyObject *args) {
+    UNREFERENCED_PARAMETER(args);
+    if (needs_newline(&self->state)) {
+        self->state.last = '\n';
+        return PyBytes_FromStringAndSize("\n", 1);
+    }
+    return PyBytes_FromStringAndSize(NULL, 0);
+}
+
+static PyMethodDef normalizer_methods[] = {
+    { "feed", (PyCFunction)normalizer_feed, METH_VARARGS, "Normalizes the next block of a stream." },
+    { "finish", (PyCFunction)normalizer_finish, METH_NOARGS, "Returns what has to be written after the last block." },
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject NormalizerType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "dmoj.utils._normalize.Normalizer",
+    .tp_doc = "Normalizes newlines in a stream, one block at a time.",
+    .tp_basicsize = sizeof(NormalizerObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_methods = normalizer_methods,
+};
+
+static PyMethodDef normalize_methods[] = {
+    { "normalize", normalize_normalize, METH_VARARGS, "Normalizes newlines in a buffer." },
+    { "normalize_fd", normalize_normalize_fd, METH_VARARGS,
+      "Normalizes newlines from one file descriptor to another, returning the number of bytes written." },
+    { NULL, NULL, 0, NULL }
+};
+
+static struct PyModuleDef moduledef = {
+    PyModuleDef_HEAD_INIT, "_normalize", NULL, -1, normalize_methods, NULL, NULL, NULL, NULL
+};
+
+PyMODINIT_FUNC PyInit__normalize(void) {
+    PyObject *module;
+
+    if (PyType_Ready(&NormalizerType) < 0)
+        return NULL;
+
+    module = PyModule_Create(&moduledef);
+    if (!module)
+        return NULL;
+
+    Py_INCREF(&NormalizerType);
+    if (PyModule_AddObject(module, "Normalizer", (PyObject *)&NormalizerType) < 0) {
+        Py_DECREF(&NormalizerType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
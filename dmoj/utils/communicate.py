@@ -1,7 +1,7 @@
 import errno
 import os
 import select
-from typing import Dict, IO, List, Optional, Tuple
+from typing import Callable, Dict, IO, List, Optional, Tuple
 
 from dmoj.error import OutputLimitExceeded
 
@@ -9,8 +9,14 @@ _PIPE_BUF = getattr(select, 'PIPE_BUF', 512)
 
 
 def safe_communicate(
-    proc, input: Optional[bytes] = None, outlimit: Optional[int] = None, errlimit: Optional[int] = None
+    proc,
+    input: Optional[bytes] = None,
+    outlimit: Optional[int] = None,
+    errlimit: Optional[int] = None,
+    stdout_callback: Optional[Callable[[bytes], None]] = None,
 ) -> Tuple[bytes, bytes]:
+    # With a `stdout_callback`, stdout is handed to it as it is read rather than kept and returned, though it still
+    # counts towards `outlimit`. Exceptions it raises stop the communication.
     if outlimit is None:
         outlimit = 10485760
     if errlimit is None:
@@ -87,7 +93,10 @@ def safe_communicate(
                 data = os.read(fd, 4096)
                 if not data:
                     close_unregister_and_remove(fd)
-                fd2output[fd].append(data)
+                if fd == stdout_fileno and stdout_callback is not None:
+                    stdout_callback(data)
+                else:
+                    fd2output[fd].append(data)
                 fd2length[fd] += len(data)
                 if fd2length[fd] > fd2limit[fd]:
                     proc.mark_ole()
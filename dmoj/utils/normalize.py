@@ -1,7 +1,64 @@
+import io
+import os
 from io import TextIOWrapper
+from typing import Optional
 
+try:
+    from dmoj.utils._normalize import Normalizer, normalize as native_normalize, normalize_fd
+except ImportError:
+    Normalizer = native_normalize = normalize_fd = None
+
+
+def normalize(data: bytes) -> bytes:
+    """
+    Converts \\r\\n and \\r newlines to \\n, and adds a final newline to data that doesn't end with one.
+    """
+    if native_normalize is not None:
+        return native_normalize(data)
+
+    if not data:
+        return data
+    data = data.replace(b'\r\n', b'\r').replace(b'\r', b'\n')
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    return data
+
+
+def _raw_fd(f) -> Optional[int]:
+    # Only unbuffered files, or buffered ones that haven't read ahead, can be read or written behind their backs.
+    if isinstance(f, io.FileIO):
+        return f.fileno()
+    if isinstance(f, io.BufferedReader) and isinstance(f.raw, io.FileIO):
+        fd = f.fileno()
+        if f.tell() == os.lseek(fd, 0, os.SEEK_CUR):
+            return fd
+    return None
+
+
+def _write_all(f, data: bytes) -> None:
+    # Unbuffered files may write less than they are given.
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view) :]
+
+
+def normalized_file_copy(src, dst, block_size=65536):
+    if Normalizer is not None:
+        src_fd, dst_fd = _raw_fd(src), _raw_fd(dst)
+        if src_fd is not None and dst_fd is not None:
+            normalize_fd(src_fd, dst_fd)
+            src.seek(0, os.SEEK_END)
+            return
+
+        normalizer = Normalizer()
+        while True:
+            buf = src.read(block_size)
+            if not buf:
+                break
+            _write_all(dst, normalizer.feed(buf))
+        _write_all(dst, normalizer.finish())
+        return
 
-def normalized_file_copy(src, dst, block_size=16384):
     src_wrap = TextIOWrapper(src, encoding='iso-8859-1', newline=None)
     dst_wrap = TextIOWrapper(dst, encoding='iso-8859-1', newline='')
 
@@ -1,6 +1,10 @@
 import ctypes
 import ctypes.util
+import os
 import signal
+import stat
+import sys
+import threading
 from typing import Optional
 
 from dmoj.utils.unicode import utf8bytes
@@ -17,6 +21,27 @@ def oom_score_adj(score: int, to: Optional[int] = None) -> None:
         f.write(utf8bytes(str(score)))
 
 
+def lower_thread_priority() -> None:
+    """
+    Gives the calling thread the lowest CPU priority, and with it the lowest I/O priority. Only Linux has per-thread
+    priorities; elsewhere this does nothing, rather than lower the whole process.
+    """
+    if sys.platform.startswith('linux'):
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+
+
+def private_dir(path: str) -> str:
+    """
+    Creates a folder that only we can write to, or checks that an existing one is, so that no one else can plant files
+    where we read them from. Raises PermissionError if it isn't ours.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f'{path} is not a folder that only we can write to')
+    return path
+
+
 try:
     from signal import strsignal as _strsignal
 except ImportError:  # before Python 3.8
@@ -0,0 +1,231 @@
+import mmap
+import os
+import struct
+import time
+from typing import NamedTuple, Optional, TYPE_CHECKING, Tuple, Union, cast
+
+from dmoj.result import Result
+
+if TYPE_CHECKING:
+    from dmoj.problem import TestCase
+
+# Read and write offsets, which only ever increase; the ring position is the offset modulo the buffer size. Only the
+# consumer writes the read offset, and only the producer writes the write offset.
+_HEADER = struct.Struct('=QQ')
+_OFFSET = struct.Struct('=Q')
+_READ_OFFSET = 0
+_WRITE_OFFSET = _OFFSET.size
+# Record length (including this header) and record kind.
+_RECORD_HEADER = struct.Struct('=IB')
+# Batch number (-1 for none), case number, result flag, execution time, wall clock time, memory, voluntary and
+# involuntary context switches, points and total points, followed by the lengths of the variable-length fields.
+_RESULT = struct.Struct('=qqqddqqqddiiii')
+
+_KIND_PIPE = 0
+_KIND_RESULT = 1
+
+DEFAULT_RING_SIZE = 1 << 20
+
+
+class RecordedTestCase(NamedTuple):
+    """
+    The parts of a `TestCase` the judge controller looks at once a result has been sent over the ring.
+    """
+
+    points: float
+    output_prefix_length: int
+
+
+class PipeMessage:
+    """
+    Marks that the next message is on the pipe, so that messages taking either route stay in order.
+    """
+
+
+PIPE_MESSAGE = PipeMessage()
+
+
+def _encode(value: Optional[Union[str, bytes]]) -> bytes:
+    if value is None:
+        return b''
+    if isinstance(value, str):
+        return value.encode('utf-8', 'surrogatepass')
+    return value
+
+
+def _length(value: Optional[Union[str, bytes]], encoded: bytes) -> int:
+    return -1 if value is None else len(encoded)
+
+
+class ResultRing:
+    """
+    A single-producer, single-consumer ring buffer in shared memory, which the judge worker uses to send test case
+    results to the judge controller without pickling them and writing them down the IPC pipe one by one.
+
+    Every record written is announced on an eventfd doorbell that the controller can wait on alongside the pipe. Any
+    message that isn't a plain result (or doesn't fit in the ring) still goes down the pipe, preceded by a marker record
+    so the controller reads both in order.
+
+    The controller only reads records once it has read their announcement off the doorbell. Nothing else orders its
+    reads of the ring after the worker's writes on CPUs that reorder memory accesses, such as ARM64, where it might
+    otherwise see a record's offset before the record itself.
+
+    The ring must be created before forking, so that both processes share the same mapping and eventfd.
+    """
+
+    def __init__(self, size: int = DEFAULT_RING_SIZE) -> None:
+        self.size = size
+        self._mmap = mmap.mmap(-1, _HEADER.size + size)
+        self.doorbell = os.eventfd(0, os.EFD_CLOEXEC | os.EFD_NONBLOCK)
+        # Records announced on the doorbell that have yet to be read.
+        self._announced = 0
+
+    @staticmethod
+    def is_supported() -> bool:
+        return hasattr(os, 'eventfd')
+
+    def close(self) -> None:
+        self._mmap.close()
+        os.close(self.doorbell)
+
+    def put_result(self, batch_number: Optional[int], case_number: int, result: Result) -> bool:
+        """
+        Writes a result, returning whether it fit in the ring.
+        """
+        feedback = _encode(result.feedback)
+        extended_feedback = _encode(result.extended_feedback)
+        runtime_version = _encode(result.runtime_version)
+        proc_output = _encode(result.proc_output)
+        fields = _RESULT.pack(
+            -1 if batch_number is None else batch_number,
+            case_number,
+            result.result_flag,
+            result.execution_time,
+            result.wall_clock_time,
+            result.max_memory,
+            result.context_switches[0],
+            result.context_switches[1],
+            result.points,
+            result.total_points,
+            _length(result.feedback, feedback),
+            _length(result.extended_feedback, extended_feedback),
+            _length(result.runtime_version, runtime_version),
+            len(proc_output),
+        )
+        # Big records would hog the ring, and they're rare enough that the pipe is fine for them.
+        body = b''.join((fields, feedback, extended_feedback, runtime_version, proc_output))
+        if _RECORD_HEADER.size + len(body) > self.size // 4:
+            return False
+
+        self._put(_KIND_RESULT, body)
+        return True
+
+    def put_pipe_marker(self) -> None:
+        self._put(_KIND_PIPE, b'')
+
+    def is_empty(self) -> bool:
+        """
+        Returns whether every record announced by the time the doorbell was last cleared has been read.
+        """
+        return not self._announced
+
+    def get(self) -> Optional[Union[PipeMessage, Tuple[Optional[int], int, Result]]]:
+        """
+        Reads the next record without blocking: `PIPE_MESSAGE` if the next message is on the pipe, the arguments of an
+        `IPC.RESULT` message, or None if no record announced by the time the doorbell was last cleared is left.
+        """
+        if not self._announced:
+            return None
+        self._announced -= 1
+        read_offset = _OFFSET.unpack_from(self._mmap, _READ_OFFSET)[0]
+
+        length, kind = _RECORD_HEADER.unpack(self._read(read_offset, _RECORD_HEADER.size))
+        body = self._read(read_offset + _RECORD_HEADER.size, length - _RECORD_HEADER.size)
+        _OFFSET.pack_into(self._mmap, _READ_OFFSET, read_offset + length)
+
+        if kind == _KIND_PIPE:
+            return PIPE_MESSAGE
+        return self._unpack_result(body)
+
+    def clear_doorbell(self) -> None:
+        """
+        Takes note of the records announced since the doorbell was last cleared, so that `get` reads them.
+        """
+        try:
+            self._announced += os.eventfd_read(self.doorbell)
+        except BlockingIOError:
+            pass
+
+    def _put(self, kind: int, body: bytes) -> None:
+        length = _RECORD_HEADER.size + len(body)
+        while True:
+            read_offset, write_offset = self._offsets()
+            if write_offset + length - read_offset <= self.size:
+                break
+            # The controller is behind; it drains the ring as soon as it wakes up.
+            time.sleep(0.001)
+
+        self._write(write_offset, _RECORD_HEADER.pack(length, kind) + body)
+        _OFFSET.pack_into(self._mmap, _WRITE_OFFSET, write_offset + length)
+        os.eventfd_write(self.doorbell, 1)
+
+    def _offsets(self) -> Tuple[int, int]:
+        return cast(Tuple[int, int], _HEADER.unpack_from(self._mmap, 0))
+
+    def _write(self, offset: int, data: bytes) -> None:
+        start = offset % self.size
+        first = min(len(data), self.size - start)
+        self._mmap[_HEADER.size + start : _HEADER.size + start + first] = data[:first]
+        if first < len(data):
+            self._mmap[_HEADER.size : _HEADER.size + len(data) - first] = data[first:]
+
+    def _read(self, offset: int, length: int) -> bytes:
+        start = offset % self.size
+        first = min(length, self.size - start)
+        data = self._mmap[_HEADER.size + start : _HEADER.size + start + first]
+        if first < length:
+            data += self._mmap[_HEADER.size : _HEADER.size + length - first]
+        return data
+
+    @staticmethod
+    def _unpack_result(body: bytes) -> Tuple[Optional[int], int, Result]:
+        (
+            batch_number,
+            case_number,
+            result_flag,
+            execution_time,
+            wall_clock_time,
+            max_memory,
+            voluntary_context_switches,
+            involuntary_context_switches,
+            points,
+            total_points,
+            *lengths,
+        ) = _RESULT.unpack_from(body)
+
+        strings = []
+        offset = _RESULT.size
+        for length in lengths:
+            strings.append(None if length < 0 else body[offset : offset + length])
+            offset += max(length, 0)
+        feedback, extended_feedback, runtime_version, proc_output = strings
+
+        def text(value: Optional[bytes]) -> Optional[str]:
+            return None if value is None else value.decode('utf-8', 'surrogatepass')
+
+        # The output was already trimmed to the case's output prefix by the worker.
+        case = RecordedTestCase(points=total_points, output_prefix_length=len(proc_output or b''))
+        result = Result(
+            cast('TestCase', case),
+            result_flag=result_flag,
+            execution_time=execution_time,
+            wall_clock_time=wall_clock_time,
+            max_memory=max_memory,
+            context_switches=(voluntary_context_switches, involuntary_context_switches),
+            runtime_version=cast(str, text(runtime_version)),
+            proc_output=proc_output or b'',
+            feedback=cast(str, text(feedback)),
+            extended_feedback=cast(str, text(extended_feedback)),
+            points=points,
+        )
+        return None if batch_number < 0 else batch_number, case_number, result
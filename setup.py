@@ -152,6 +152,7 @@ else:
 
 extensions = [
     Extension('dmoj.checkers._checker', sources=['dmoj/checkers/_checker.cpp']),
+    Extension('dmoj.utils._normalize', sources=['dmoj/utils/_normalize.c']),
     Extension('dmoj.cptbox._cptbox', sources=cptbox_sources, language='c++', libraries=libs),
     SimpleSharedObject('dmoj.utils.setbufsize', sources=['dmoj/utils/setbufsize.c']),
 ]
@@ -177,7 +178,7 @@ setup(
     ext_modules=cythonize(extensions),
     install_requires=['watchdog', 'pyyaml', 'termcolor', 'pygments', 'setproctitle', 'pylru', 'requests', 'boto3'],
     tests_require=['requests', 'parameterized'],
-    extras_require={'test': ['requests', 'parameterized']},
+    extras_require={'test': ['requests', 'parameterized'], 'msgpack': ['msgpack']},
     cmdclass={'build_ext': build_ext_dmoj},
     author='YACPS Team',
     author_email='yacps@trunghsgs.edu.vn',